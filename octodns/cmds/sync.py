@@ -32,11 +32,32 @@ def main():
     parser.add_argument('--target', default=[], action='append',
                         help='Limit sync to the specified target(s)')
 
+    parser.add_argument('--changed-only', action='store_true', default=False,
+                        help='Skip zones whose sources haven\'t changed since '
+                        'they were last synced, requires the manager\'s '
+                        'fingerprint_file')
+
+    plan_files = parser.add_mutually_exclusive_group()
+    plan_files.add_argument('--write-plan', metavar='FILE',
+                            help='Write the plans to FILE so that they can '
+                            'be applied later with --apply-plan')
+    plan_files.add_argument('--apply-plan', metavar='FILE',
+                            help='Apply the plans previously written to FILE '
+                            'by --write-plan rather than planning again')
+
     args = parser.parse_args()
 
     manager = Manager(args.config_file)
-    manager.sync(eligible_zones=args.zone, eligible_targets=args.target,
-                 dry_run=not args.doit, force=args.force)
+    if args.apply_plan:
+        if args.zone or args.target:
+            parser.error('zones & targets are fixed by --apply-plan')
+        manager.apply_plan_file(args.apply_plan, dry_run=not args.doit,
+                                force=args.force)
+    else:
+        manager.sync(eligible_zones=args.zone, eligible_targets=args.target,
+                     dry_run=not args.doit, force=args.force,
+                     plan_file=args.write_plan,
+                     changed_only=args.changed_only)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,38 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+# The one copy of each unicode string that's been interned. unicode can't be
+# weakly referenced so entries stick around until clear_interned is called,
+# Manager does so at the start of each sync, and only the kinds of strings
+# that repeat a lot, e.g. names, targets, and geo codes, should be interned.
+# It's shared by all of the threads, which is safe since setdefault & clear
+# are atomic.
+_strings = {}
+
+
+def intern_string(value):
+    '''
+    Returns the one shared copy of value so that the same string used in lots
+    of places, e.g. `www` across thousands of zones, is only stored once. The
+    builtin intern is used for str, it doesn't take unicode. Anything else,
+    e.g. None, is returned as-is.
+    '''
+    if type(value) is unicode:
+        return _strings.setdefault(value, value)
+    elif type(value) is str:
+        return intern(value)
+    return value
+
+
+def clear_interned():
+    '''
+    Forgets the unicode strings interned so far so that they can be freed
+    once nothing else is using them. Copies already handed out are unaffected,
+    they're just not shared with those interned afterwards. str are left to
+    the builtin intern, which lets them go once they're no longer used.
+    '''
+    _strings.clear()
@@ -5,17 +5,27 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
-from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
+from hashlib import sha1
 from importlib import import_module
-from os import environ
+from json import dump, dumps, load
+from os import environ, rename
+from os.path import exists
 import logging
 
+from .interning import clear_interned
 from .provider.base import BaseProvider
-from .provider.plan import Plan
-from .provider.yaml import SplitYamlProvider, YamlProvider
+from .provider.plan import Plan, _streams
+from .provider.yaml import SplitYamlProvider, YamlProvider, _tmp_filename
 from .record import Record
 from .yaml import safe_load
-from .zone import Zone
+from .zone import ColumnarZone, Zone
+
+
+class ManagerException(Exception):
+    pass
 
 
 class _AggregateTarget(object):
@@ -69,9 +79,39 @@ class MainThreadExecutor(object):
         return MakeThreadFuture(func, args, kwargs)
 
 
+# Managers created in worker processes, keyed by config file, so that each
+# worker only loads its config & creates its providers once
+_process_managers = {}
+
+
+def _populate_and_plan_in_process(config_file, include_meta, zone_name,
+                                  sources, targets):
+    '''
+    Runs Manager._populate_and_plan in a worker process. Providers can't be
+    pickled so sources & targets are passed by id, targets are returned by id,
+    and records' sources are swapped for their ids (see Record.__getstate__.)
+    Manager._rebind_plans reverses this in the parent.
+    '''
+    try:
+        manager = _process_managers[config_file]
+    except KeyError:
+        manager = Manager(config_file, max_workers=1,
+                          include_meta=include_meta)
+        _process_managers[config_file] = manager
+    # the plans are pickled back to the parent, nothing interned here is
+    # shared beyond this zone
+    clear_interned()
+    sources = [manager.providers[source] for source in sources]
+    targets = [manager.providers[target] for target in targets]
+    return [(target.id, plan) for target, plan in
+            manager._populate_and_plan(zone_name, sources, targets)]
+
+
 class Manager(object):
     log = logging.getLogger('Manager')
 
+    PLAN_FILE_VERSION = 1
+
     @classmethod
     def _plan_keyer(cls, p):
         plan = p[1]
@@ -81,6 +121,7 @@ class Manager(object):
         self.log.info('__init__: config_file=%s', config_file)
 
         # Read our config file
+        self.config_file = config_file
         with open(config_file, 'r') as fh:
             self.config = safe_load(fh, enforce_order=False)
 
@@ -88,14 +129,61 @@ class Manager(object):
         max_workers = manager_config.get('max_workers', 1) \
             if max_workers is None else max_workers
         self.log.info('__init__:   max_workers=%d', max_workers)
+        # Threads are the default, but on CPython the GIL keeps them from
+        # helping much when populating & planning is CPU bound, e.g. lots of
+        # zones from YamlProvider. `process` runs that work in worker
+        # processes instead.
+        executor = manager_config.get('executor', 'thread')
+        self.log.info('__init__:   executor=%s', executor)
+        self._process_executor = False
         if max_workers > 1:
-            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            if executor == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            elif executor == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=max_workers)
+                self._process_executor = True
+            else:
+                raise Exception('Unknown executor: {}'.format(executor))
         else:
             self._executor = MainThreadExecutor()
 
+        # Applying is mostly waiting on provider APIs so it always uses
+        # threads, optionally capped per target
+        self.apply_max_workers = manager_config.get('apply_max_workers', 1)
+        self._check_workers('apply_max_workers', self.apply_max_workers)
+        self.apply_target_max_workers = \
+            manager_config.get('apply_target_max_workers', {})
+        for target, workers in self.apply_target_max_workers.items():
+            self._check_workers('apply_target_max_workers.{}'.format(target),
+                                workers)
+        self.log.info('__init__:   apply_max_workers=%d, '
+                      'apply_target_max_workers=%s', self.apply_max_workers,
+                      self.apply_target_max_workers)
+
         self.include_meta = include_meta or manager_config.get('include_meta',
                                                                False)
-        self.log.info('__init__:   max_workers=%s', self.include_meta)
+        self.log.info('__init__:   include_meta=%s', self.include_meta)
+
+        # Where the fingerprints of what was last synced to each zone's
+        # targets are kept, required for sync(changed_only=True)
+        self.fingerprint_file = manager_config.get('fingerprint_file', None)
+        self.log.info('__init__:   fingerprint_file=%s', self.fingerprint_file)
+        self._fingerprints = {}
+        if self.fingerprint_file and exists(self.fingerprint_file):
+            with open(self.fingerprint_file, 'r') as fh:
+                self._fingerprints = load(fh)
+
+        # How zones keep their records, columnar uses much less memory for
+        # very large zones
+        zone_storage = manager_config.get('zone_storage', 'default')
+        try:
+            self._zone_class = {
+                'default': Zone,
+                'columnar': ColumnarZone,
+            }[zone_storage]
+        except KeyError:
+            raise Exception('Unknown zone_storage: {}'.format(zone_storage))
+        self.log.info('__init__:   zone_storage=%s', zone_storage)
 
         self.log.debug('__init__:   configuring providers')
         self.providers = {}
@@ -215,42 +303,109 @@ class Manager(object):
         self.log.debug('configured_sub_zones: subs=%s', sub_zone_names)
         return set(sub_zone_names)
 
+    def _new_zone(self, zone_name):
+        return self._zone_class(zone_name,
+                                self.configured_sub_zones(zone_name))
+
+    def _populate(self, zone_name, sources, lenient=False):
+        zone = self._new_zone(zone_name)
+        for source in sources:
+            source.populate(zone, lenient=lenient)
+        return zone
+
     def _populate_and_plan(self, zone_name, sources, targets):
 
         self.log.debug('sync:   populating, zone=%s', zone_name)
-        zone = Zone(zone_name,
-                    sub_zones=self.configured_sub_zones(zone_name))
-        for source in sources:
-            source.populate(zone)
+        zone = self._populate(zone_name, sources)
 
         self.log.debug('sync:   planning, zone=%s', zone_name)
         plans = []
 
         for target in targets:
+            desired = zone
             if self.include_meta:
-                meta = Record.new(zone, 'octodns-meta', {
+                desired = zone.copy()
+                meta = Record.new(desired, 'octodns-meta', {
                     'type': 'TXT',
                     'ttl': 60,
                     'value': 'provider={}'.format(target.id)
                 })
-                zone.add_record(meta, replace=True)
-            plan = target.plan(zone)
+                desired.add_record(meta, replace=True)
+            plan = target.plan(desired)
             if plan:
                 plans.append((target, plan))
 
         return plans
 
+    def _rebind_plans(self, plans):
+        '''
+        Swaps the ids in plans that came back from a worker process for the
+        corresponding providers, see _populate_and_plan_in_process
+        '''
+        ret = []
+        for target, plan in plans:
+            plan.existing._rebind_sources(self.providers)
+            plan.desired._rebind_sources(self.providers)
+            for change in plan.changes:
+                for record in (change.existing, change.new):
+                    # records can show up more than once, only swap ids
+                    if record and isinstance(record.source, basestring):
+                        record.source = self.providers[record.source]
+            ret.append((self.providers[target], plan))
+        return ret
+
+    def _zone_fingerprint(self, zone_name, sources):
+        '''
+        Combines the sources' fingerprints of a zone with the config that
+        affects what's planned for it, None if any of the sources can't
+        fingerprint it.
+        '''
+        fingerprint = sha1(dumps([zone_name,
+                                  sorted(self.configured_sub_zones(zone_name)),
+                                  self.include_meta]))
+        for source in sources:
+            source_fingerprint = source.fingerprint(zone_name)
+            if source_fingerprint is None:
+                return None
+            fingerprint.update(dumps([source.id, source_fingerprint]))
+        return fingerprint.hexdigest()
+
+    def _record_fingerprints(self, synced):
+        zones = self.config['zones']
+        for zone_name, targets, fingerprint in synced:
+            if fingerprint is None or \
+                    zones[zone_name].get('always-dry-run', False):
+                continue
+            recorded = self._fingerprints.setdefault(zone_name, {})
+            for target in targets:
+                if not target.apply_disabled:
+                    recorded[target.id] = fingerprint
+        self.log.debug('sync:   writing fingerprints to %s',
+                       self.fingerprint_file)
+        tmp = _tmp_filename(self.fingerprint_file)
+        with open(tmp, 'w') as fh:
+            dump(self._fingerprints, fh, indent=2, sort_keys=True)
+        rename(tmp, self.fingerprint_file)
+
     def sync(self, eligible_zones=[], eligible_targets=[], dry_run=True,
-             force=False):
+             force=False, plan_file=None, changed_only=False):
         self.log.info('sync: eligible_zones=%s, eligible_targets=%s, '
-                      'dry_run=%s, force=%s', eligible_zones, eligible_targets,
-                      dry_run, force)
+                      'dry_run=%s, force=%s, plan_file=%s, changed_only=%s',
+                      eligible_zones, eligible_targets, dry_run, force,
+                      plan_file, changed_only)
+        if changed_only and not self.fingerprint_file:
+            raise Exception('changed_only requires manager.fingerprint_file')
+
+        # strings are shared between the zones of a sync, anything left over
+        # from an earlier one can go
+        clear_interned()
 
         zones = self.config['zones'].items()
         if eligible_zones:
             zones = filter(lambda d: d[0] in eligible_zones, zones)
 
         futures = []
+        synced = []
         for zone_name, config in zones:
             self.log.info('sync:   zone=%s', zone_name)
             try:
@@ -293,12 +448,49 @@ class Manager(object):
                 raise Exception('Zone {}, unknown target: {}'.format(zone_name,
                                                                      target))
 
-            futures.append(self._executor.submit(self._populate_and_plan,
-                                                 zone_name, sources, targets))
+            if self.fingerprint_file:
+                fingerprint = self._zone_fingerprint(zone_name, sources)
+                recorded = self._fingerprints.get(zone_name, {})
+                if changed_only and fingerprint is not None and \
+                        all(recorded.get(t.id) == fingerprint
+                            for t in targets):
+                    self.log.info('sync:   unchanged since last synced, '
+                                  'skipping')
+                    continue
+                synced.append((zone_name, targets, fingerprint))
+
+            if self._process_executor:
+                futures.append(self._executor.submit(
+                    _populate_and_plan_in_process, self.config_file,
+                    self.include_meta, zone_name, [s.id for s in sources],
+                    [t.id for t in targets]))
+            else:
+                futures.append(self._executor.submit(self._populate_and_plan,
+                                                     zone_name, sources,
+                                                     targets))
+
+        # Outputs that support it are handed each zone's plans as soon as
+        # they're ready, in zone order rather than children first, others get
+        # them all at the end. Either way every plan is held on to for the
+        # safety checks and applying
+        streaming = [o for o in self.plan_outputs.values() if _streams(o)]
+        for output in streaming:
+            output.start(log=self.log)
 
         # Wait on all results and unpack/flatten them in to a list of target &
         # plan pairs.
-        plans = [p for f in futures for p in f.result()]
+        plans = []
+        for future in futures:
+            zone_plans = future.result()
+            if self._process_executor:
+                zone_plans = self._rebind_plans(zone_plans)
+            for target, plan in zone_plans:
+                for output in streaming:
+                    output.add(target, plan, log=self.log)
+            plans.extend(zone_plans)
+
+        for output in streaming:
+            output.finish(log=self.log)
 
         # Best effort sort plans children first so that we create/update
         # children zones before parents which should allow us to more safely
@@ -308,28 +500,181 @@ class Manager(object):
         plans.sort(key=self._plan_keyer, reverse=True)
 
         for output in self.plan_outputs.values():
-            output.run(plans=plans, log=self.log)
+            if output not in streaming:
+                output.run(plans=plans, log=self.log)
 
         if not force:
             self.log.debug('sync:   checking safety')
             for target, plan in plans:
                 plan.raise_if_unsafe()
 
+        if plan_file:
+            self._write_plan_file(plans, plan_file)
+
         if dry_run:
             return 0
 
-        total_changes = 0
+        total_changes = self._apply_configured(plans)
+        self.log.info('sync:   %d total changes', total_changes)
+        if self.fingerprint_file:
+            # only once everything has been applied, a zone that failed part
+            # way through on one target has to be planned again
+            self._record_fingerprints(synced)
+        return total_changes
+
+    def _write_plan_file(self, plans, plan_file):
+        self.log.info('sync:   writing %d plans to %s', len(plans), plan_file)
+        data = {
+            'version': self.PLAN_FILE_VERSION,
+            'plans': [dict(plan.to_data(), target=target.id)
+                      for target, plan in plans],
+        }
+        tmp = _tmp_filename(plan_file)
+        with open(tmp, 'w') as fh:
+            dump(data, fh, sort_keys=True, separators=(',', ':'))
+        rename(tmp, plan_file)
+
+    def _plan_from_data(self, data):
+        target = self.providers[data['target']]
+        zone_name = data['zone']
+        self.log.debug('apply_plan_file:   verifying, zone=%s, target=%s',
+                       zone_name, target.id)
+        existing = self._new_zone(zone_name)
+        target.populate(existing, target=True, lenient=True)
+        plan = Plan.from_data(data, existing, self.providers,
+                              update_pcent_threshold=target
+                              .update_pcent_threshold,
+                              delete_pcent_threshold=target
+                              .delete_pcent_threshold)
+        return target, plan
+
+    def apply_plan_file(self, plan_file, dry_run=True, force=False):
+        '''
+        Applies the plans written by `sync(plan_file=...)` without populating
+        their sources. Each target's existing records are re-populated and
+        checked against those the plan was made with, StalePlan is raised if
+        anything has changed since.
+        '''
+        self.log.info('apply_plan_file: plan_file=%s, dry_run=%s, force=%s',
+                      plan_file, dry_run, force)
+        with open(plan_file, 'r') as fh:
+            data = load(fh)
+        if data.get('version') != self.PLAN_FILE_VERSION:
+            raise Exception('Unsupported plan file version: {}'
+                            .format(data.get('version')))
+
+        # Populating the targets is the slow part, spread it over our workers
+        # unless they're processes, which don't have our providers
+        executor = MainThreadExecutor() if self._process_executor \
+            else self._executor
+        futures = [executor.submit(self._plan_from_data, d)
+                   for d in data['plans']]
+        plans = [f.result() for f in futures]
+
+        for output in self.plan_outputs.values():
+            output.run(plans=plans, log=self.log)
+
+        if not force:
+            self.log.debug('apply_plan_file:   checking safety')
+            for target, plan in plans:
+                plan.raise_if_unsafe()
+
+        if dry_run:
+            return 0
+
+        total_changes = self._apply_configured(plans)
+        self.log.info('apply_plan_file:   %d total changes', total_changes)
+        return total_changes
+
+    def _apply_configured(self, plans):
         self.log.debug('sync:   applying')
         zones = self.config['zones']
+        to_apply = []
         for target, plan in plans:
             zone_name = plan.existing.name
             if zones[zone_name].get('always-dry-run', False):
                 self.log.info('sync: zone=%s skipping always-dry-run',
                               zone_name)
                 continue
-            total_changes += target.apply(plan)
+            to_apply.append((target, plan))
+        return self._apply_plans(to_apply)
+
+    def _check_workers(self, key, value):
+        # anything less than one would never let plans be applied
+        if not isinstance(value, (int, long)) or value < 1:
+            raise ManagerException('Invalid {}: {}, must be an integer of at '
+                                   'least 1'.format(key, value))
+
+    def _apply_plans(self, plans):
+        '''
+        Applies plans, which are sorted children first, returning the total
+        number of changes made.
+
+        With apply_max_workers > 1 up to that many plans are applied
+        concurrently, no more than apply_target_max_workers for any one
+        target. Plans are started in order and a zone's plans wait for those
+        of its sub-zones, on all targets, to finish. Once a plan has failed no
+        more are started and, after those in flight have finished, the error
+        of the earliest failed plan is raised.
+        '''
+        if self.apply_max_workers <= 1 or len(plans) <= 1:
+            total_changes = 0
+            for target, plan in plans:
+                total_changes += target.apply(plan)
+            return total_changes
+
+        names = [plan.desired.name for _, plan in plans]
+        # the plans of each zone's sub-zones, i.e. what it has to wait for
+        waiting_on = [set(i for i, child in enumerate(names)
+                          if child.endswith('.{}'.format(name)))
+                      for name in names]
+
+        pending = list(range(len(plans)))
+        running = {}
+        per_target = defaultdict(int)
+        total_changes = 0
+        failed = None
+        with ThreadPoolExecutor(max_workers=self.apply_max_workers) as \
+                executor:
+            while pending or running:
+                for i in list(pending):
+                    if len(running) >= self.apply_max_workers:
+                        break
+                    target, plan = plans[i]
+                    target_max = self.apply_target_max_workers \
+                        .get(target.id, self.apply_max_workers)
+                    if waiting_on[i] or per_target[target.id] >= target_max:
+                        continue
+                    pending.remove(i)
+                    per_target[target.id] += 1
+                    running[executor.submit(target.apply, plan)] = i
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    target, plan = plans[i]
+                    per_target[target.id] -= 1
+                    for waiting in waiting_on:
+                        waiting.discard(i)
+                    try:
+                        total_changes += future.result()
+                    except Exception as e:
+                        # the traceback is that of the worker thread, it's
+                        # lost once the error is re-raised here
+                        self.log.exception('_apply_plans: target=%s, '
+                                           'zone=%s failed', target.id,
+                                           names[i])
+                        if failed is None or i < failed[0]:
+                            failed = (i, e)
+
+                if failed and pending:
+                    self.log.warn('_apply_plans: skipping %d plans',
+                                  len(pending))
+                    pending = []
+
+        if failed:
+            raise failed[1]
 
-        self.log.info('sync:   %d total changes', total_changes)
         return total_changes
 
     def compare(self, a, b, zone):
@@ -346,14 +691,8 @@ class Manager(object):
         except KeyError as e:
             raise Exception('Unknown source: {}'.format(e.args[0]))
 
-        sub_zones = self.configured_sub_zones(zone)
-        za = Zone(zone, sub_zones)
-        for source in a:
-            source.populate(za)
-
-        zb = Zone(zone, sub_zones)
-        for source in b:
-            source.populate(zb)
+        za = self._populate(zone, a)
+        zb = self._populate(zone, b)
 
         return zb.changes(za, _AggregateTarget(a + b))
 
@@ -377,9 +716,7 @@ class Manager(object):
             clz = SplitYamlProvider
         target = clz('dump', output_dir)
 
-        zone = Zone(zone, self.configured_sub_zones(zone))
-        for source in sources:
-            source.populate(zone, lenient=lenient)
+        zone = self._populate(zone, sources, lenient=lenient)
 
         plan = target.plan(zone)
         if plan is None:
@@ -388,7 +725,7 @@ class Manager(object):
 
     def validate_configs(self):
         for zone_name, config in self.config['zones'].items():
-            zone = Zone(zone_name, self.configured_sub_zones(zone_name))
+            zone = self._new_zone(zone_name)
 
             try:
                 sources = config['sources']
@@ -14,8 +14,10 @@ from azure.mgmt.dns.models import ARecord, AaaaRecord, CaaRecord, \
 
 import logging
 from functools import reduce
+from threading import Lock
 from ..record import Record
 from .base import BaseProvider
+from .http import RateLimiter, RequestEngine
 
 
 def escape_semicolon(s):
@@ -251,6 +253,13 @@ class AzureProvider(BaseProvider):
         # Resource Group name:
         resource_group:
         # All are required to authenticate.
+        # The number of record sets to create, update, or delete
+        # concurrently (optional, default 1)
+        max_workers: 1
+        # The number of times to retry a record set operation that Azure
+        # throttled, HTTP 429, all operations are paused for the period Azure
+        # asks for (optional, default 3)
+        throttle_retries: 3
 
         Example config file with variables:
             "
@@ -283,11 +292,17 @@ class AzureProvider(BaseProvider):
     SUPPORTS = set(('A', 'AAAA', 'CAA', 'CNAME', 'MX', 'NS', 'PTR', 'SRV',
                     'TXT'))
 
+    # How long to pause for when a throttled response doesn't say
+    THROTTLE_PERIOD = 5
+
     def __init__(self, id, client_id, key, directory_id, sub_id,
-                 resource_group, *args, **kwargs):
+                 resource_group, max_workers=1, throttle_retries=3, *args,
+                 **kwargs):
         self.log = logging.getLogger('AzureProvider[{}]'.format(id))
         self.log.debug('__init__: id=%s, client_id=%s, '
-                       'key=***, directory_id:%s', id, client_id, directory_id)
+                       'key=***, directory_id:%s, max_workers=%d, '
+                       'throttle_retries=%d', id, client_id, directory_id,
+                       max_workers, throttle_retries)
         super(AzureProvider, self).__init__(id, *args, **kwargs)
 
         credentials = ServicePrincipalCredentials(
@@ -296,12 +311,42 @@ class AzureProvider(BaseProvider):
         self._dns_client = DnsManagementClient(credentials, sub_id)
         self._resource_group = resource_group
         self._azure_zones = set()
+        self._azure_zones_loaded = False
+        self._azure_zones_lock = Lock()
+        self._engine = RequestEngine(max_workers)
+        self.throttle_retries = throttle_retries
+        self._limiter = RateLimiter()
 
     def _populate_zones(self):
-        self.log.debug('azure_zones: loading')
-        list_zones = self._dns_client.zones.list_by_resource_group
-        for zone in list_zones(self._resource_group):
-            self._azure_zones.add(zone.name)
+        # the resource group's zones are listed once, those created or found
+        # later are added as we go
+        with self._azure_zones_lock:
+            if self._azure_zones_loaded:
+                return
+            self.log.debug('azure_zones: loading')
+            list_zones = self._dns_client.zones.list_by_resource_group
+            for zone in list_zones(self._resource_group):
+                self._azure_zones.add(zone.name)
+            self._azure_zones_loaded = True
+
+    def _throttled(self, method, fn, *args, **kwargs):
+        retries = self.throttle_retries
+        while True:
+            self._limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except CloudError as err:
+                if err.status_code != 429 or retries <= 0:
+                    raise
+                retries -= 1
+                try:
+                    period = float(err.response.headers['Retry-After'])
+                except (KeyError, TypeError, ValueError):
+                    period = self.THROTTLE_PERIOD
+                self.log.warn('%s: throttled, pausing for %ds and trying '
+                              'again', method, period)
+                # hold back everything else too, the limit is shared
+                self._limiter.backoff(period)
 
     def _check_zone(self, name, create=False):
         '''Checks whether a zone specified in a source exist in Azure server.
@@ -335,6 +380,7 @@ class AzureProvider(BaseProvider):
                     create_zone = self._dns_client.zones.create_or_update
                     create_zone(self._resource_group, name,
                                 Zone(location='global'))
+                    self._azure_zones.add(name)
                     return name
                 else:
                     return
@@ -367,7 +413,7 @@ class AzureProvider(BaseProvider):
         self.log.debug('populate: name=%s', zone.name)
 
         exists = False
-        before = len(zone.records)
+        before = zone.record_count
 
         zone_name = zone.name[:len(zone.name) - 1]
         self._populate_zones()
@@ -391,7 +437,7 @@ class AzureProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         self.log.info('populate: found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _data_for_A(self, azrecord):
@@ -458,11 +504,12 @@ class AzureProvider(BaseProvider):
         ar = _AzureRecord(self._resource_group, change.new)
         create = self._dns_client.record_sets.create_or_update
 
-        create(resource_group_name=ar.resource_group,
-               zone_name=ar.zone_name,
-               relative_record_set_name=ar.relative_record_set_name,
-               record_type=ar.record_type,
-               parameters=ar.params)
+        self._throttled('_apply_Create', create,
+                        resource_group_name=ar.resource_group,
+                        zone_name=ar.zone_name,
+                        relative_record_set_name=ar.relative_record_set_name,
+                        record_type=ar.record_type,
+                        parameters=ar.params)
 
         self.log.debug('*  Success Create/Update: {}'.format(ar))
 
@@ -472,8 +519,9 @@ class AzureProvider(BaseProvider):
         ar = _AzureRecord(self._resource_group, change.existing, delete=True)
         delete = self._dns_client.record_sets.delete
 
-        delete(self._resource_group, ar.zone_name, ar.relative_record_set_name,
-               ar.record_type)
+        self._throttled('_apply_Delete', delete, self._resource_group,
+                        ar.zone_name, ar.relative_record_set_name,
+                        ar.record_type)
 
         self.log.debug('*  Success Delete: {}'.format(ar))
 
@@ -493,6 +541,10 @@ class AzureProvider(BaseProvider):
         azure_zone_name = desired.name[:len(desired.name) - 1]
         self._check_zone(azure_zone_name, create=True)
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
+
+        # record sets are independent of one another, but a node's changes,
+        # e.g. swapping a CNAME for an A, still have to happen in order
+        self._engine.apply(changes, apply_change)
@@ -6,7 +6,6 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 from ..source.base import BaseSource
-from ..zone import Zone
 from .plan import Plan
 
 
@@ -14,18 +13,24 @@ class BaseProvider(BaseSource):
 
     def __init__(self, id, apply_disabled=False,
                  update_pcent_threshold=Plan.MAX_SAFE_UPDATE_PCENT,
-                 delete_pcent_threshold=Plan.MAX_SAFE_DELETE_PCENT):
+                 delete_pcent_threshold=Plan.MAX_SAFE_DELETE_PCENT,
+                 trust_populate=False):
         super(BaseProvider, self).__init__(id)
         self.log.debug('__init__: id=%s, apply_disabled=%s, '
                        'update_pcent_threshold=%.2f, '
-                       'delete_pcent_threshold=%.2f',
+                       'delete_pcent_threshold=%.2f, trust_populate=%s',
                        id,
                        apply_disabled,
                        update_pcent_threshold,
-                       delete_pcent_threshold)
+                       delete_pcent_threshold,
+                       trust_populate)
         self.apply_disabled = apply_disabled
         self.update_pcent_threshold = update_pcent_threshold
         self.delete_pcent_threshold = delete_pcent_threshold
+        # Records this provider populates leniently, e.g. the existing records
+        # when it's a target, skip validation whose problems would only be
+        # logged
+        self.trust_populate = trust_populate
 
     def _include_change(self, change):
         '''
@@ -45,7 +50,8 @@ class BaseProvider(BaseSource):
     def plan(self, desired):
         self.log.info('plan: desired=%s', desired.name)
 
-        existing = Zone(desired.name, desired.sub_zones)
+        # the same kind of zone as desired, see ColumnarZone.changes
+        existing = desired.__class__(desired.name, desired.sub_zones)
         exists = self.populate(existing, target=True, lenient=True)
         if exists is None:
             # If your code gets this warning see Source.populate for more
@@ -12,6 +12,7 @@ from requests import Session
 
 from ..record import Record, Update
 from .base import BaseProvider
+from .http import RequestEngine
 
 
 class CloudflareError(Exception):
@@ -47,6 +48,9 @@ class CloudflareProvider(BaseProvider):
         #
         # See: https://support.cloudflare.com/hc/en-us/articles/115000830351
         cdn: false
+        # The number of changes to apply concurrently, changes to the same
+        # node are always applied in order (optional, default 1)
+        max_workers: 1
 
     Note: The "proxied" flag of "A", "AAAA" and "CNAME" records can be managed
           via the YAML provider like so:
@@ -66,13 +70,15 @@ class CloudflareProvider(BaseProvider):
     MIN_TTL = 120
     TIMEOUT = 15
 
-    def __init__(self, id, email, token, cdn=False, *args, **kwargs):
+    def __init__(self, id, email, token, cdn=False, max_workers=1, *args,
+                 **kwargs):
         self.log = getLogger('CloudflareProvider[{}]'.format(id))
-        self.log.debug('__init__: id=%s, email=%s, token=***, cdn=%s', id,
-                       email, cdn)
+        self.log.debug('__init__: id=%s, email=%s, token=***, cdn=%s, '
+                       'max_workers=%d', id, email, cdn, max_workers)
         super(CloudflareProvider, self).__init__(id, *args, **kwargs)
 
-        sess = Session()
+        self._engine = RequestEngine(max_workers)
+        sess = self._engine.mount(Session())
         sess.headers.update({
             'X-Auth-Email': email,
             'X-Auth-Key': token,
@@ -82,6 +88,7 @@ class CloudflareProvider(BaseProvider):
 
         self._zones = None
         self._zone_records = {}
+        self._zone_indexes = {}
 
     def _request(self, method, path, params=None, data=None):
         self.log.debug('_request: method=%s, path=%s', method, path)
@@ -98,20 +105,21 @@ class CloudflareProvider(BaseProvider):
         resp.raise_for_status()
         return resp.json()
 
+    def _request_pages(self, path):
+
+        def fetch(page):
+            return self._request('GET', path, params={'page': page})
+
+        def last_page(resp):
+            return resp['result_info'].get('total_pages', 1)
+
+        return [result for resp in self._engine.pages(fetch, last_page)
+                for result in resp['result']]
+
     @property
     def zones(self):
         if self._zones is None:
-            page = 1
-            zones = []
-            while page:
-                resp = self._request('GET', '/zones', params={'page': page})
-                zones += resp['result']
-                info = resp['result_info']
-                if info['count'] > 0 and info['count'] == info['per_page']:
-                    page += 1
-                else:
-                    page = None
-
+            zones = self._request_pages('/zones')
             self._zones = {'{}.'.format(z['name']): z['id'] for z in zones}
 
         return self._zones
@@ -208,19 +216,8 @@ class CloudflareProvider(BaseProvider):
             if not zone_id:
                 return []
 
-            records = []
             path = '/zones/{}/dns_records'.format(zone_id)
-            page = 1
-            while page:
-                resp = self._request('GET', path, params={'page': page})
-                records += resp['result']
-                info = resp['result_info']
-                if info['count'] > 0 and info['count'] == info['per_page']:
-                    page += 1
-                else:
-                    page = None
-
-            self._zone_records[zone.name] = records
+            self._zone_records[zone.name] = self._request_pages(path)
 
         return self._zone_records[zone.name]
 
@@ -250,7 +247,7 @@ class CloudflareProvider(BaseProvider):
                        target, lenient)
 
         exists = False
-        before = len(zone.records)
+        before = zone.record_count
         records = self.zone_records(zone)
         if records:
             exists = True
@@ -270,14 +267,14 @@ class CloudflareProvider(BaseProvider):
                     # enabled at multiple records with a different type but
                     # the same name
                     if (self.cdn and records[0]['proxied'] and
-                       record in zone._records[name]):
+                       record._key in zone._index):
                         self.log.info('CDN rewrite %s already in zone', name)
                         continue
 
                     zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _include_change(self, change):
@@ -418,38 +415,58 @@ class CloudflareProvider(BaseProvider):
             return '{port} {priority} {target} {weight}'.format(**data)
         return data['content']
 
+    def _zone_index(self, zone):
+        '''
+        Returns a dict mapping (name, _type) to the existing CF records for
+        it, keyed by _gen_key, each with its record_id, zone_id, and data.
+        It's built once per apply, rather than scanning zone_records for each
+        change, and the _apply_* methods keep it current as they go.
+        '''
+        if zone.name not in self._zone_indexes:
+            index = defaultdict(dict)
+            for record in self.zone_records(zone):
+                _type = record['type']
+                if _type not in self.SUPPORTS:
+                    # we don't manage these, same as populate
+                    continue
+                name = zone.hostname_from_fqdn(record['name'])
+                # Use the _record_for so that we include all of standard
+                # conversion logic
+                r = self._record_for(zone, name, _type, [record], True)
+                # Round trip the single value through a record to contents
+                # flow to get a consistent _gen_data result that matches what
+                # went in to new_contents
+                data = self._gen_data(r).next()
+
+                # Record the record_id and data for this existing record
+                index[r._key][self._gen_key(data)] = {
+                    'record_id': record['id'],
+                    'zone_id': record['zone_id'],
+                    'data': data,
+                }
+            self._zone_indexes[zone.name] = index
+
+        return self._zone_indexes[zone.name]
+
     def _apply_Create(self, change):
         new = change.new
         zone_id = self.zones[new.zone.name]
         path = '/zones/{}/dns_records'.format(zone_id)
+        existing = self._zone_index(new.zone)[new._key]
         for content in self._gen_data(new):
-            self._request('POST', path, data=content)
+            resp = self._request('POST', path, data=content)
+            existing[self._gen_key(content)] = {
+                'record_id': resp['result']['id'],
+                'zone_id': zone_id,
+                'data': content,
+            }
 
     def _apply_Update(self, change):
         zone = change.new.zone
         zone_id = self.zones[zone.name]
-        hostname = zone.hostname_from_fqdn(change.new.fqdn[:-1])
-        _type = change.new._type
-
-        existing = {}
-        # Find all of the existing CF records for this name & type
-        for record in self.zone_records(zone):
-            name = zone.hostname_from_fqdn(record['name'])
-            # Use the _record_for so that we include all of standard
-            # conversion logic
-            r = self._record_for(zone, name, record['type'], [record], True)
-            if hostname == r.name and _type == r._type:
-                # Round trip the single value through a record to contents flow
-                # to get a consistent _gen_data result that matches what
-                # went in to new_contents
-                data = self._gen_data(r).next()
 
-                # Record the record_id and data for this existing record
-                key = self._gen_key(data)
-                existing[key] = {
-                    'record_id': record['id'],
-                    'data': data,
-                }
+        # All of the existing CF records for this name & type
+        existing = self._zone_index(zone)[change.new._key]
 
         # Build up a list of new CF records for this Update
         new = {
@@ -510,12 +527,17 @@ class CloudflareProvider(BaseProvider):
 
         # Creates
         path = '/zones/{}/dns_records'.format(zone_id)
-        for _, data in sorted(creates.items()):
+        for key, data in sorted(creates.items()):
             self.log.debug('_apply_Update: creating %s', data)
-            self._request('POST', path, data=data)
+            resp = self._request('POST', path, data=data)
+            existing[key] = {
+                'record_id': resp['result']['id'],
+                'zone_id': zone_id,
+                'data': data,
+            }
 
         # Updates
-        for _, info in sorted(updates.items()):
+        for key, info in sorted(updates.items()):
             record_id = info['record_id']
             data = info['data']
             old_data = info['old_data']
@@ -523,28 +545,30 @@ class CloudflareProvider(BaseProvider):
             self.log.debug('_apply_Update: updating %s, %s -> %s',
                            record_id, data, old_data)
             self._request('PUT', path, data=data)
+            existing.pop(self._gen_key(old_data), None)
+            existing[key] = {
+                'record_id': record_id,
+                'zone_id': zone_id,
+                'data': data,
+            }
 
         # Deletes
-        for _, info in sorted(deletes.items()):
+        for key, info in sorted(deletes.items()):
             record_id = info['record_id']
             old_data = info['data']
             path = '/zones/{}/dns_records/{}'.format(zone_id, record_id)
             self.log.debug('_apply_Update: removing %s, %s', record_id,
                            old_data)
             self._request('DELETE', path)
+            del existing[key]
 
     def _apply_Delete(self, change):
         existing = change.existing
-        existing_name = existing.fqdn[:-1]
-        # Make sure to map ALIAS to CNAME when looking for the target to delete
-        existing_type = 'CNAME' if existing._type == 'ALIAS' \
-            else existing._type
-        for record in self.zone_records(existing.zone):
-            if existing_name == record['name'] and \
-               existing_type == record['type']:
-                path = '/zones/{}/dns_records/{}'.format(record['zone_id'],
-                                                         record['id'])
-                self._request('DELETE', path)
+        infos = self._zone_index(existing.zone).pop(existing._key, {})
+        for _, info in sorted(infos.items()):
+            path = '/zones/{}/dns_records/{}'.format(info['zone_id'],
+                                                     info['record_id'])
+            self._request('DELETE', path)
 
     def _apply(self, plan):
         desired = plan.desired
@@ -564,12 +588,19 @@ class CloudflareProvider(BaseProvider):
             self.zones[name] = zone_id
             self._zone_records[name] = {}
 
-        for change in changes:
+        # Build the index up front rather than having the changes race to
+        # do so
+        self._zone_index(desired)
+
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
-        # clear the cache
+        self._engine.apply(changes, apply_change)
+
+        # clear the caches
         self._zone_records.pop(name, None)
+        self._zone_indexes.pop(name, None)
 
     def _extra_changes(self, existing, desired, changes):
         extra_changes = []
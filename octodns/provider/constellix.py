@@ -8,14 +8,15 @@ from __future__ import absolute_import, division, print_function, \
 from collections import defaultdict
 from requests import Session
 from base64 import b64encode
-from ipaddress import ip_address
 import hashlib
 import hmac
 import logging
 import time
 
 from ..record import Record
+from ..record.ip import ipv6_normalize
 from .base import BaseProvider
+from .http import RateLimiter, RequestEngine
 
 
 class ConstellixClientException(Exception):
@@ -49,6 +50,7 @@ class ConstellixClient(object):
         self.api_key = api_key
         self.secret_key = secret_key
         self.ratelimit_delay = ratelimit_delay
+        self._limiter = RateLimiter.for_delay(ratelimit_delay)
         self._sess = Session()
         self._sess.headers.update({'x-cnsdns-apiKey': self.api_key})
         self._domains = None
@@ -70,6 +72,7 @@ class ConstellixClient(object):
         }
 
         url = '{}{}'.format(self.BASE, path)
+        self._limiter.acquire()
         resp = self._sess.request(method, url, headers=headers,
                                   params=params, json=data)
         if resp.status_code == 400:
@@ -79,7 +82,6 @@ class ConstellixClient(object):
         if resp.status_code == 404:
             raise ConstellixClientNotFound()
         resp.raise_for_status()
-        time.sleep(self.ratelimit_delay)
         return resp
 
     @property
@@ -133,7 +135,7 @@ class ConstellixClient(object):
             # compress IPv6 addresses
             if record['type'] == 'AAAA':
                 for i, v in enumerate(value):
-                    value[i] = str(ip_address(v))
+                    value[i] = ipv6_normalize(v)
 
         return resp
 
@@ -163,9 +165,12 @@ class ConstellixProvider(BaseProvider):
         api_key: env/CONSTELLIX_API_KEY
         # Your Constellix secret key (required)
         secret_key: env/CONSTELLIX_SECRET_KEY
-        # Amount of time to wait between requests to avoid
+        # Minimum amount of time between the start of requests to avoid
         # ratelimit (optional)
         ratelimit_delay: 0.0
+        # The number of changes to apply concurrently, changes to the same
+        # node are always applied in order (optional, default 1)
+        max_workers: 1
     '''
     SUPPORTS_GEO = False
     SUPPORTS_DYNAMIC = False
@@ -173,11 +178,14 @@ class ConstellixProvider(BaseProvider):
                     'NS', 'PTR', 'SPF', 'SRV', 'TXT'))
 
     def __init__(self, id, api_key, secret_key, ratelimit_delay=0.0,
-                 *args, **kwargs):
+                 max_workers=1, *args, **kwargs):
         self.log = logging.getLogger('ConstellixProvider[{}]'.format(id))
-        self.log.debug('__init__: id=%s, api_key=***, secret_key=***', id)
+        self.log.debug('__init__: id=%s, api_key=***, secret_key=***, '
+                       'max_workers=%d', id, max_workers)
         super(ConstellixProvider, self).__init__(id, *args, **kwargs)
         self._client = ConstellixClient(api_key, secret_key, ratelimit_delay)
+        self._engine = RequestEngine(max_workers)
+        self._engine.mount(self._client._sess)
         self._zone_records = {}
 
     def _data_for_multiple(self, _type, records):
@@ -298,7 +306,7 @@ class ConstellixProvider(BaseProvider):
                 continue
             values[record['name']][record['type']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -308,7 +316,7 @@ class ConstellixProvider(BaseProvider):
 
         exists = zone.name in self._zone_records
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _params_for_multiple(self, record):
@@ -439,9 +447,11 @@ class ConstellixProvider(BaseProvider):
             self.log.debug('_apply:   no matching zone, creating domain')
             self._client.domain_create(desired.name[:-1])
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
+        self._engine.apply(changes, apply_change)
+
         # Clear out the cache if any
         self._zone_records.pop(desired.name, None)
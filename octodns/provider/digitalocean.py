@@ -7,10 +7,12 @@ from __future__ import absolute_import, division, print_function, \
 
 from collections import defaultdict
 from requests import Session
+from urlparse import parse_qs, urlparse
 import logging
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RequestEngine
 
 
 class DigitalOceanClientException(Exception):
@@ -32,8 +34,9 @@ class DigitalOceanClientUnauthorized(DigitalOceanClientException):
 class DigitalOceanClient(object):
     BASE = 'https://api.digitalocean.com/v2'
 
-    def __init__(self, token):
-        sess = Session()
+    def __init__(self, token, engine=None):
+        self._engine = engine or RequestEngine()
+        sess = self._engine.mount(Session())
         sess.headers.update({'Authorization': 'Bearer {}'.format(token)})
         self._sess = sess
 
@@ -64,23 +67,22 @@ class DigitalOceanClient(object):
 
     def records(self, zone_name):
         path = '/domains/{}/records'.format(zone_name)
-        ret = []
 
-        page = 1
-        while True:
-            data = self._request('GET', path, {'page': page}).json()
-
-            ret += data['domain_records']
-            links = data['links']
+        def fetch(page):
+            return self._request('GET', path, {'page': page}).json()
 
+        def last_page(data):
             # https://developers.digitalocean.com/documentation/v2/#links
             # pages exists if there is more than 1 page
             # last doesn't exist if you're on the last page
             try:
-                links['pages']['last']
-                page += 1
+                last = data['links']['pages']['last']
             except KeyError:
-                break
+                return 1
+            return int(parse_qs(urlparse(last).query)['page'][0])
+
+        ret = [record for data in self._engine.pages(fetch, last_page)
+               for record in data['domain_records']]
 
         for record in ret:
             # change any apex record to empty string
@@ -114,16 +116,21 @@ class DigitalOceanProvider(BaseProvider):
         class: octodns.provider.digitalocean.DigitalOceanProvider
         # Your DigitalOcean API token (required)
         token: foo
+        # The number of changes to apply concurrently, changes to the same
+        # node are always applied in order (optional, default 1)
+        max_workers: 1
     '''
     SUPPORTS_GEO = False
     SUPPORTS_DYNAMIC = False
     SUPPORTS = set(('A', 'AAAA', 'CAA', 'CNAME', 'MX', 'NS', 'TXT', 'SRV'))
 
-    def __init__(self, id, token, *args, **kwargs):
+    def __init__(self, id, token, max_workers=1, *args, **kwargs):
         self.log = logging.getLogger('DigitalOceanProvider[{}]'.format(id))
-        self.log.debug('__init__: id=%s, token=***', id)
+        self.log.debug('__init__: id=%s, token=***, max_workers=%d', id,
+                       max_workers)
         super(DigitalOceanProvider, self).__init__(id, *args, **kwargs)
-        self._client = DigitalOceanClient(token)
+        self._engine = RequestEngine(max_workers)
+        self._client = DigitalOceanClient(token, self._engine)
 
         self._zone_records = {}
 
@@ -229,7 +236,7 @@ class DigitalOceanProvider(BaseProvider):
                 continue
             values[record['name']][record['type']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -239,7 +246,7 @@ class DigitalOceanProvider(BaseProvider):
 
         exists = zone.name in self._zone_records
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _params_for_multiple(self, record):
@@ -340,9 +347,11 @@ class DigitalOceanProvider(BaseProvider):
             self.log.debug('_apply:   no matching zone, creating domain')
             self._client.domain_create(domain_name)
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
+        self._engine.apply(changes, apply_change)
+
         # Clear out the cache if any
         self._zone_records.pop(desired.name, None)
@@ -11,6 +11,7 @@ import logging
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RequestEngine
 
 
 class DnsimpleClientException(Exception):
@@ -32,9 +33,10 @@ class DnsimpleClientUnauthorized(DnsimpleClientException):
 class DnsimpleClient(object):
     BASE = 'https://api.dnsimple.com/v2/'
 
-    def __init__(self, token, account):
+    def __init__(self, token, account, engine=None):
         self.account = account
-        sess = Session()
+        self._engine = engine or RequestEngine()
+        sess = self._engine.mount(Session())
         sess.headers.update({'Authorization': 'Bearer {}'.format(token)})
         self._sess = sess
 
@@ -56,19 +58,16 @@ class DnsimpleClient(object):
         return self._request('POST', '/domains', data={'name': name})
 
     def records(self, zone_name):
-        ret = []
+        path = '/zones/{}/records'.format(zone_name)
+
+        def fetch(page):
+            return self._request('GET', path, {'page': page}).json()
 
-        page = 1
-        while True:
-            data = self._request('GET', '/zones/{}/records'.format(zone_name),
-                                 {'page': page}).json()
-            ret += data['data']
-            pagination = data['pagination']
-            if page >= pagination['total_pages']:
-                break
-            page += 1
+        def last_page(data):
+            return data['pagination']['total_pages']
 
-        return ret
+        return [record for data in self._engine.pages(fetch, last_page)
+                for record in data['data']]
 
     def record_create(self, zone_name, params):
         path = '/zones/{}/records'.format(zone_name)
@@ -89,17 +88,22 @@ class DnsimpleProvider(BaseProvider):
         token: letmein
         # Your account number (required)
         account: 42
+        # The number of changes to apply concurrently, changes to the same
+        # node are always applied in order (optional, default 1)
+        max_workers: 1
     '''
     SUPPORTS_GEO = False
     SUPPORTS_DYNAMIC = False
     SUPPORTS = set(('A', 'AAAA', 'ALIAS', 'CAA', 'CNAME', 'MX', 'NAPTR', 'NS',
                     'PTR', 'SPF', 'SRV', 'SSHFP', 'TXT'))
 
-    def __init__(self, id, token, account, *args, **kwargs):
+    def __init__(self, id, token, account, max_workers=1, *args, **kwargs):
         self.log = logging.getLogger('DnsimpleProvider[{}]'.format(id))
-        self.log.debug('__init__: id=%s, token=***, account=%s', id, account)
+        self.log.debug('__init__: id=%s, token=***, account=%s, '
+                       'max_workers=%d', id, account, max_workers)
         super(DnsimpleProvider, self).__init__(id, *args, **kwargs)
-        self._client = DnsimpleClient(token, account)
+        self._engine = RequestEngine(max_workers)
+        self._client = DnsimpleClient(token, account, self._engine)
 
         self._zone_records = {}
 
@@ -272,7 +276,7 @@ class DnsimpleProvider(BaseProvider):
                 continue
             values[record['name']][record['type']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -282,7 +286,7 @@ class DnsimpleProvider(BaseProvider):
 
         exists = zone.name in self._zone_records
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _params_for_multiple(self, record):
@@ -406,9 +410,11 @@ class DnsimpleProvider(BaseProvider):
             self.log.debug('_apply:   no matching zone, creating domain')
             self._client.domain_create(domain_name)
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
+        self._engine.apply(changes, apply_change)
+
         # Clear out the cache if any
         self._zone_records.pop(desired.name, None)
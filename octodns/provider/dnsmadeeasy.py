@@ -7,13 +7,14 @@ from __future__ import absolute_import, division, print_function, \
 
 from collections import defaultdict
 from requests import Session
-from time import strftime, gmtime, sleep
+from time import strftime, gmtime
 import hashlib
 import hmac
 import logging
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RateLimiter, RequestEngine
 
 
 class DnsMadeEasyClientException(Exception):
@@ -43,6 +44,11 @@ class DnsMadeEasyClientNotFound(DnsMadeEasyClientException):
 class DnsMadeEasyClient(object):
     PRODUCTION = 'https://api.dnsmadeeasy.com/V2.0/dns/managed'
     SANDBOX = 'https://api.sandbox.dnsmadeeasy.com/V2.0/dns/managed'
+    # The API allows `x-dnsme-requestLimit` requests in a rolling window of
+    # this many seconds
+    RATELIMIT_PERIOD = 300
+    # Requests are slowed down once fewer than this many remain in the window
+    RATELIMIT_RESERVE = 10
 
     def __init__(self, api_key, secret_key, sandbox=False,
                  ratelimit_delay=0.0):
@@ -50,6 +56,8 @@ class DnsMadeEasyClient(object):
         self.secret_key = secret_key
         self._base = self.SANDBOX if sandbox else self.PRODUCTION
         self.ratelimit_delay = ratelimit_delay
+        self._limiter = RateLimiter.for_delay(ratelimit_delay,
+                                              reserve=self.RATELIMIT_RESERVE)
         self._sess = Session()
         self._sess.headers.update({'x-dnsme-apiKey': self.api_key})
         self._domains = None
@@ -71,8 +79,10 @@ class DnsMadeEasyClient(object):
         }
 
         url = '{}{}'.format(self._base, path)
+        self._limiter.acquire()
         resp = self._sess.request(method, url, headers=headers,
                                   params=params, json=data)
+        self._update_limiter(resp)
         if resp.status_code == 400:
             raise DnsMadeEasyClientBadRequest(resp)
         if resp.status_code in [401, 403]:
@@ -80,9 +90,16 @@ class DnsMadeEasyClient(object):
         if resp.status_code == 404:
             raise DnsMadeEasyClientNotFound()
         resp.raise_for_status()
-        sleep(self.ratelimit_delay)
         return resp
 
+    def _update_limiter(self, resp):
+        try:
+            remaining = int(resp.headers['x-dnsme-requestsRemaining'])
+            limit = int(resp.headers['x-dnsme-requestLimit'])
+        except (KeyError, ValueError):
+            return
+        self._limiter.update(remaining, limit, self.RATELIMIT_PERIOD)
+
     @property
     def domains(self):
         if self._domains is None:
@@ -156,6 +173,13 @@ class DnsMadeEasyProvider(BaseProvider):
         # Whether or not to use Sandbox environment
         # (optional, default is false)
         sandbox: true
+        # Minimum amount of time between the start of requests, requests are
+        # also slowed down automatically as the API's quota runs low
+        # (optional)
+        ratelimit_delay: 0.0
+        # The number of changes to apply concurrently, changes to the same
+        # node are always applied in order (optional, default 1)
+        max_workers: 1
     '''
     SUPPORTS_GEO = False
     SUPPORTS_DYNAMIC = False
@@ -163,13 +187,15 @@ class DnsMadeEasyProvider(BaseProvider):
                     'NS', 'PTR', 'SPF', 'SRV', 'TXT'))
 
     def __init__(self, id, api_key, secret_key, sandbox=False,
-                 ratelimit_delay=0.0, *args, **kwargs):
+                 ratelimit_delay=0.0, max_workers=1, *args, **kwargs):
         self.log = logging.getLogger('DnsMadeEasyProvider[{}]'.format(id))
         self.log.debug('__init__: id=%s, api_key=***, secret_key=***, '
-                       'sandbox=%s', id, sandbox)
+                       'sandbox=%s, max_workers=%d', id, sandbox, max_workers)
         super(DnsMadeEasyProvider, self).__init__(id, *args, **kwargs)
         self._client = DnsMadeEasyClient(api_key, secret_key, sandbox,
                                          ratelimit_delay)
+        self._engine = RequestEngine(max_workers)
+        self._engine.mount(self._client._sess)
 
         self._zone_records = {}
 
@@ -271,7 +297,7 @@ class DnsMadeEasyProvider(BaseProvider):
                 continue
             values[record['name']][record['type']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -281,7 +307,7 @@ class DnsMadeEasyProvider(BaseProvider):
 
         exists = zone.name in self._zone_records
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _params_for_multiple(self, record):
@@ -389,9 +415,11 @@ class DnsMadeEasyProvider(BaseProvider):
             self.log.debug('_apply:   no matching zone, creating domain')
             self._client.domain_create(domain_name)
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
+        self._engine.apply(changes, apply_change)
+
         # Clear out the cache if any
         self._zone_records.pop(desired.name, None)
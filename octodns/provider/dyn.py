@@ -652,7 +652,7 @@ class DynProvider(BaseProvider):
                        target, lenient)
 
         exists = False
-        before = len(zone.records)
+        before = zone.record_count
 
         self._check_dyn_sess()
 
@@ -684,7 +684,7 @@ class DynProvider(BaseProvider):
                         zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _extra_changes(self, desired, changes, **kwargs):
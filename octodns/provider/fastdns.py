@@ -13,6 +13,7 @@ from collections import defaultdict
 from logging import getLogger
 from ..record import Record
 from .base import BaseProvider
+from .http import RequestEngine
 
 
 class AkamaiClientNotFound(Exception):
@@ -130,6 +131,7 @@ class AkamaiProvider(BaseProvider):
                 access_token: env/AKAMAI_ACCESS_TOKEN
                 client_token: env/AKAMAI_CLIENT_TOKEN
                 contract_id: env/AKAMAI_CONTRACT_ID (optional)
+                max_workers: 1 (optional)
 
             zones:
               example.com.:
@@ -155,6 +157,10 @@ class AkamaiProvider(BaseProvider):
         a new zone. If the zone being managed already exists in Akamai for the
         user in question, then this paramater is not needed.
 
+        The max_workers parameter is optional, it's the number of changes to
+        apply concurrently. Changes to the same node are always applied in
+        order. It defaults to 1.
+
     '''
 
     SUPPORTS_GEO = False
@@ -164,7 +170,8 @@ class AkamaiProvider(BaseProvider):
                     'SRV', 'SSHFP', 'TXT'))
 
     def __init__(self, id, client_secret, host, access_token, client_token,
-                 contract_id=None, gid=None, *args, **kwargs):
+                 contract_id=None, gid=None, max_workers=1, *args,
+                 **kwargs):
 
         self.log = getLogger('AkamaiProvider[{}]'.format(id))
         self.log.debug('__init__: id=%s, ')
@@ -172,6 +179,8 @@ class AkamaiProvider(BaseProvider):
 
         self._dns_client = AkamaiClient(client_secret, host, access_token,
                                         client_token)
+        self._engine = RequestEngine(max_workers)
+        self._engine.mount(self._dns_client._sess)
 
         self._zone_records = {}
         self._contractId = contract_id
@@ -208,7 +217,7 @@ class AkamaiProvider(BaseProvider):
                 continue
             values[_name][_type].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -217,7 +226,7 @@ class AkamaiProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         exists = zone.name in self._zone_records
-        found = len(zone.records) - before
+        found = zone.record_count - before
         self.log.info('populate:   found %s records, exists=%s', found, exists)
 
         return exists
@@ -236,10 +245,12 @@ class AkamaiProvider(BaseProvider):
             params = self._build_zone_config(zone_name)
             self._dns_client.zone_create(self._contractId, params, self._gid)
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
 
+        self._engine.apply(changes, apply_change)
+
         # Clear out the cache if any
         self._zone_records.pop(desired.name, None)
 
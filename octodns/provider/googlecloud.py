@@ -207,7 +207,7 @@ class GoogleCloudProvider(BaseProvider):
                        target, lenient)
 
         exists = False
-        before = len(zone.records)
+        before = zone.record_count
 
         gcloud_zone = self.gcloud_zones.get(zone.name)
 
@@ -234,7 +234,7 @@ class GoogleCloudProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         self.log.info('populate: found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _data_for_A(self, gcloud_record):
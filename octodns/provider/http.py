@@ -0,0 +1,175 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from random import uniform
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from threading import Lock
+from time import sleep, time
+
+
+def _change_node(change):
+    return change.record.name
+
+
+class RequestEngine(object):
+    '''
+    Runs a provider's requests with bounded concurrency.
+
+    Work is split in to groups, the items of a group are run one after another
+    in the order they were given while separate groups are run concurrently on
+    up to max_workers threads. With max_workers of 1, the default, everything
+    is run in order on the calling thread.
+
+    Sessions passed through `mount` get connection pools large enough for each
+    worker to keep its connection alive between requests.
+    '''
+    log = getLogger('RequestEngine')
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+
+    def mount(self, sess):
+        pool_size = max(self.max_workers, DEFAULT_POOLSIZE)
+        for prefix in ('http://', 'https://'):
+            sess.mount(prefix, HTTPAdapter(pool_maxsize=pool_size))
+        return sess
+
+    def run(self, items, fn, key=None):
+        '''
+        Calls fn for each of items, returning the results in the same order.
+        Items with the same key are run in order and a group stops at its
+        first exception, without a key every item is independent. Once
+        everything has finished the exception of the earliest group to fail,
+        if any, is raised.
+        '''
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+
+        groups = OrderedDict()
+        for i, item in enumerate(items):
+            groups.setdefault(key(item) if key else i, []).append((i, item))
+        self.log.debug('run: items=%d, groups=%d, max_workers=%d', len(items),
+                       len(groups), self.max_workers)
+
+        results = [None] * len(items)
+
+        def run_group(group):
+            for i, item in group:
+                results[i] = fn(item)
+
+        max_workers = min(self.max_workers, len(groups))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_group, group)
+                       for group in groups.values()]
+        for future in futures:
+            future.result()
+
+        return results
+
+    def pages(self, fetch, last_page):
+        '''
+        Fetches every page of a listing, the first on its own to find out how
+        many there are and then the rest concurrently. `fetch(page)` returns
+        the response for a page, numbered from 1, and `last_page(first)` the
+        number of the last page given the first's response. Returns the
+        responses in page order.
+        '''
+        first = fetch(1)
+        rest = range(2, last_page(first) + 1)
+        self.log.debug('pages: pages=%d', len(rest) + 1)
+        return [first] + self.run(rest, fetch)
+
+    def apply(self, changes, fn):
+        '''
+        Calls fn for each of changes, changes to the same node are applied in
+        order, e.g. a node's deletes before its creates.
+        '''
+        return self.run(changes, fn, key=_change_node)
+
+
+class RateLimiter(object):
+    '''
+    Paces a provider's requests, shared by all of its threads.
+
+    Up to `burst` requests can be made back to back after which they're spaced
+    out to `rate` per second. A rate of None, the default, doesn't limit
+    anything on its own.
+
+    Providers whose APIs report the remaining quota pass it to `update`. While
+    more than `reserve` requests remain nothing is slowed down, past that
+    point requests are spread out over the rest of the window, increasingly
+    so the closer the quota gets to running out. `backoff` pauses everyone for
+    a while, e.g. after the API has refused a request. Each waiter stretches
+    its own wait by up to `jitter` so that concurrent workers don't all wake
+    at once.
+    '''
+    log = getLogger('RateLimiter')
+
+    @classmethod
+    def for_delay(cls, delay, **kwargs):
+        '''
+        A limiter that keeps requests at least `delay` seconds apart, the
+        replacement for sleeping after every request.
+        '''
+        delay = float(delay)
+        return cls(rate=1 / delay if delay > 0 else None, **kwargs)
+
+    def __init__(self, rate=None, burst=1, reserve=0, jitter=0.1):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self.jitter = jitter
+        self._lock = Lock()
+        self._tokens = burst
+        self._last = None
+        self._paused_until = 0
+
+    def acquire(self):
+        '''
+        Blocks until a request can be made, returns the time spent waiting.
+        '''
+        with self._lock:
+            now = time()
+            wait = max(self._paused_until - now, 0)
+            if self.rate:
+                if self._last is not None:
+                    self._tokens = min(self.burst, self._tokens +
+                                       (now - self._last) * self.rate)
+                self._last = now
+                # going in to debt reserves a slot for this caller, later ones
+                # queue up behind it
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+        if wait > 0:
+            if self.jitter:
+                wait *= 1 + uniform(0, self.jitter)
+            self.log.debug('acquire: waiting %.3fs', wait)
+            sleep(wait)
+        return wait
+
+    def update(self, remaining, limit, period):
+        '''
+        Records that `remaining` of `limit` requests are left in a window of
+        `period` seconds.
+        '''
+        if remaining > self.reserve:
+            return
+        delay = period / max(limit, 1) * (self.reserve - remaining + 1)
+        self.log.debug('update: remaining=%d, limit=%d, slowing down by '
+                       '%.3fs', remaining, limit, delay)
+        self.backoff(delay)
+
+    def backoff(self, delay):
+        '''
+        Holds back all requests for at least `delay` seconds.
+        '''
+        with self._lock:
+            self._paused_until = max(self._paused_until, time() + delay)
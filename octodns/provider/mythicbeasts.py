@@ -12,6 +12,7 @@ from logging import getLogger
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RequestEngine
 
 from collections import defaultdict
 
@@ -72,6 +73,9 @@ class MythicBeastsProvider(BaseProvider):
         class: octodns.provider.mythicbeasts.MythicBeastsProvider
           passwords:
             my.domain.: 'password'
+          # The number of changes to apply concurrently, changes to the same
+          # node are always applied in order (optional, default 1)
+          max_workers: 1
 
     zones:
       my.domain.:
@@ -106,7 +110,8 @@ class MythicBeastsProvider(BaseProvider):
                     'SRV', 'SSHFP', 'CAA', 'TXT'))
     BASE = 'https://dnsapi.mythic-beasts.com/'
 
-    def __init__(self, identifier, passwords, *args, **kwargs):
+    def __init__(self, identifier, passwords, max_workers=1, *args,
+                 **kwargs):
         self.log = getLogger('MythicBeastsProvider[{}]'.format(identifier))
 
         assert isinstance(passwords, dict), 'Passwords must be a dictionary'
@@ -118,8 +123,8 @@ class MythicBeastsProvider(BaseProvider):
         super(MythicBeastsProvider, self).__init__(identifier, *args, **kwargs)
 
         self._passwords = passwords
-        sess = Session()
-        self._sess = sess
+        self._engine = RequestEngine(max_workers)
+        self._sess = self._engine.mount(Session())
 
     def _request(self, method, path, data=None):
         self.log.debug('_request: method=%s, path=%s data=%s',
@@ -318,7 +323,7 @@ class MythicBeastsProvider(BaseProvider):
 
         resp = self.records(zone.name)
 
-        before = len(zone.records)
+        before = zone.record_count
         exists = False
         data = defaultdict(lambda: defaultdict(lambda: {
             'raw_values': [],
@@ -371,7 +376,7 @@ class MythicBeastsProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         self.log.debug('populate:   found %s records, exists=%s',
-                       len(zone.records) - before, exists)
+                       zone.record_count - before, exists)
 
         return exists
 
@@ -469,6 +474,8 @@ class MythicBeastsProvider(BaseProvider):
         self.log.debug('_apply: zone=%s, len(changes)=%d', desired.name,
                        len(changes))
 
-        for change in changes:
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name))(change)
+
+        self._engine.apply(changes, apply_change)
@@ -11,10 +11,10 @@ from collections import OrderedDict, defaultdict
 from nsone import NSONE
 from nsone.rest.errors import RateLimitException, ResourceException
 from incf.countryutils import transformations
-from time import sleep
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RateLimiter
 
 
 class Ns1Provider(BaseProvider):
@@ -24,6 +24,9 @@ class Ns1Provider(BaseProvider):
     nsone:
         class: octodns.provider.ns1.Ns1Provider
         api_key: env/NS1_API_KEY
+        # The number of times a change is retried after the API has refused it
+        # for exceeding the rate limit (optional, default 3)
+        rate_limit_retries: 3
     '''
     SUPPORTS_GEO = True
     SUPPORTS_DYNAMIC = False
@@ -32,11 +35,14 @@ class Ns1Provider(BaseProvider):
 
     ZONE_NOT_FOUND_MESSAGE = 'server error: zone not found'
 
-    def __init__(self, id, api_key, *args, **kwargs):
+    def __init__(self, id, api_key, rate_limit_retries=3, *args, **kwargs):
         self.log = getLogger('Ns1Provider[{}]'.format(id))
-        self.log.debug('__init__: id=%s, api_key=***', id)
+        self.log.debug('__init__: id=%s, api_key=***, rate_limit_retries=%d',
+                       id, rate_limit_retries)
         super(Ns1Provider, self).__init__(id, *args, **kwargs)
         self._client = NSONE(apiKey=api_key)
+        self.rate_limit_retries = rate_limit_retries
+        self._limiter = RateLimiter()
 
     def _data_for_A(self, _type, record):
         # record meta (which would include geo information is only
@@ -188,7 +194,8 @@ class Ns1Provider(BaseProvider):
                        target, lenient)
 
         try:
-            nsone_zone = self._client.loadZone(zone.name[:-1])
+            nsone_zone = self._rate_limited('populate', self._client.loadZone,
+                                            zone.name[:-1])
             records = nsone_zone.data['records']
 
             # change answers for certain types to always be absolute
@@ -199,7 +206,8 @@ class Ns1Provider(BaseProvider):
                         if not a.endswith('.'):
                             record['short_answers'][i] = '{}.'.format(a)
 
-            geo_records = nsone_zone.search(has_geo=True)
+            geo_records = self._rate_limited('populate', nsone_zone.search,
+                                             has_geo=True)
             exists = True
         except ResourceException as e:
             if e.message != self.ZONE_NOT_FOUND_MESSAGE:
@@ -208,7 +216,7 @@ class Ns1Provider(BaseProvider):
             geo_records = []
             exists = False
 
-        before = len(zone.records)
+        before = zone.record_count
         # geo information isn't returned from the main endpoint, so we need
         # to query for all records with geo information
         zone_hash = {}
@@ -223,7 +231,7 @@ class Ns1Provider(BaseProvider):
             zone_hash[(_type, name)] = record
         [zone.add_record(r, lenient=lenient) for r in zone_hash.values()]
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _params_for_A(self, record):
@@ -301,50 +309,47 @@ class Ns1Provider(BaseProvider):
     def _get_name(self, record):
         return record.fqdn[:-1] if record.name == '' else record.name
 
+    def _rate_limited(self, method, fn, *args, **kwargs):
+        retries = self.rate_limit_retries
+        while True:
+            self._limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except RateLimitException as e:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                period = float(e.period)
+                self.log.warn('%s: rate limit encountered, pausing for %ds '
+                              'and trying again', method, period)
+                # hold back everything else too, the quota is shared
+                self._limiter.backoff(period)
+
     def _apply_Create(self, nsone_zone, change):
         new = change.new
         name = self._get_name(new)
         _type = new._type
         params = getattr(self, '_params_for_{}'.format(_type))(new)
         meth = getattr(nsone_zone, 'add_{}'.format(_type))
-        try:
-            meth(name, **params)
-        except RateLimitException as e:
-            period = float(e.period)
-            self.log.warn('_apply_Create: rate limit encountered, pausing '
-                          'for %ds and trying again', period)
-            sleep(period)
-            meth(name, **params)
+        self._rate_limited('_apply_Create', meth, name, **params)
 
     def _apply_Update(self, nsone_zone, change):
         existing = change.existing
         name = self._get_name(existing)
         _type = existing._type
-        record = nsone_zone.loadRecord(name, _type)
+        record = self._rate_limited('_apply_Update', nsone_zone.loadRecord,
+                                    name, _type)
         new = change.new
         params = getattr(self, '_params_for_{}'.format(_type))(new)
-        try:
-            record.update(**params)
-        except RateLimitException as e:
-            period = float(e.period)
-            self.log.warn('_apply_Update: rate limit encountered, pausing '
-                          'for %ds and trying again', period)
-            sleep(period)
-            record.update(**params)
+        self._rate_limited('_apply_Update', record.update, **params)
 
     def _apply_Delete(self, nsone_zone, change):
         existing = change.existing
         name = self._get_name(existing)
         _type = existing._type
-        record = nsone_zone.loadRecord(name, _type)
-        try:
-            record.delete()
-        except RateLimitException as e:
-            period = float(e.period)
-            self.log.warn('_apply_Delete: rate limit encountered, pausing '
-                          'for %ds and trying again', period)
-            sleep(period)
-            record.delete()
+        record = self._rate_limited('_apply_Delete', nsone_zone.loadRecord,
+                                    name, _type)
+        self._rate_limited('_apply_Delete', record.delete)
 
     def _apply(self, plan):
         desired = plan.desired
@@ -354,12 +359,14 @@ class Ns1Provider(BaseProvider):
 
         domain_name = desired.name[:-1]
         try:
-            nsone_zone = self._client.loadZone(domain_name)
+            nsone_zone = self._rate_limited('_apply', self._client.loadZone,
+                                            domain_name)
         except ResourceException as e:
             if e.message != self.ZONE_NOT_FOUND_MESSAGE:
                 raise
             self.log.debug('_apply:   no matching zone, creating')
-            nsone_zone = self._client.createZone(domain_name)
+            nsone_zone = self._rate_limited('_apply', self._client.createZone,
+                                            domain_name)
 
         for change in changes:
             class_name = change.__class__.__name__
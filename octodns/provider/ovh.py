@@ -73,7 +73,7 @@ class OvhProvider(BaseProvider):
         for record in records:
             values[record['subDomain']][record['fieldType']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 if _type not in self.SUPPORTS:
@@ -86,7 +86,7 @@ class OvhProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _apply(self, plan):
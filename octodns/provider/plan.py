@@ -6,14 +6,36 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 from StringIO import StringIO
+from hashlib import sha1
+from json import dumps
 from logging import DEBUG, ERROR, INFO, WARN, getLogger
 from sys import stdout
 
+from ..record import Create, Delete, Record, Update
+
 
 class UnsafePlan(Exception):
     pass
 
 
+class StalePlan(Exception):
+    pass
+
+
+def _record_data(record):
+    data = record.data
+    data['type'] = record._type
+    if record._octodns:
+        data['octodns'] = record._octodns
+    return data
+
+
+def _zone_digest(zone):
+    records = sorted(zone.records, key=lambda r: r._key) if zone else []
+    data = [[r.name, r._type, r.data] for r in records]
+    return sha1(dumps(data, sort_keys=True)).hexdigest()
+
+
 class Plan(object):
     log = getLogger('Plan')
 
@@ -41,7 +63,7 @@ class Plan(object):
         self.change_counts = change_counts
 
         try:
-            existing_n = len(self.existing.records)
+            existing_n = self.existing.record_count
         except AttributeError:
             existing_n = 0
 
@@ -54,9 +76,9 @@ class Plan(object):
     def raise_if_unsafe(self):
         # TODO: what is safe really?
         if self.existing and \
-           len(self.existing.records) >= self.MIN_EXISTING_RECORDS:
+           self.existing.record_count >= self.MIN_EXISTING_RECORDS:
 
-            existing_record_count = len(self.existing.records)
+            existing_record_count = self.existing.record_count
             update_pcent = self.change_counts['Update'] / existing_record_count
             delete_pcent = self.change_counts['Delete'] / existing_record_count
 
@@ -75,20 +97,135 @@ class Plan(object):
                                      self.change_counts['Delete'],
                                      existing_record_count))
 
+    @property
+    def existing_digest(self):
+        '''
+        A digest of the existing records the plan was made against
+        '''
+        return _zone_digest(self.existing)
+
+    def to_data(self):
+        '''
+        A JSON serializable representation of the plan. It holds the changes'
+        new records, existing records are represented by the digest and are
+        re-populated when the plan is rebuilt, see `from_data`.
+        '''
+        changes = []
+        for change in self.changes:
+            record = change.record
+            new = change.new
+            changes.append({
+                'operation': change.__class__.__name__,
+                'name': record.name,
+                'type': record._type,
+                'new': _record_data(new) if new else None,
+                'source': new.source.id if new and new.source else None,
+            })
+        return {
+            'zone': self.desired.name,
+            'exists': self.exists,
+            'existing_digest': self.existing_digest,
+            'changes': changes,
+        }
+
+    @classmethod
+    def from_data(cls, data, existing, sources={}, **kwargs):
+        '''
+        Rebuilds a plan from `to_data` given the target's existing records,
+        raising StalePlan if they've changed since the plan was made. sources
+        maps ids to providers for the new records' sources.
+        '''
+        if _zone_digest(existing) != data['existing_digest']:
+            raise StalePlan('Existing records for {} have changed since the '
+                            'plan was made'.format(existing.name))
+
+        existing_records = {r._key: r for r in existing.records}
+        changes = []
+        desired = existing.__class__(existing.name, existing.sub_zones)
+        for change in data['changes']:
+            operation = change['operation']
+            key = (change['name'], change['type'])
+            if operation == 'Delete':
+                changes.append(Delete(existing_records.pop(key)))
+                continue
+            new = Record.new(desired, change['name'], change['new'],
+                             source=sources.get(change['source']),
+                             lenient=True)
+            desired.add_record(new, lenient=True)
+            if operation == 'Create':
+                changes.append(Create(new))
+            else:
+                changes.append(Update(existing_records.pop(key), new))
+        # Whatever's left is unchanged
+        for record in existing_records.values():
+            desired.add_record(record, lenient=True)
+
+        return cls(existing, desired, changes, data['exists'], **kwargs)
+
     def __repr__(self):
         return 'Creates={}, Updates={}, Deletes={}, Existing Records={}' \
             .format(self.change_counts['Create'], self.change_counts['Update'],
                     self.change_counts['Delete'],
-                    len(self.existing.records))
+                    self.existing.record_count)
 
 
 class _PlanOutput(object):
+    '''
+    Plan outputs are handed plans one at a time, as they become available, so
+    that they can be written out straight away rather than once every zone
+    has been planned: `start`, then `add` for each (target, plan), and
+    finally `finish`. All three are passed the same keyword arguments, e.g.
+    `log` or `fh`. `run` does the whole thing for an iterable of plans.
+
+    Subclasses implement `_add` and `_finish`. Those that only implement
+    `run` are handed all of the plans at the end instead, see `_streams`.
+
+    Streamed plans arrive in zone order, as each zone finishes planning,
+    rather than children first. Streaming gets output written sooner, it
+    doesn't reduce memory use, the plans are still kept around to be checked
+    and applied.
+    '''
 
     def __init__(self, name):
         self.name = name
+        self._current_zone = None
+        self._count = 0
+
+    def start(self, **kwargs):
+        self._current_zone = None
+        self._count = 0
+
+    def add(self, target, plan, **kwargs):
+        self._count += 1
+        new_zone = plan.desired.name != self._current_zone
+        self._current_zone = plan.desired.name
+        self._add(target, plan, new_zone, **kwargs)
+
+    def finish(self, **kwargs):
+        self._finish(self._count, **kwargs)
+
+    def run(self, plans, *args, **kwargs):
+        self.start(**kwargs)
+        for target, plan in plans:
+            self.add(target, plan, **kwargs)
+        self.finish(**kwargs)
+
+
+def _streams(output):
+    '''
+    Whether output can be handed plans one at a time with `start`, `add` &
+    `finish` rather than all at once with `run`.
+    '''
+    if isinstance(output, _PlanOutput):
+        # add needs an _add to hand the plans to, subclasses that only
+        # implement run haven't opted in
+        return hasattr(output, '_add')
+    return callable(getattr(output, 'add', None))
 
 
 class PlanLogger(_PlanOutput):
+    HR = '*****************************************************************' \
+        '***************\n'
 
     def __init__(self, name, level='info'):
         super(PlanLogger, self).__init__(name)
@@ -104,46 +241,47 @@ class PlanLogger(_PlanOutput):
             raise Exception('Unsupported level: {}'.format(level))
 
     def run(self, log, plans, *args, **kwargs):
-        hr = '*************************************************************' \
-            '*******************\n'
+        super(PlanLogger, self).run(plans, log=log)
+
+    def _add(self, target, plan, new_zone, log, **kwargs):
+        # Each plan is logged on its own
+        hr = self.HR
         buf = StringIO()
         buf.write('\n')
-        if plans:
-            current_zone = None
-            for target, plan in plans:
-                if plan.desired.name != current_zone:
-                    current_zone = plan.desired.name
-                    buf.write(hr)
-                    buf.write('* ')
-                    buf.write(current_zone)
-                    buf.write('\n')
-                    buf.write(hr)
-
-                buf.write('* ')
-                buf.write(target.id)
-                buf.write(' (')
-                buf.write(target)
-                buf.write(')\n*   ')
-
-                if plan.exists is False:
-                    buf.write('Create ')
-                    buf.write(str(plan.desired))
-                    buf.write('\n*   ')
-
-                for change in plan.changes:
-                    buf.write(change.__repr__(leader='* '))
-                    buf.write('\n*   ')
-
-                buf.write('Summary: ')
-                buf.write(plan)
-                buf.write('\n')
-        else:
+        if new_zone:
             buf.write(hr)
-            buf.write('No changes were planned\n')
-        buf.write(hr)
+            buf.write('* ')
+            buf.write(plan.desired.name)
+            buf.write('\n')
+            buf.write(hr)
+
+        buf.write('* ')
+        buf.write(target.id)
+        buf.write(' (')
+        buf.write(target)
+        buf.write(')\n*   ')
+
+        if plan.exists is False:
+            buf.write('Create ')
+            buf.write(str(plan.desired))
+            buf.write('\n*   ')
+
+        for change in plan.changes:
+            buf.write(change.__repr__(leader='* '))
+            buf.write('\n*   ')
+
+        buf.write('Summary: ')
+        buf.write(plan)
         buf.write('\n')
+        buf.write(hr)
         log.log(self.level, buf.getvalue())
 
+    def _finish(self, count, log, **kwargs):
+        if not count:
+            hr = self.HR
+            log.log(self.level, '\n{}No changes were planned\n{}'
+                    .format(hr, hr))
+
 
 def _value_stringifier(record, sep):
     try:
@@ -158,79 +296,74 @@ def _value_stringifier(record, sep):
 
 class PlanMarkdown(_PlanOutput):
 
-    def run(self, plans, fh=stdout, *args, **kwargs):
-        if plans:
-            current_zone = None
-            for target, plan in plans:
-                if plan.desired.name != current_zone:
-                    current_zone = plan.desired.name
-                    fh.write('## ')
-                    fh.write(current_zone)
-                    fh.write('\n\n')
-
-                fh.write('### ')
-                fh.write(target.id)
-                fh.write('\n\n')
-
-                fh.write('| Operation | Name | Type | TTL | Value | Source |\n'
-                         '|--|--|--|--|--|--|\n')
-
-                if plan.exists is False:
-                    fh.write('| Create | ')
-                    fh.write(str(plan.desired))
-                    fh.write(' | | | | |\n')
-
-                for change in plan.changes:
-                    existing = change.existing
-                    new = change.new
-                    record = change.record
-                    fh.write('| ')
-                    fh.write(change.__class__.__name__)
-                    fh.write(' | ')
-                    fh.write(record.name)
-                    fh.write(' | ')
-                    fh.write(record._type)
-                    fh.write(' | ')
-                    # TTL
-                    if existing:
-                        fh.write(unicode(existing.ttl))
-                        fh.write(' | ')
-                        fh.write(_value_stringifier(existing, '; '))
-                        fh.write(' | |\n')
-                        if new:
-                            fh.write('| | | | ')
-
-                    if new:
-                        fh.write(unicode(new.ttl))
-                        fh.write(' | ')
-                        fh.write(_value_stringifier(new, '; '))
-                        fh.write(' | ')
-                        if new.source:
-                            fh.write(new.source.id)
-                        fh.write(' |\n')
-
-                fh.write('\nSummary: ')
-                fh.write(unicode(plan))
-                fh.write('\n\n')
-        else:
+    def _add(self, target, plan, new_zone, fh=stdout, **kwargs):
+        if new_zone:
+            fh.write('## ')
+            fh.write(plan.desired.name)
+            fh.write('\n\n')
+
+        fh.write('### ')
+        fh.write(target.id)
+        fh.write('\n\n')
+
+        fh.write('| Operation | Name | Type | TTL | Value | Source |\n'
+                 '|--|--|--|--|--|--|\n')
+
+        if plan.exists is False:
+            fh.write('| Create | ')
+            fh.write(str(plan.desired))
+            fh.write(' | | | | |\n')
+
+        for change in plan.changes:
+            existing = change.existing
+            new = change.new
+            record = change.record
+            fh.write('| ')
+            fh.write(change.__class__.__name__)
+            fh.write(' | ')
+            fh.write(record.name)
+            fh.write(' | ')
+            fh.write(record._type)
+            fh.write(' | ')
+            # TTL
+            if existing:
+                fh.write(unicode(existing.ttl))
+                fh.write(' | ')
+                fh.write(_value_stringifier(existing, '; '))
+                fh.write(' | |\n')
+                if new:
+                    fh.write('| | | | ')
+
+            if new:
+                fh.write(unicode(new.ttl))
+                fh.write(' | ')
+                fh.write(_value_stringifier(new, '; '))
+                fh.write(' | ')
+                if new.source:
+                    fh.write(new.source.id)
+                fh.write(' |\n')
+
+        fh.write('\nSummary: ')
+        fh.write(unicode(plan))
+        fh.write('\n\n')
+        fh.flush()
+
+    def _finish(self, count, fh=stdout, **kwargs):
+        if not count:
             fh.write('## No changes were planned\n')
 
 
 class PlanHtml(_PlanOutput):
 
-    def run(self, plans, fh=stdout, *args, **kwargs):
-        if plans:
-            current_zone = None
-            for target, plan in plans:
-                if plan.desired.name != current_zone:
-                    current_zone = plan.desired.name
-                    fh.write('<h2>')
-                    fh.write(current_zone)
-                    fh.write('</h2>\n')
-
-                fh.write('<h3>')
-                fh.write(target.id)
-                fh.write('''</h3>
+    def _add(self, target, plan, new_zone, fh=stdout, **kwargs):
+        if new_zone:
+            fh.write('<h2>')
+            fh.write(plan.desired.name)
+            fh.write('</h2>\n')
+
+        fh.write('<h3>')
+        fh.write(target.id)
+        fh.write('''</h3>
 <table>
   <tr>
     <th>Operation</th>
@@ -242,44 +375,92 @@ class PlanHtml(_PlanOutput):
   </tr>
 ''')
 
-                if plan.exists is False:
-                    fh.write('  <tr>\n    <td>Create</td>\n    <td colspan=5>')
-                    fh.write(str(plan.desired))
-                    fh.write('</td>\n  </tr>\n')
-
-                for change in plan.changes:
-                    existing = change.existing
-                    new = change.new
-                    record = change.record
-                    fh.write('  <tr>\n    <td>')
-                    fh.write(change.__class__.__name__)
-                    fh.write('</td>\n    <td>')
-                    fh.write(record.name)
-                    fh.write('</td>\n    <td>')
-                    fh.write(record._type)
-                    fh.write('</td>\n')
-                    # TTL
-                    if existing:
-                        fh.write('    <td>')
-                        fh.write(unicode(existing.ttl))
-                        fh.write('</td>\n    <td>')
-                        fh.write(_value_stringifier(existing, '<br/>'))
-                        fh.write('</td>\n    <td></td>\n  </tr>\n')
-                        if new:
-                            fh.write('  <tr>\n    <td colspan=3></td>\n')
-
-                    if new:
-                        fh.write('    <td>')
-                        fh.write(unicode(new.ttl))
-                        fh.write('</td>\n    <td>')
-                        fh.write(_value_stringifier(new, '<br/>'))
-                        fh.write('</td>\n    <td>')
-                        if new.source:
-                            fh.write(new.source.id)
-                        fh.write('</td>\n  </tr>\n')
-
-                fh.write('  <tr>\n    <td colspan=6>Summary: ')
-                fh.write(unicode(plan))
-                fh.write('</td>\n  </tr>\n</table>\n')
-        else:
+        if plan.exists is False:
+            fh.write('  <tr>\n    <td>Create</td>\n    <td colspan=5>')
+            fh.write(str(plan.desired))
+            fh.write('</td>\n  </tr>\n')
+
+        for change in plan.changes:
+            existing = change.existing
+            new = change.new
+            record = change.record
+            fh.write('  <tr>\n    <td>')
+            fh.write(change.__class__.__name__)
+            fh.write('</td>\n    <td>')
+            fh.write(record.name)
+            fh.write('</td>\n    <td>')
+            fh.write(record._type)
+            fh.write('</td>\n')
+            # TTL
+            if existing:
+                fh.write('    <td>')
+                fh.write(unicode(existing.ttl))
+                fh.write('</td>\n    <td>')
+                fh.write(_value_stringifier(existing, '<br/>'))
+                fh.write('</td>\n    <td></td>\n  </tr>\n')
+                if new:
+                    fh.write('  <tr>\n    <td colspan=3></td>\n')
+
+            if new:
+                fh.write('    <td>')
+                fh.write(unicode(new.ttl))
+                fh.write('</td>\n    <td>')
+                fh.write(_value_stringifier(new, '<br/>'))
+                fh.write('</td>\n    <td>')
+                if new.source:
+                    fh.write(new.source.id)
+                fh.write('</td>\n  </tr>\n')
+
+        fh.write('  <tr>\n    <td colspan=6>Summary: ')
+        fh.write(unicode(plan))
+        fh.write('</td>\n  </tr>\n</table>\n')
+        fh.flush()
+
+    def _finish(self, count, fh=stdout, **kwargs):
+        if not count:
             fh.write('<b>No changes were planned</b>')
+
+
+class PlanJsonLines(_PlanOutput):
+    '''
+    Machine readable output, one JSON object per line so that plans can be
+    consumed as they're written. Each (target, plan) gets a `plan` line
+    followed by a `change` line for each of its changes.
+    '''
+
+    def _write(self, fh, data):
+        fh.write(dumps(data, sort_keys=True))
+        fh.write('\n')
+
+    def _add(self, target, plan, new_zone, fh=stdout, **kwargs):
+        zone = plan.desired.name
+        counts = plan.change_counts
+        self._write(fh, {
+            'kind': 'plan',
+            'zone': zone,
+            'target': target.id,
+            'exists': plan.exists,
+            'creates': counts['Create'],
+            'updates': counts['Update'],
+            'deletes': counts['Delete'],
+            'existing_records': plan.existing.record_count,
+        })
+        for change in plan.changes:
+            record = change.record
+            existing = change.existing
+            new = change.new
+            self._write(fh, {
+                'kind': 'change',
+                'zone': zone,
+                'target': target.id,
+                'operation': change.__class__.__name__,
+                'name': record.name,
+                'type': record._type,
+                'existing': existing.data if existing else None,
+                'new': new.data if new else None,
+                'source': new.source.id if new and new.source else None,
+            })
+        fh.flush()
+
+    def _finish(self, count, fh=stdout, **kwargs):
+        fh.flush()
@@ -187,7 +187,7 @@ class PowerDnsBaseProvider(BaseProvider):
                 # just re-throw
                 raise
 
-        before = len(zone.records)
+        before = zone.record_count
         exists = False
 
         if resp:
@@ -203,7 +203,7 @@ class PowerDnsBaseProvider(BaseProvider):
                 zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _records_for_multiple(self, record):
@@ -8,10 +8,10 @@ from requests import HTTPError, Session, post
 from collections import defaultdict
 import logging
 import string
-import time
 
 from ..record import Record
 from .base import BaseProvider
+from .http import RateLimiter
 
 
 def add_trailing_dot(s):
@@ -54,6 +54,8 @@ class RackspaceProvider(BaseProvider):
             username: username
             # The api key that grants access for that user (required)
             api_key: api-key
+            # Minimum amount of time between the start of requests (optional)
+            ratelimit_delay: 0.0
         '''
         self.log = logging.getLogger('RackspaceProvider[{}]'.format(id))
         super(RackspaceProvider, self).__init__(id, *args, **kwargs)
@@ -62,6 +64,7 @@ class RackspaceProvider(BaseProvider):
         self.dns_endpoint = dns_endpoint
 
         self.ratelimit_delay = float(ratelimit_delay)
+        self._limiter = RateLimiter.for_delay(self.ratelimit_delay)
 
         sess = Session()
         sess.headers.update({'X-Auth-Token': auth_token})
@@ -95,10 +98,10 @@ class RackspaceProvider(BaseProvider):
                                                    pagination_key)
         else:
             resp = self._request_for_url(method, url, data)
-        time.sleep(self.ratelimit_delay)
         return resp
 
     def _request_for_url(self, method, url, data):
+        self._limiter.acquire()
         resp = self._sess.request(method, url, json=data, timeout=self.TIMEOUT)
         self.log.debug('_request:   status=%d', resp.status_code)
         resp.raise_for_status()
@@ -107,20 +110,14 @@ class RackspaceProvider(BaseProvider):
     def _paginated_request_for_url(self, method, url, data, pagination_key):
         acc = []
 
-        resp = self._sess.request(method, url, json=data, timeout=self.TIMEOUT)
-        self.log.debug('_request:   status=%d', resp.status_code)
-        resp.raise_for_status()
-        acc.extend(resp.json()[pagination_key])
-
-        next_page = [x for x in resp.json().get('links', []) if
-                     x['rel'] == 'next']
-        if next_page:
-            url = next_page[0]['href']
-            acc.extend(self._paginated_request_for_url(method, url, data,
-                                                       pagination_key))
-            return acc
-        else:
-            return acc
+        while url:
+            resp = self._request_for_url(method, url, data).json()
+            acc.extend(resp[pagination_key])
+            next_page = [x for x in resp.get('links', []) if
+                         x['rel'] == 'next']
+            url = next_page[0]['href'] if next_page else None
+
+        return acc
 
     def _post(self, path, data=None):
         return self._request('POST', path, data=data)
@@ -204,7 +201,7 @@ class RackspaceProvider(BaseProvider):
                 return False
             raise
 
-        before = len(zone.records)
+        before = zone.record_count
 
         if resp_data:
             records = self._group_records(resp_data)
@@ -219,7 +216,7 @@ class RackspaceProvider(BaseProvider):
                     zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=True',
-                      len(zone.records) - before)
+                      zone.record_count - before)
         return True
 
     def _group_records(self, all_records):
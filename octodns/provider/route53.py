@@ -8,15 +8,22 @@ from __future__ import absolute_import, division, print_function, \
 from boto3 import client
 from botocore.config import Config
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from incf.countryutils.transformations import cca_to_ctca2
-from ipaddress import AddressValueError, ip_address
+from os import makedirs, remove, rename
+from os.path import isdir, join
+from threading import Lock
+from time import sleep, time
 from uuid import uuid4
+import json
 import logging
 import re
 
 from ..record import Record, Update
 from ..record.geo import GeoCodes
+from ..record.ip import ip_int
 from .base import BaseProvider
+from .yaml import _tmp_filename
 
 
 octal_re = re.compile(r'\\(\d\d\d)')
@@ -604,6 +611,31 @@ class Route53Provider(BaseProvider):
         # The AWS session token (optional)
         # Only needed if using temporary security credentials
         session_token:
+        # A directory in which to cache the record sets of hosted zones
+        # between runs. Entries are used when the hosted zone's record set
+        # count hasn't changed & they're younger than rrset_cache_max_age
+        # seconds. Changes made by octoDNS invalidate entries, but changes
+        # made elsewhere that don't change the count will go unnoticed until
+        # the entry expires. (optional, default no caching)
+        rrset_cache_directory: ./.octodns-cache/route53
+        # (optional, default 3600)
+        rrset_cache_max_age: 3600
+        # When > 1 health checks are loaded in the background while records
+        # are being loaded (optional, default 1)
+        max_workers: 1
+        # The limits Route53 places on a single change request, the number of
+        # ResourceRecords and the characters in their values. UPSERTs count
+        # twice. (optional, defaults to Route53's limits, 1000 & 32000)
+        max_changes: 1000
+        max_change_chars: 32000
+        # Whether or not to wait for changes to be INSYNC, propagated to all
+        # of Route53's DNS servers, before considering them applied. Changes
+        # are polled every insync_poll_interval seconds for up to
+        # insync_timeout seconds, an interval of 0 checks them once without
+        # polling (optional, default False, 10 & 600)
+        wait_for_insync: false
+        insync_poll_interval: 10
+        insync_timeout: 600
 
     Alternatively, you may leave out access_key_id, secret_access_key
     and session_token.
@@ -622,8 +654,18 @@ class Route53Provider(BaseProvider):
 
     def __init__(self, id, access_key_id=None, secret_access_key=None,
                  max_changes=1000, client_max_attempts=None,
-                 session_token=None, *args, **kwargs):
+                 session_token=None, rrset_cache_directory=None,
+                 rrset_cache_max_age=3600, max_workers=1,
+                 max_change_chars=32000, wait_for_insync=False,
+                 insync_poll_interval=10, insync_timeout=600, *args,
+                 **kwargs):
         self.max_changes = max_changes
+        self.max_change_chars = max_change_chars
+        self.wait_for_insync = wait_for_insync
+        self.insync_poll_interval = insync_poll_interval
+        self.insync_timeout = insync_timeout
+        self.rrset_cache_directory = rrset_cache_directory
+        self.rrset_cache_max_age = rrset_cache_max_age
         _msg = 'access_key_id={}, secret_access_key=***, ' \
                'session_token=***'.format(access_key_id)
         use_fallback_auth = access_key_id is None and \
@@ -648,25 +690,42 @@ class Route53Provider(BaseProvider):
                                 aws_session_token=session_token,
                                 config=config)
 
+        if rrset_cache_directory and not isdir(rrset_cache_directory):
+            makedirs(rrset_cache_directory)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers) \
+            if max_workers > 1 else None
+
+        # populate may be called from multiple threads, only list the zones
+        # once
+        self._r53_zones_lock = Lock()
         self._r53_zones = None
+        # hosted zone id -> ResourceRecordSetCount
+        self._r53_rrset_counts = {}
         self._r53_rrsets = {}
+        # guards the health check prefetch so they're only loaded once
+        self._health_checks_lock = Lock()
         self._health_checks = None
+        self._health_checks_future = None
 
     @property
     def r53_zones(self):
-        if self._r53_zones is None:
-            self.log.debug('r53_zones: loading')
-            zones = {}
-            more = True
-            start = {}
-            while more:
-                resp = self._conn.list_hosted_zones(**start)
-                for z in resp['HostedZones']:
-                    zones[z['Name']] = z['Id']
-                more = resp['IsTruncated']
-                start['Marker'] = resp.get('NextMarker', None)
-
-            self._r53_zones = zones
+        with self._r53_zones_lock:
+            if self._r53_zones is None:
+                self.log.debug('r53_zones: loading')
+                zones = {}
+                more = True
+                start = {}
+                while more:
+                    resp = self._conn.list_hosted_zones(**start)
+                    for z in resp['HostedZones']:
+                        zones[z['Name']] = z['Id']
+                        self._r53_rrset_counts[z['Id']] = \
+                            z.get('ResourceRecordSetCount', None)
+                    more = resp['IsTruncated']
+                    start['Marker'] = resp.get('NextMarker', None)
+
+                self._r53_zones = zones
 
         return self._r53_zones
 
@@ -817,33 +876,94 @@ class Route53Provider(BaseProvider):
             'ttl': int(rrset['TTL'])
         }
 
+    def _rrset_cache_filename(self, zone_id):
+        # zone ids look like /hostedzone/Z2ABC...
+        return join(self.rrset_cache_directory,
+                    '{}.json'.format(zone_id.strip('/').replace('/', '-')))
+
+    def _read_rrset_cache(self, zone_id):
+        count = self._r53_rrset_counts.get(zone_id, None)
+        if not self.rrset_cache_directory or count is None:
+            return None
+        filename = self._rrset_cache_filename(zone_id)
+        try:
+            with open(filename, 'r') as fh:
+                entry = json.load(fh)
+        except IOError:
+            return None
+        except ValueError:
+            self.log.warn('_read_rrset_cache: ignoring corrupt entry %s',
+                          filename)
+            return None
+        if entry.get('zone_id') != zone_id or entry.get('count') != count:
+            self.log.debug('_read_rrset_cache: zone_id=%s, stale', zone_id)
+            return None
+        if time() - entry.get('time', 0) > self.rrset_cache_max_age:
+            self.log.debug('_read_rrset_cache: zone_id=%s, expired', zone_id)
+            return None
+        self.log.debug('_read_rrset_cache: zone_id=%s, hit', zone_id)
+        return entry['rrsets']
+
+    def _write_rrset_cache(self, zone_id, rrsets):
+        count = self._r53_rrset_counts.get(zone_id, None)
+        if not self.rrset_cache_directory or count is None:
+            return
+        filename = self._rrset_cache_filename(zone_id)
+        tmp_filename = _tmp_filename(filename)
+        try:
+            with open(tmp_filename, 'w') as fh:
+                json.dump({
+                    'zone_id': zone_id,
+                    'count': count,
+                    'time': time(),
+                    'rrsets': rrsets,
+                }, fh)
+            rename(tmp_filename, filename)
+        except (IOError, OSError):
+            self.log.warn('_write_rrset_cache: failed to write %s', filename)
+
+    def _invalidate_rrset_cache(self, zone_id):
+        if self.rrset_cache_directory:
+            try:
+                remove(self._rrset_cache_filename(zone_id))
+            except OSError:
+                # nothing cached
+                pass
+
     def _load_records(self, zone_id):
         if zone_id not in self._r53_rrsets:
-            self.log.debug('_load_records: zone_id=%s loading', zone_id)
-            rrsets = []
-            more = True
-            start = {}
-            while more:
-                resp = \
-                    self._conn.list_resource_record_sets(HostedZoneId=zone_id,
-                                                         **start)
-                rrsets += resp['ResourceRecordSets']
-                more = resp['IsTruncated']
-                if more:
-                    start = {
-                        'StartRecordName': resp['NextRecordName'],
-                        'StartRecordType': resp['NextRecordType'],
-                    }
-                    try:
-                        start['StartRecordIdentifier'] = \
-                            resp['NextRecordIdentifier']
-                    except KeyError:
-                        pass
-
+            rrsets = self._read_rrset_cache(zone_id)
+            if rrsets is None:
+                rrsets = self._list_records(zone_id)
+                self._write_rrset_cache(zone_id, rrsets)
             self._r53_rrsets[zone_id] = rrsets
 
         return self._r53_rrsets[zone_id]
 
+    def _list_records(self, zone_id):
+        self.log.debug('_list_records: zone_id=%s loading', zone_id)
+        rrsets = []
+        more = True
+        start = {}
+        while more:
+            resp = \
+                self._conn.list_resource_record_sets(HostedZoneId=zone_id,
+                                                     **start)
+            rrsets += resp['ResourceRecordSets']
+            more = resp['IsTruncated']
+            if more:
+                start = {
+                    'StartRecordName': resp['NextRecordName'],
+                    'StartRecordType': resp['NextRecordType'],
+                }
+                try:
+                    start['StartRecordIdentifier'] = \
+                        resp['NextRecordIdentifier']
+                except KeyError:
+                    pass
+
+        return rrsets
+
     def _data_for_dynamic(self, name, _type, rrsets):
         # This converts a bunch of RRSets into their corresponding dynamic
         # Record. It's used by populate.
@@ -921,10 +1041,14 @@ class Route53Provider(BaseProvider):
         self.log.debug('populate: name=%s, target=%s, lenient=%s', zone.name,
                        target, lenient)
 
-        before = len(zone.records)
+        before = zone.record_count
         exists = False
 
         zone_id = self._get_zone_id(zone.name)
+        if target:
+            # We'll need the health checks when planning, load them while
+            # we're working on the records
+            self._prefetch_health_checks()
         if zone_id:
             exists = True
             records = defaultdict(lambda: defaultdict(list))
@@ -988,7 +1112,7 @@ class Route53Provider(BaseProvider):
                     zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records, exists=%s',
-                      len(zone.records) - before, exists)
+                      zone.record_count - before, exists)
         return exists
 
     def _gen_mods(self, action, records, existing_rrsets):
@@ -997,28 +1121,48 @@ class Route53Provider(BaseProvider):
         '''
         return [r.mod(action, existing_rrsets) for r in records]
 
+    def _prefetch_health_checks(self):
+        if not self._executor:
+            return
+        with self._health_checks_lock:
+            if self._health_checks is None and \
+               self._health_checks_future is None:
+                self.log.debug('_prefetch_health_checks: submitting')
+                self._health_checks_future = \
+                    self._executor.submit(self._load_health_checks)
+
+    def _load_health_checks(self):
+        self.log.debug('_load_health_checks: loading')
+        checks = {}
+        more = True
+        start = {}
+        while more:
+            resp = self._conn.list_health_checks(**start)
+            for health_check in resp['HealthChecks']:
+                # our format for CallerReference is dddd:hex-uuid
+                ref = health_check.get('CallerReference', 'xxxxx')
+                if len(ref) > 4 and ref[4] != ':':
+                    # ignore anything else
+                    continue
+                checks[health_check['Id']] = health_check
+
+            more = resp['IsTruncated']
+            start['Marker'] = resp.get('NextMarker', None)
+
+        return checks
+
     @property
     def health_checks(self):
-        if self._health_checks is None:
-            # need to do the first load
-            self.log.debug('health_checks: loading')
-            checks = {}
-            more = True
-            start = {}
-            while more:
-                resp = self._conn.list_health_checks(**start)
-                for health_check in resp['HealthChecks']:
-                    # our format for CallerReference is dddd:hex-uuid
-                    ref = health_check.get('CallerReference', 'xxxxx')
-                    if len(ref) > 4 and ref[4] != ':':
-                        # ignore anything else
-                        continue
-                    checks[health_check['Id']] = health_check
-
-                more = resp['IsTruncated']
-                start['Marker'] = resp.get('NextMarker', None)
-
-            self._health_checks = checks
+        with self._health_checks_lock:
+            if self._health_checks is None:
+                # need to do the first load, or wait for the prefetch to
+                # finish
+                if self._health_checks_future is not None:
+                    future = self._health_checks_future
+                    self._health_checks_future = None
+                    self._health_checks = future.result()
+                else:
+                    self._health_checks = self._load_health_checks()
 
         # We've got a cached version use it
         return self._health_checks
@@ -1034,11 +1178,11 @@ class Route53Provider(BaseProvider):
 
         # So interestingly Route53 normalizes IPAddress which will cause us to
         # fail to find see things as equivalent. To work around this we'll
-        # ip_address's returned object for equivalence
+        # compare the addresses' integers
         # E.g 2001:4860:4860::8842 -> 2001:4860:4860:0:0:0:0:8842
         if value:
-            value = ip_address(unicode(value))
-            config_ip_address = ip_address(unicode(config['IPAddress']))
+            value = ip_int(value)
+            config_ip_address = ip_int(config['IPAddress'])
         else:
             # No value so give this a None to match value's
             config_ip_address = None
@@ -1059,10 +1203,10 @@ class Route53Provider(BaseProvider):
                        fqdn, record._type, value)
 
         try:
-            ip_address(unicode(value))
+            ip_int(value)
             # We're working with an IP, host is the Host header
             healthcheck_host = record.healthcheck_host
-        except (AddressValueError, ValueError):
+        except ValueError:
             # This isn't an IP, host is the value, value should be None
             healthcheck_host = value
             value = None
@@ -1338,6 +1482,21 @@ class Route53Provider(BaseProvider):
 
         return extras
 
+    def _mods_size(self, mods):
+        '''
+        Returns the number of ResourceRecords in mods and the number of
+        characters in their values, both of which Route53 limits per change
+        request. UPSERTs count twice.
+        '''
+        count = 0
+        chars = 0
+        for mod in mods:
+            multiplier = 2 if mod['Action'] == 'UPSERT' else 1
+            rrs = mod['ResourceRecordSet'].get('ResourceRecords', [])
+            count += multiplier * len(rrs)
+            chars += multiplier * sum([len(rr['Value']) for rr in rrs])
+        return count, chars
+
     def _apply(self, plan):
         desired = plan.desired
         changes = plan.changes
@@ -1346,6 +1505,8 @@ class Route53Provider(BaseProvider):
 
         batch = []
         batch_rs_count = 0
+        batch_chars = 0
+        submitted = []
         zone_id = self._get_zone_id(desired.name, True)
         existing_rrsets = self._load_records(zone_id)
         for c in changes:
@@ -1357,39 +1518,49 @@ class Route53Provider(BaseProvider):
             # them and we CRUD in the desired order
             mods.sort(key=_mod_keyer)
 
-            mods_rs_count = sum(
-                [len(m['ResourceRecordSet'].get('ResourceRecords', ''))
-                 for m in mods]
-            )
+            mods_rs_count, mods_chars = self._mods_size(mods)
 
             if mods_rs_count > self.max_changes:
                 # a single mod resulted in too many ResourceRecords changes
                 raise Exception('Too many modifications: {}'
                                 .format(mods_rs_count))
+            if mods_chars > self.max_change_chars:
+                # a single mod resulted in too many characters
+                raise Exception('Too many characters: {}'.format(mods_chars))
 
-            # r53 limits changesets to 1000 entries
-            if (batch_rs_count + mods_rs_count) < self.max_changes:
+            # r53 limits changesets to 1000 entries & 32000 characters
+            if batch_rs_count + mods_rs_count <= self.max_changes and \
+               batch_chars + mods_chars <= self.max_change_chars:
                 # append to the batch
                 batch += mods
                 batch_rs_count += mods_rs_count
+                batch_chars += mods_chars
             else:
                 self.log.info('_apply:   sending change request for batch of '
-                              '%d mods, %d ResourceRecords', len(batch),
-                              batch_rs_count)
+                              '%d mods, %d ResourceRecords, %d chars',
+                              len(batch), batch_rs_count, batch_chars)
                 # send the batch
-                self._really_apply(batch, zone_id)
+                submitted.append(self._really_apply(batch, zone_id))
                 # start a new batch with the leftovers
                 batch = mods
                 batch_rs_count = mods_rs_count
+                batch_chars = mods_chars
 
         # the way the above process works there will always be something left
         # over in batch to process. In the case that we submit a batch up there
         # it was always the case that there was something pushing us over
         # max_changes and thus left over to submit.
         self.log.info('_apply:   sending change request for batch of %d mods,'
-                      ' %d ResourceRecords', len(batch),
-                      batch_rs_count)
-        self._really_apply(batch, zone_id)
+                      ' %d ResourceRecords, %d chars', len(batch),
+                      batch_rs_count, batch_chars)
+        submitted.append(self._really_apply(batch, zone_id))
+        # The zone's record sets cached on disk are now out of date
+        self._invalidate_rrset_cache(zone_id)
+
+        if self.wait_for_insync:
+            # All of the batches have been sent, now wait for them to
+            # propagate
+            self._wait_for_insync(submitted)
 
     def _really_apply(self, batch, zone_id):
         uuid = uuid4().hex
@@ -1399,6 +1570,43 @@ class Route53Provider(BaseProvider):
         }
         self.log.debug('_really_apply:   sending change request, comment=%s',
                        batch['Comment'])
+        start = time()
         resp = self._conn.change_resource_record_sets(
             HostedZoneId=zone_id, ChangeBatch=batch)
-        self.log.debug('_really_apply:   change info=%s', resp['ChangeInfo'])
+        change_info = resp['ChangeInfo']
+        self.log.info('_really_apply:   change id=%s, status=%s, took %.3fs',
+                      change_info['Id'], change_info['Status'],
+                      time() - start)
+        self.log.debug('_really_apply:   change info=%s', change_info)
+        return change_info['Id'], start
+
+    def _wait_for_insync(self, submitted):
+        '''
+        Polls the (change id, submitted time) pairs in submitted until
+        they're all INSYNC or insync_timeout has passed, logging how long
+        each took to propagate.
+        '''
+        pending = list(submitted)
+        # An initial check and then one per interval until the timeout, a 0
+        # interval means don't poll
+        polls = 1
+        if self.insync_poll_interval > 0:
+            polls += int(self.insync_timeout // self.insync_poll_interval)
+        for i in range(polls):
+            if i:
+                sleep(self.insync_poll_interval)
+            still_pending = []
+            for change_id, start in pending:
+                resp = self._conn.get_change(Id=change_id)
+                if resp['ChangeInfo']['Status'] == 'INSYNC':
+                    self.log.info('_wait_for_insync: change id=%s INSYNC '
+                                  'after %.1fs', change_id, time() - start)
+                else:
+                    still_pending.append((change_id, start))
+            pending = still_pending
+            if not pending:
+                return
+
+        self.log.warning('_wait_for_insync: gave up waiting after %ds, '
+                         'changes still pending: %s', self.insync_timeout,
+                         ', '.join([c for c, _ in pending]))
@@ -13,6 +13,7 @@ from requests import Session
 
 from ..record import Record, Update
 from .base import BaseProvider
+from .http import RequestEngine
 
 
 class SelectelAuthenticationRequired(Exception):
@@ -32,12 +33,13 @@ class SelectelProvider(BaseProvider):
 
     API_URL = 'https://api.selectel.ru/domains/v1'
 
-    def __init__(self, id, token, *args, **kwargs):
+    def __init__(self, id, token, max_workers=1, *args, **kwargs):
         self.log = getLogger('SelectelProvider[{}]'.format(id))
-        self.log.debug('__init__: id=%s', id)
+        self.log.debug('__init__: id=%s, max_workers=%d', id, max_workers)
         super(SelectelProvider, self).__init__(id, *args, **kwargs)
 
-        self._sess = Session()
+        self._engine = RequestEngine(max_workers)
+        self._sess = self._engine.mount(Session())
         self._sess.headers.update({
             'X-Token': token,
             'Content-Type': 'application/json',
@@ -68,12 +70,16 @@ class SelectelProvider(BaseProvider):
         return int(resp.headers['X-Total-Count'])
 
     def _request_with_pagination(self, path, total_count):
-        result = []
-        for offset in range(0, total_count, self.PAGINATION_LIMIT):
-            result += self._request('GET', path,
-                                    params={'limit': self.PAGINATION_LIMIT,
-                                            'offset': offset})
-        return result
+
+        def fetch(offset):
+            return self._request('GET', path,
+                                 params={'limit': self.PAGINATION_LIMIT,
+                                         'offset': offset})
+
+        offsets = range(0, total_count, self.PAGINATION_LIMIT)
+        return [result
+                for page in self._engine.run(offsets, fetch)
+                for result in page]
 
     def _include_change(self, change):
         if isinstance(change, Update):
@@ -93,11 +99,17 @@ class SelectelProvider(BaseProvider):
                        len(changes))
 
         zone_name = desired.name[:-1]
-        for change in changes:
+        if zone_name not in self._domain_list:
+            # Create it up front rather than having the changes race to do so
+            self.create_domain(zone_name)
+
+        def apply_change(change):
             class_name = change.__class__.__name__
             getattr(self, '_apply_{}'.format(class_name).lower())(zone_name,
                                                                   change)
 
+        self._engine.apply(changes, apply_change)
+
     def _apply_create(self, zone_name, change):
         new = change.new
         params_for = getattr(self, '_params_for_{}'.format(new._type))
@@ -222,7 +234,7 @@ class SelectelProvider(BaseProvider):
     def populate(self, zone, target=False, lenient=False):
         self.log.debug('populate: name=%s, target=%s, lenient=%s',
                        zone.name, target, lenient)
-        before = len(zone.records)
+        before = zone.record_count
         records = self.zone_records(zone)
         if records:
             values = defaultdict(lambda: defaultdict(list))
@@ -239,7 +251,7 @@ class SelectelProvider(BaseProvider):
                                         lenient=lenient)
                     zone.add_record(record)
         self.log.info('populate:   found %s records',
-                      len(zone.records) - before)
+                      zone.record_count - before)
 
     def domain_list(self):
         path = '/'
@@ -277,10 +289,8 @@ class SelectelProvider(BaseProvider):
 
     def create_record(self, zone_name, data):
         self.log.debug('Create record. Zone: %s, data %s', zone_name, data)
-        if zone_name in self._domain_list.keys():
-            domain_id = self._domain_list[zone_name]['id']
-        else:
-            domain_id = self.create_domain(zone_name)['id']
+        # _apply makes sure the domain exists
+        domain_id = self._domain_list[zone_name]['id']
 
         path = '/{}/records/'.format(domain_id)
         return self._request('POST', path, data=data)
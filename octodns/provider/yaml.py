@@ -6,15 +6,124 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 from collections import defaultdict
-from os import listdir, makedirs
-from os.path import isdir, isfile, join
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from marshal import dumps, loads
+from StringIO import StringIO
+from os import getpid, listdir, makedirs, remove, rename
+from os.path import abspath, isdir, isfile, join
+from threading import current_thread
 import logging
 
+from .. import __VERSION__
 from ..record import Record
 from ..yaml import safe_load, safe_dump
 from .base import BaseProvider
 
 
+def _tmp_filename(filename):
+    # Unique to the writer, other threads & processes can be writing the same
+    # file at the same time, e.g. providers that share a directory
+    return '{}.{}-{}.tmp'.format(filename, getpid(), current_thread().ident)
+
+
+class _ParseCache(object):
+    '''
+    An on-disk cache of the data parsed out of YAML files. Entries are keyed by
+    the file's path and record its content hash, files are always read and
+    hashed, but when the hash matches YAML parsing and order enforcement are
+    skipped entirely. Entries also note whether the file's records have been
+    validated, see YamlProvider._populate_from_data.
+
+    Entries are stored with marshal, which unlike pickle can't be made to run
+    code when they're loaded. Data marshal can't store, e.g. YAML timestamps,
+    just isn't cached.
+    '''
+    log = logging.getLogger('YamlParseCache')
+
+    # Bump this if the format of the entries changes
+    VERSION = 2
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not isdir(directory):
+            makedirs(directory)
+
+    def _cache_filename(self, path):
+        return join(self.directory, '{}.marshal'
+                    .format(sha1(path.encode('utf-8')).hexdigest()))
+
+    def _read(self, cache_filename):
+        try:
+            with open(cache_filename, 'rb') as fh:
+                return loads(fh.read())
+        except IOError:
+            # no entry
+            pass
+        except Exception:
+            self.log.warn('_read: ignoring unreadable cache entry %s',
+                          cache_filename)
+        return None
+
+    def _write(self, entry):
+        cache_filename = self._cache_filename(entry['path'])
+        try:
+            content = dumps(entry)
+        except ValueError:
+            self.log.debug('_write: not caching %s, unsupported data',
+                           entry['path'])
+            return
+        tmp_filename = _tmp_filename(cache_filename)
+        try:
+            with open(tmp_filename, 'wb') as fh:
+                fh.write(content)
+            rename(tmp_filename, cache_filename)
+        except (IOError, OSError):
+            self.log.warn('_write: failed to write cache entry %s',
+                          cache_filename)
+
+    def load(self, filename, enforce_order):
+        '''
+        Returns the entry for filename, its parsed data is in `data`.
+        '''
+        path = abspath(filename)
+        entry = self._read(self._cache_filename(path))
+        if not isinstance(entry, dict) or \
+           entry.get('version') != self.VERSION or \
+           entry.get('path') != path or \
+           (enforce_order and not entry.get('enforce_order')):
+            # nothing usable cached
+            entry = None
+
+        with open(path, 'r') as fh:
+            digest = sha1(fh.read()).hexdigest()
+            if entry and entry['hash'] == digest:
+                self.log.debug('load: hit, filename=%s', filename)
+                return entry
+            self.log.debug('load: miss, filename=%s', filename)
+            # parsed from the file so that errors point at it
+            fh.seek(0)
+            entry = {
+                'version': self.VERSION,
+                'path': path,
+                'hash': digest,
+                'enforce_order': enforce_order,
+                'data': safe_load(fh, enforce_order=enforce_order),
+                'validated': None,
+            }
+        self._write(entry)
+
+        return entry
+
+    def validated(self, entry, validated):
+        '''
+        Records that entry's records have been validated, `validated`
+        identifies what they were validated with.
+        '''
+        entry['validated'] = validated
+        self._write(entry)
+
+
 class YamlProvider(BaseProvider):
     '''
     Core provider for records configured in yaml files on disk.
@@ -29,6 +138,10 @@ class YamlProvider(BaseProvider):
         # Whether or not to enforce sorting order on the yaml config
         # (optional, default True)
         enforce_order: True
+        # A directory in which to cache the data parsed from the yaml files,
+        # files that haven't changed since they were cached won't need to be
+        # parsed again (optional, default no caching)
+        cache_directory: ./.octodns-cache
     '''
     SUPPORTS_GEO = True
     SUPPORTS_DYNAMIC = True
@@ -36,32 +149,81 @@ class YamlProvider(BaseProvider):
                     'PTR', 'SSHFP', 'SPF', 'SRV', 'TXT'))
 
     def __init__(self, id, directory, default_ttl=3600, enforce_order=True,
-                 *args, **kwargs):
+                 cache_directory=None, *args, **kwargs):
         self.log = logging.getLogger('{}[{}]'.format(
             self.__class__.__name__, id))
         self.log.debug('__init__: id=%s, directory=%s, default_ttl=%d, '
-                       'enforce_order=%d', id, directory, default_ttl,
-                       enforce_order)
+                       'enforce_order=%d, cache_directory=%s', id, directory,
+                       default_ttl, enforce_order, cache_directory)
         super(YamlProvider, self).__init__(id, *args, **kwargs)
         self.directory = directory
         self.default_ttl = default_ttl
         self.enforce_order = enforce_order
+        self.cache_directory = cache_directory
+        self._cache = _ParseCache(cache_directory) if cache_directory \
+            else None
+        # Records are validated with the ttl default filled in and by this
+        # version of octoDNS
+        self._validated = '{}:{}'.format(__VERSION__, default_ttl)
+
+    def _fingerprint_files(self, filenames):
+        # content rather than mtimes, checkouts don't preserve them
+        fingerprint = sha1('{}:{}'.format(self.default_ttl,
+                                          self.enforce_order))
+        for filename in filenames:
+            fingerprint.update(filename)
+            try:
+                with open(filename, 'rb') as fh:
+                    fingerprint.update(sha1(fh.read()).hexdigest())
+            except IOError:
+                fingerprint.update('-')
+        return fingerprint.hexdigest()
+
+    def fingerprint(self, zone_name):
+        return self._fingerprint_files([join(self.directory,
+                                             '{}yaml'.format(zone_name))])
+
+    def _load_file(self, filename):
+        '''
+        Returns the data in filename and its cache entry, if it's cached.
+        '''
+        if self._cache:
+            entry = self._cache.load(filename, self.enforce_order)
+            return entry['data'], entry
+        with open(filename, 'r') as fh:
+            return safe_load(fh, enforce_order=self.enforce_order), None
 
     def _populate_from_file(self, filename, zone, lenient):
-        with open(filename, 'r') as fh:
-            yaml_data = safe_load(fh, enforce_order=self.enforce_order)
-            if yaml_data:
-                for name, data in yaml_data.items():
-                    if not isinstance(data, list):
-                        data = [data]
-                    for d in data:
-                        if 'ttl' not in d:
-                            d['ttl'] = self.default_ttl
-                        record = Record.new(zone, name, d, source=self,
-                                            lenient=lenient)
-                        zone.add_record(record, lenient=lenient)
-            self.log.debug(
-                '_populate_from_file: successfully loaded "%s"', filename)
+        yaml_data, entry = self._load_file(filename)
+        self._populate_from_data(filename, yaml_data, zone, lenient, entry)
+
+    def _populate_from_data(self, filename, yaml_data, zone, lenient,
+                            entry=None):
+        # Cached files whose records have all passed validation don't need to
+        # be validated again
+        validated = entry is not None and \
+            entry['validated'] == self._validated
+        # Whether every record has been strictly validated
+        strict = not lenient
+        if yaml_data:
+            for name, data in yaml_data.items():
+                if not isinstance(data, list):
+                    data = [data]
+                for d in data:
+                    if 'ttl' not in d:
+                        # a copy, cached data is kept as it was parsed
+                        d = dict(d, ttl=self.default_ttl)
+                    try:
+                        strict &= not d['octodns']['lenient']
+                    except KeyError:
+                        pass
+                    record = Record.new(zone, name, d, source=self,
+                                        lenient=lenient, validated=validated)
+                    zone.add_record(record, lenient=lenient)
+        if entry is not None and strict and not validated:
+            self._cache.validated(entry, self._validated)
+        self.log.debug(
+            '_populate_from_data: successfully loaded "%s"', filename)
 
     def populate(self, zone, target=False, lenient=False):
         self.log.debug('populate: name=%s, target=%s, lenient=%s', zone.name,
@@ -72,12 +234,12 @@ class YamlProvider(BaseProvider):
             # create a completely new copy
             return False
 
-        before = len(zone.records)
+        before = zone.record_count
         filename = join(self.directory, '{}yaml'.format(zone.name))
         self._populate_from_file(filename, zone, lenient)
 
         self.log.info('populate:   found %s records, exists=False',
-                      len(zone.records) - before)
+                      zone.record_count - before)
         return False
 
     def _apply(self, plan):
@@ -110,11 +272,35 @@ class YamlProvider(BaseProvider):
 
         self._do_apply(desired, data)
 
+    def _write_if_changed(self, filename, data):
+        '''
+        Renders data and writes it to filename, unless the file already has
+        exactly that content. The write is done to a temporary file which is
+        then renamed over filename so readers never see a partial file.
+        Returns True if the file was written.
+        '''
+        buf = StringIO()
+        safe_dump(data, buf)
+        content = buf.getvalue()
+        try:
+            with open(filename, 'rb') as fh:
+                if fh.read() == content:
+                    self.log.debug('_write_if_changed: unchanged filename=%s',
+                                   filename)
+                    return False
+        except IOError:
+            # doesn't exist (yet)
+            pass
+        self.log.debug('_write_if_changed: writing filename=%s', filename)
+        tmp_filename = _tmp_filename(filename)
+        with open(tmp_filename, 'wb') as fh:
+            fh.write(content)
+        rename(tmp_filename, filename)
+        return True
+
     def _do_apply(self, desired, data):
         filename = join(self.directory, '{}yaml'.format(desired.name))
-        self.log.debug('_apply:   writing filename=%s', filename)
-        with open(filename, 'w') as fh:
-            safe_dump(dict(data), fh)
+        self._write_if_changed(filename, dict(data))
 
 
 def _list_all_yaml_files(directory):
@@ -123,7 +309,7 @@ def _list_all_yaml_files(directory):
         filename = join(directory, '{}'.format(f))
         if f.endswith('.yaml') and isfile(filename):
             yaml_files.add(filename)
-    return list(yaml_files)
+    return sorted(yaml_files)
 
 
 class SplitYamlProvider(YamlProvider):
@@ -158,18 +344,36 @@ class SplitYamlProvider(YamlProvider):
         # Whether or not to enforce sorting order on the yaml config
         # (optional, default True)
         enforce_order: True
+        # A directory in which to cache the data parsed from the yaml files,
+        # files that haven't changed since they were cached won't need to be
+        # parsed again (optional, default no caching)
+        cache_directory: ./.octodns-cache
+        # The number of threads to use when loading the record files, files
+        # are read & parsed concurrently, but records are always added in
+        # filename order (optional, default 1)
+        max_workers: 1
     '''
 
     # Any record name added to this set will be included in the catch-all file,
     # instead of a file matching the record name.
     CATCHALL_RECORD_NAMES = ('*', '')
 
-    def __init__(self, id, directory, *args, **kwargs):
+    def __init__(self, id, directory, max_workers=1, *args, **kwargs):
         super(SplitYamlProvider, self).__init__(id, directory, *args, **kwargs)
+        self.log.debug('__init__: max_workers=%d', max_workers)
+        self.max_workers = max_workers
 
     def _zone_directory(self, zone):
         return join(self.directory, zone.name)
 
+    def fingerprint(self, zone_name):
+        try:
+            filenames = _list_all_yaml_files(join(self.directory, zone_name))
+        except OSError:
+            # no directory, leave it to populate to complain
+            return None
+        return self._fingerprint_files(filenames)
+
     def populate(self, zone, target=False, lenient=False):
         self.log.debug('populate: name=%s, target=%s, lenient=%s', zone.name,
                        target, lenient)
@@ -179,14 +383,25 @@ class SplitYamlProvider(YamlProvider):
             # create a completely new copy
             return False
 
-        before = len(zone.records)
+        before = zone.record_count
         yaml_filenames = _list_all_yaml_files(self._zone_directory(zone))
         self.log.info('populate:   found %s YAML files', len(yaml_filenames))
-        for yaml_filename in yaml_filenames:
-            self._populate_from_file(yaml_filename, zone, lenient)
+        if self.max_workers > 1:
+            # Reading & parsing the files happens concurrently, map returns
+            # the results in order so records are still added, and the first
+            # error raised, in filename order
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                yaml_datas = list(executor.map(self._load_file,
+                                               yaml_filenames))
+        else:
+            yaml_datas = map(self._load_file, yaml_filenames)
+        for yaml_filename, loaded in zip(yaml_filenames, yaml_datas):
+            yaml_data, entry = loaded
+            self._populate_from_data(yaml_filename, yaml_data, zone, lenient,
+                                     entry)
 
         self.log.info('populate:   found %s records, exists=False',
-                      len(zone.records) - before)
+                      zone.record_count - before)
         return False
 
     def _do_apply(self, desired, data):
@@ -194,20 +409,28 @@ class SplitYamlProvider(YamlProvider):
         if not isdir(zone_dir):
             makedirs(zone_dir)
 
+        existing = set(_list_all_yaml_files(zone_dir))
+        written = 0
+
         catchall = dict()
         for record, config in data.items():
             if record in self.CATCHALL_RECORD_NAMES:
                 catchall[record] = config
                 continue
             filename = join(zone_dir, '{}.yaml'.format(record))
-            self.log.debug('_apply:   writing filename=%s', filename)
-            with open(filename, 'w') as fh:
-                record_data = {record: config}
-                safe_dump(record_data, fh)
+            existing.discard(filename)
+            written += self._write_if_changed(filename, {record: config})
         if catchall:
             # Scrub the trailing . to make filenames more sane.
             dname = desired.name[:-1]
             filename = join(zone_dir, '${}.yaml'.format(dname))
-            self.log.debug('_apply:   writing catchall filename=%s', filename)
-            with open(filename, 'w') as fh:
-                safe_dump(catchall, fh)
+            existing.discard(filename)
+            written += self._write_if_changed(filename, catchall)
+
+        # Anything left over is for records that no longer exist
+        for filename in sorted(existing):
+            self.log.debug('_apply:   removing filename=%s', filename)
+            remove(filename)
+
+        self.log.info('_apply:   wrote %d files, removed %d', written,
+                      len(existing))
@@ -5,11 +5,12 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
-from ipaddress import IPv4Address, IPv6Address
 from logging import getLogger
 import re
 
+from ..interning import intern_string
 from .geo import GeoCodes
+from .ip import pack_ipv4s, pack_ipv6s, parse_ipv4s, parse_ipv6s
 
 
 class Change(object):
@@ -67,36 +68,46 @@ class ValidationError(Exception):
         self.fqdn = fqdn
         self.reasons = reasons
 
+    def __reduce__(self):
+        # args holds the message, make sure we can be pickled, e.g. coming
+        # back from a worker process, with the args __init__ expects
+        return (self.__class__, (self.fqdn, self.reasons))
+
 
 class Record(object):
     log = getLogger('Record')
 
+    # There can be a lot of records, slots keep them compact. Mixins add no
+    # slots of their own, the concrete classes below declare the ones needed
+    # for the values/value, geo, & dynamic data they carry.
+    __slots__ = ('zone', 'name', '_key', '_hash', 'fqdn', 'source', 'ttl',
+                 '_octodns')
+
+    # Validation results by record class, whatever about the name matters to
+    # it, and data, see _validate. Zones generated from templates tend to
+    # repeat the same data over & over again.
+    _validated = {}
+    VALIDATED_MAX = 16384
+
     @classmethod
-    def new(cls, zone, name, data, source=None, lenient=False):
+    def new(cls, zone, name, data, source=None, lenient=False,
+            validated=False):
         fqdn = '{}.{}'.format(name, zone.name) if name else zone.name
         try:
             _type = data['type']
         except KeyError:
             raise Exception('Invalid record {}, missing type'.format(fqdn))
         try:
-            _class = {
-                'A': ARecord,
-                'AAAA': AaaaRecord,
-                'ALIAS': AliasRecord,
-                'CAA': CaaRecord,
-                'CNAME': CnameRecord,
-                'MX': MxRecord,
-                'NAPTR': NaptrRecord,
-                'NS': NsRecord,
-                'PTR': PtrRecord,
-                'SPF': SpfRecord,
-                'SRV': SrvRecord,
-                'SSHFP': SshfpRecord,
-                'TXT': TxtRecord,
-            }[_type]
+            _class = _record_classes[_type]
         except KeyError:
             raise Exception('Unknown record type: "{}"'.format(_type))
-        reasons = _class.validate(name, data)
+        if validated or (lenient and getattr(source, 'trust_populate',
+                                             False)):
+            # the data is already known to be valid, or problems would only be
+            # warned about and the source vouches for its data, so don't
+            # bother looking for them
+            return _class(zone, name, data, source=source)
+        reasons = cls._validate(_class, name, data)
         try:
             lenient |= data['octodns']['lenient']
         except KeyError:
@@ -108,6 +119,29 @@ class Record(object):
                 raise ValidationError(fqdn, reasons)
         return _class(zone, name, data, source=source)
 
+    @classmethod
+    def _validate(cls, _class, name, data):
+        # repr tells apart values that compare equal but validate differently,
+        # e.g. 1 & '1', at worst equal data misses
+        key = (_class, _class._validation_name_key(name), repr(data))
+        try:
+            return list(cls._validated[key])
+        except KeyError:
+            pass
+        reasons = _class.validate(name, data)
+        if len(cls._validated) >= cls.VALIDATED_MAX:
+            cls._validated.clear()
+        cls._validated[key] = tuple(reasons)
+        return reasons
+
+    @classmethod
+    def _validation_name_key(cls, name):
+        '''
+        Whatever about a record's name its validation depends on, nothing by
+        default.
+        '''
+        return None
+
     @classmethod
     def validate(cls, name, data):
         reasons = []
@@ -129,8 +163,16 @@ class Record(object):
         self.log.debug('__init__: zone.name=%s, type=%11s, name=%s', zone.name,
                        self.__class__.__name__, name)
         self.zone = zone
-        # force everything lower-case just to be safe
-        self.name = unicode(name).lower() if name else name
+        # force everything lower-case just to be safe, the same names show up
+        # in lots of zones so they're shared
+        self.name = intern_string(unicode(name).lower()) if name else name
+        # name, zone, & _type don't change once a record is created so we
+        # work out its identity & fqdn once up front rather than every time
+        # they're needed
+        self._key = (self.name, self._type)
+        self._hash = hash('{}:{}'.format(self.name, self._type))
+        self.fqdn = '{}.{}'.format(self.name, zone.name) if self.name \
+            else zone.name
         self.source = source
         self.ttl = int(data['ttl'])
 
@@ -143,12 +185,6 @@ class Record(object):
     def data(self):
         return self._data()
 
-    @property
-    def fqdn(self):
-        if self.name:
-            return '{}.{}'.format(self.name, self.zone.name)
-        return self.zone.name
-
     @property
     def ignored(self):
         return self._octodns.get('ignored', False)
@@ -194,17 +230,36 @@ class Record(object):
         if self.ttl != other.ttl:
             return Update(self, other)
 
+    def __getstate__(self):
+        # Providers aren't something we can pickle, e.g. when plans are
+        # handed back from worker processes, so only the source's id goes
+        # along for the ride and it's up to the receiver to swap the provider
+        # back in
+        state = {}
+        for cls in self.__class__.__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot != '_hash' and hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        # subclasses without slots of their own
+        state.update(getattr(self, '__dict__', {}))
+        # re-pickling, e.g. a plan that came from a worker, already has the id
+        state['source'] = getattr(self.source, 'id', self.source)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+        self._hash = hash('{}:{}'.format(self.name, self._type))
+
     # NOTE: we're using __hash__ and __cmp__ methods that consider Records
     # equivalent if they have the same name & _type. Values are ignored. This
     # is useful when computing diffs/changes.
 
     def __hash__(self):
-        return '{}:{}'.format(self.name, self._type).__hash__()
+        return self._hash
 
     def __cmp__(self, other):
-        a = '{}:{}'.format(self.name, self._type)
-        b = '{}:{}'.format(other.name, other._type)
-        return cmp(a, b)
+        return cmp(self._key, other._key)
 
     def __repr__(self):
         # Make sure this is always overridden
@@ -212,6 +267,8 @@ class Record(object):
 
 
 class GeoValue(object):
+    __slots__ = ('code', 'continent_code', 'country_code',
+                 'subdivision_code', 'values')
     geo_re = re.compile(r'^(?P<continent_code>\w\w)(-(?P<country_code>\w\w)'
                         r'(-(?P<subdivision_code>\w\w))?)?$')
 
@@ -224,11 +281,11 @@ class GeoValue(object):
         return reasons
 
     def __init__(self, geo, values):
-        self.code = geo
+        self.code = intern_string(geo)
         match = self.geo_re.match(geo)
-        self.continent_code = match.group('continent_code')
-        self.country_code = match.group('country_code')
-        self.subdivision_code = match.group('subdivision_code')
+        self.continent_code = intern_string(match.group('continent_code'))
+        self.country_code = intern_string(match.group('country_code'))
+        self.subdivision_code = intern_string(match.group('subdivision_code'))
         self.values = sorted(values)
 
     @property
@@ -251,6 +308,7 @@ class GeoValue(object):
 
 
 class _ValuesMixin(object):
+    __slots__ = ()
 
     @classmethod
     def validate(cls, name, data):
@@ -271,8 +329,11 @@ class _ValuesMixin(object):
         # TODO: should we natsort values?
         self.values = sorted(self._value_type.process(values))
 
+    def _values_equal(self, other):
+        return self.values == other.values
+
     def changes(self, other, target):
-        if self.values != other.values:
+        if not self._values_equal(other):
             return Update(self, other)
         return super(_ValuesMixin, self).changes(other, target)
 
@@ -305,27 +366,29 @@ class _GeoMixin(_ValuesMixin):
 
     Must be included before `Record`.
     '''
+    __slots__ = ()
 
     @classmethod
     def validate(cls, name, data):
         reasons = super(_GeoMixin, cls).validate(name, data)
-        try:
-            geo = dict(data['geo'])
-            for code, values in geo.items():
-                reasons.extend(GeoValue._validate_geo(code))
-                reasons.extend(cls._value_type.validate(values, cls._type))
-        except KeyError:
-            pass
+        if 'geo' not in data:
+            return reasons
+        for code, values in dict(data['geo']).items():
+            reasons.extend(GeoValue._validate_geo(code))
+            reasons.extend(cls._value_type.validate(values, cls._type))
         return reasons
 
     def __init__(self, zone, name, data, *args, **kwargs):
         super(_GeoMixin, self).__init__(zone, name, data, *args, **kwargs)
         try:
-            self.geo = dict(data['geo'])
+            geo = data['geo']
         except KeyError:
-            self.geo = {}
-        for code, values in self.geo.items():
-            self.geo[code] = GeoValue(code, values)
+            geo = {}
+        self.geo = {}
+        for code, values in geo.items():
+            value = GeoValue(code, values)
+            # keyed by the shared copy of the code
+            self.geo[value.code] = value
 
     def _data(self):
         ret = super(_GeoMixin, self)._data()
@@ -352,6 +415,7 @@ class _GeoMixin(_ValuesMixin):
 
 
 class _ValueMixin(object):
+    __slots__ = ()
 
     @classmethod
     def validate(cls, name, data):
@@ -384,7 +448,7 @@ class _ValueMixin(object):
 class _DynamicPool(object):
 
     def __init__(self, _id, data):
-        self._id = _id
+        self._id = intern_string(_id)
 
         values = [
             {
@@ -394,7 +458,7 @@ class _DynamicPool(object):
         ]
         values.sort(key=lambda d: d['value'])
 
-        fallback = data.get('fallback', None)
+        fallback = intern_string(data.get('fallback', None))
         self.data = {
             'fallback': fallback if fallback != 'default' else None,
             'values': values,
@@ -422,11 +486,11 @@ class _DynamicRule(object):
 
         self.data = {}
         try:
-            self.data['pool'] = data['pool']
+            self.data['pool'] = intern_string(data['pool'])
         except KeyError:
             pass
         try:
-            self.data['geos'] = sorted(data['geos'])
+            self.data['geos'] = sorted(intern_string(g) for g in data['geos'])
         except KeyError:
             pass
 
@@ -477,6 +541,8 @@ class _Dynamic(object):
 
 
 class _DynamicMixin(object):
+    __slots__ = ()
+
     geo_re = re.compile(r'^(?P<continent_code>\w\w)(-(?P<country_code>\w\w)'
                         r'(-(?P<subdivision_code>\w\w))?)?$')
 
@@ -670,32 +736,42 @@ class _IpList(object):
         if len(data) == 0:
             return ['missing value(s)']
         reasons = []
-        for value in data:
+        for value, address in zip(data, cls._parse(data)):
             if value is '':
                 reasons.append('empty value')
             elif value is None:
                 reasons.append('missing value(s)')
-            else:
-                try:
-                    cls._address_type(unicode(value))
-                except Exception:
-                    reasons.append('invalid {} address "{}"'
-                                   .format(cls._address_name, value))
+            elif address is None:
+                reasons.append('invalid {} address "{}"'
+                               .format(cls._address_name, value))
         return reasons
 
     @classmethod
     def process(cls, values):
         return values
 
+    @classmethod
+    def pack(cls, values):
+        '''
+        Returns values packed in to bytes that are equal for lists of the same
+        addresses, None if any of them aren't valid.
+        '''
+        addresses = cls._parse(values)
+        if None in addresses:
+            return None
+        return cls._pack(addresses)
+
 
 class Ipv4List(_IpList):
     _address_name = 'IPv4'
-    _address_type = IPv4Address
+    _parse = staticmethod(parse_ipv4s)
+    _pack = staticmethod(pack_ipv4s)
 
 
 class Ipv6List(_IpList):
     _address_name = 'IPv6'
-    _address_type = IPv6Address
+    _parse = staticmethod(parse_ipv6s)
+    _pack = staticmethod(pack_ipv6s)
 
 
 class _TargetValue(object):
@@ -715,7 +791,7 @@ class _TargetValue(object):
     @classmethod
     def process(self, value):
         if value:
-            return value.lower()
+            return intern_string(value.lower())
         return value
 
 
@@ -723,13 +799,41 @@ class CnameValue(_TargetValue):
     pass
 
 
-class ARecord(_DynamicMixin, _GeoMixin, Record):
+class _IpValuesMixin(object):
+    '''
+    Keeps a record's addresses packed, see _IpList.pack, alongside their text
+    so that comparing them doesn't depend on how they were written and is
+    cheap when there are lots of them.
+
+    Must be included before `_ValuesMixin`.
+    '''
+    __slots__ = ()
+
+    @property
+    def values(self):
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._packed = self._value_type.pack(values)
+
+    def _values_equal(self, other):
+        if self._packed is None or other._packed is None:
+            # something that isn't an address, lenient, compare the text
+            return super(_IpValuesMixin, self)._values_equal(other)
+        return self._packed == other._packed
+
+
+class ARecord(_DynamicMixin, _IpValuesMixin, _GeoMixin, Record):
     _type = 'A'
+    __slots__ = ('_values', '_packed', 'geo', 'dynamic')
     _value_type = Ipv4List
 
 
-class AaaaRecord(_DynamicMixin, _GeoMixin, Record):
+class AaaaRecord(_DynamicMixin, _IpValuesMixin, _GeoMixin, Record):
     _type = 'AAAA'
+    __slots__ = ('_values', '_packed', 'geo', 'dynamic')
     _value_type = Ipv6List
 
 
@@ -739,11 +843,13 @@ class AliasValue(_TargetValue):
 
 class AliasRecord(_ValueMixin, Record):
     _type = 'ALIAS'
+    __slots__ = ('value',)
     _value_type = AliasValue
 
 
 class CaaValue(object):
     # https://tools.ietf.org/html/rfc6844#page-5
+    __slots__ = ('flags', 'tag', 'value')
 
     @classmethod
     def validate(cls, data, _type):
@@ -794,11 +900,13 @@ class CaaValue(object):
 
 class CaaRecord(_ValuesMixin, Record):
     _type = 'CAA'
+    __slots__ = ('values',)
     _value_type = CaaValue
 
 
 class CnameRecord(_DynamicMixin, _ValueMixin, Record):
     _type = 'CNAME'
+    __slots__ = ('value', 'dynamic')
     _value_type = CnameValue
 
     @classmethod
@@ -809,8 +917,13 @@ class CnameRecord(_DynamicMixin, _ValueMixin, Record):
         reasons.extend(super(CnameRecord, cls).validate(name, data))
         return reasons
 
+    @classmethod
+    def _validation_name_key(cls, name):
+        return name == ''
+
 
 class MxValue(object):
+    __slots__ = ('preference', 'exchange')
 
     @classmethod
     def validate(cls, data, _type):
@@ -854,7 +967,7 @@ class MxValue(object):
             exchange = value['exchange']
         except KeyError:
             exchange = value['value']
-        self.exchange = exchange.lower()
+        self.exchange = intern_string(exchange.lower())
 
     @property
     def data(self):
@@ -874,10 +987,13 @@ class MxValue(object):
 
 class MxRecord(_ValuesMixin, Record):
     _type = 'MX'
+    __slots__ = ('values',)
     _value_type = MxValue
 
 
 class NaptrValue(object):
+    __slots__ = ('order', 'preference', 'flags', 'service', 'regexp',
+                 'replacement')
     VALID_FLAGS = ('S', 'A', 'U', 'P')
 
     @classmethod
@@ -960,6 +1076,7 @@ class NaptrValue(object):
 
 class NaptrRecord(_ValuesMixin, Record):
     _type = 'NAPTR'
+    __slots__ = ('values',)
     _value_type = NaptrValue
 
 
@@ -980,11 +1097,12 @@ class _NsValue(object):
 
     @classmethod
     def process(cls, values):
-        return values
+        return [intern_string(v) for v in values]
 
 
 class NsRecord(_ValuesMixin, Record):
     _type = 'NS'
+    __slots__ = ('values',)
     _value_type = _NsValue
 
 
@@ -994,10 +1112,12 @@ class PtrValue(_TargetValue):
 
 class PtrRecord(_ValueMixin, Record):
     _type = 'PTR'
+    __slots__ = ('value',)
     _value_type = PtrValue
 
 
 class SshfpValue(object):
+    __slots__ = ('algorithm', 'fingerprint_type', 'fingerprint')
     VALID_ALGORITHMS = (1, 2, 3, 4)
     VALID_FINGERPRINT_TYPES = (1, 2)
 
@@ -1062,10 +1182,12 @@ class SshfpValue(object):
 
 class SshfpRecord(_ValuesMixin, Record):
     _type = 'SSHFP'
+    __slots__ = ('values',)
     _value_type = SshfpValue
 
 
 class _ChunkedValuesMixin(_ValuesMixin):
+    __slots__ = ()
     CHUNK_SIZE = 255
     _unescaped_semicolon_re = re.compile(r'\w;')
 
@@ -1111,10 +1233,12 @@ class _ChunkedValue(object):
 
 class SpfRecord(_ChunkedValuesMixin, Record):
     _type = 'SPF'
+    __slots__ = ('values',)
     _value_type = _ChunkedValue
 
 
 class SrvValue(object):
+    __slots__ = ('priority', 'weight', 'port', 'target')
 
     @classmethod
     def validate(cls, data, _type):
@@ -1158,7 +1282,7 @@ class SrvValue(object):
         self.priority = int(value['priority'])
         self.weight = int(value['weight'])
         self.port = int(value['port'])
-        self.target = value['target'].lower()
+        self.target = intern_string(value['target'].lower())
 
     @property
     def data(self):
@@ -1185,6 +1309,7 @@ class SrvValue(object):
 
 class SrvRecord(_ValuesMixin, Record):
     _type = 'SRV'
+    __slots__ = ('values',)
     _value_type = SrvValue
     _name_re = re.compile(r'^_[^\.]+\.[^\.]+')
 
@@ -1196,6 +1321,10 @@ class SrvRecord(_ValuesMixin, Record):
         reasons.extend(super(SrvRecord, cls).validate(name, data))
         return reasons
 
+    @classmethod
+    def _validation_name_key(cls, name):
+        return bool(cls._name_re.match(name))
+
 
 class _TxtValue(_ChunkedValue):
     pass
@@ -1203,4 +1332,23 @@ class _TxtValue(_ChunkedValue):
 
 class TxtRecord(_ChunkedValuesMixin, Record):
     _type = 'TXT'
+    __slots__ = ('values',)
     _value_type = _TxtValue
+
+
+# The classes Record.new creates for each type
+_record_classes = {
+    'A': ARecord,
+    'AAAA': AaaaRecord,
+    'ALIAS': AliasRecord,
+    'CAA': CaaRecord,
+    'CNAME': CnameRecord,
+    'MX': MxRecord,
+    'NAPTR': NaptrRecord,
+    'NS': NsRecord,
+    'PTR': PtrRecord,
+    'SPF': SpfRecord,
+    'SRV': SrvRecord,
+    'SSHFP': SshfpRecord,
+    'TXT': TxtRecord,
+}
@@ -0,0 +1,175 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+from ipaddress import IPv4Address, IPv6Address
+from struct import pack
+import re
+
+# Addresses in these, the usual, forms are converted with plain string
+# operations, anything else is left to ipaddress
+_ipv4_re = re.compile(r'^((25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}'
+                      r'(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\Z')
+_hextet_re = re.compile(r'^[0-9a-fA-F]{1,4}\Z')
+
+_LOW_64 = (1 << 64) - 1
+
+
+def ipv4_int(value):
+    '''
+    Returns the integer for an IPv4 address, raises ValueError if it isn't
+    one.
+    '''
+    if isinstance(value, basestring) and _ipv4_re.match(value):
+        a, b, c, d = value.split('.')
+        return (int(a) << 24) | (int(b) << 16) | (int(c) << 8) | int(d)
+    try:
+        return int(IPv4Address(unicode(value)))
+    except Exception:
+        raise ValueError('invalid IPv4 address "{}"'.format(value))
+
+
+def _hextets_int(hextets):
+    n = 0
+    for hextet in hextets:
+        if not _hextet_re.match(hextet):
+            return None
+        n = (n << 16) | int(hextet, 16)
+    return n
+
+
+def _ipv6_int(value):
+    # full & compressed forms without an embedded IPv4 address or scope
+    head, compressed, tail = value.partition('::')
+    heads = head.split(':') if head else []
+    tails = tail.split(':') if tail else []
+    missing = 8 - len(heads) - len(tails)
+    if (compressed and missing < 1) or (not compressed and missing != 0):
+        return None
+    head = _hextets_int(heads)
+    tail = _hextets_int(tails)
+    if head is None or tail is None:
+        return None
+    return (((head << (16 * missing)) << (16 * len(tails))) | tail)
+
+
+def ipv6_int(value):
+    '''
+    Returns the integer for an IPv6 address, raises ValueError if it isn't
+    one.
+    '''
+    if isinstance(value, basestring):
+        n = _ipv6_int(value)
+        if n is not None:
+            return n
+    try:
+        return int(IPv6Address(unicode(value)))
+    except Exception:
+        raise ValueError('invalid IPv6 address "{}"'.format(value))
+
+
+def ip_int(value):
+    '''
+    Returns the version & integer of an IPv4 or IPv6 address, raises
+    ValueError if it's neither.
+    '''
+    try:
+        return 4, ipv4_int(value)
+    except ValueError:
+        pass
+    try:
+        return 6, ipv6_int(value)
+    except ValueError:
+        raise ValueError('invalid IP address "{}"'.format(value))
+
+
+def ipv6_text(n):
+    '''
+    Returns the canonical, RFC 5952, text of the IPv6 address n, e.g.
+    2001:db8::1.
+    '''
+    hextets = ['{:x}'.format((n >> shift) & 0xffff)
+               for shift in range(112, -16, -16)]
+    # the first of the longest runs of 2 or more 0s is replaced by ::
+    best_start = best_len = 0
+    start = None
+    for i, hextet in enumerate(hextets):
+        if hextet != '0':
+            start = None
+            continue
+        if start is None:
+            start = i
+        if i - start + 1 > best_len:
+            best_start, best_len = start, i - start + 1
+    if best_len > 1:
+        end = best_start + best_len
+        hextets[best_start:end] = ['']
+        if best_start == 0:
+            hextets.insert(0, '')
+        if end == 8:
+            hextets.append('')
+    return ':'.join(hextets)
+
+
+def ipv6_normalize(value):
+    '''
+    Returns the canonical text of an IPv6 address, raises ValueError if it
+    isn't one.
+    '''
+    return ipv6_text(ipv6_int(value))
+
+
+def ipv6_from_hex(value):
+    '''
+    Returns the canonical text of an IPv6 address written as 32 hex digits
+    without any colons, raises ValueError if it isn't one.
+    '''
+    if len(value) != 32:
+        raise ValueError('invalid IPv6 address "{}"'.format(value))
+    return ipv6_normalize(':'.join(value[i:i + 4] for i in range(0, 32, 4)))
+
+
+def _parse(parser, values):
+    ret = []
+    for value in values:
+        try:
+            ret.append(parser(value))
+        except ValueError:
+            ret.append(None)
+    return ret
+
+
+def parse_ipv4s(values):
+    '''
+    Returns the integers of a list of IPv4 addresses, None in place of any
+    that aren't valid.
+    '''
+    return _parse(ipv4_int, values)
+
+
+def parse_ipv6s(values):
+    '''
+    Returns the integers of a list of IPv6 addresses, None in place of any
+    that aren't valid.
+    '''
+    return _parse(ipv6_int, values)
+
+
+def pack_ipv4s(ints):
+    '''
+    Packs IPv4 address integers in to 4 bytes each, in numeric order, lists of
+    the same addresses pack the same regardless of their order or how they
+    were written.
+    '''
+    return pack(str('>{}I').format(len(ints)), *sorted(ints))
+
+
+def pack_ipv6s(ints):
+    '''
+    Packs IPv6 address integers in to 16 bytes each, see pack_ipv4s.
+    '''
+    return b''.join(pack(str('>QQ'), n >> 64, n & _LOW_64)
+                    for n in sorted(ints))
@@ -13,6 +13,7 @@ import dns.rdatatype
 from dns.exception import DNSException
 
 from collections import defaultdict
+from hashlib import sha1
 from os import listdir
 from os.path import join
 import logging
@@ -105,7 +106,7 @@ class AxfrBaseSource(BaseSource):
             name = zone.hostname_from_fqdn(record['name'])
             values[name][record['type']].append(record)
 
-        before = len(zone.records)
+        before = zone.record_count
         for name, types in values.items():
             for _type, records in types.items():
                 data_for = getattr(self, '_data_for_{}'.format(_type))
@@ -114,7 +115,7 @@ class AxfrBaseSource(BaseSource):
                 zone.add_record(record, lenient=lenient)
 
         self.log.info('populate:   found %s records',
-                      len(zone.records) - before)
+                      zone.record_count - before)
 
 
 class AxfrSourceException(Exception):
@@ -201,6 +202,14 @@ class ZoneFileSource(AxfrBaseSource):
 
         self._zone_records = {}
 
+    def fingerprint(self, zone_name):
+        try:
+            with open(join(self.directory, zone_name), 'rb') as fh:
+                return sha1(fh.read()).hexdigest()
+        except IOError:
+            # populate finds nothing, fine as long as that doesn't change
+            return '-'
+
     def _load_zone_file(self, zone_name):
         zonefiles = listdir(self.directory)
         if zone_name in zonefiles:
@@ -42,6 +42,15 @@ class BaseSource(object):
         raise NotImplementedError('Abstract base class, populate method '
                                   'missing')
 
+    def fingerprint(self, zone_name):
+        '''
+        Returns a string that changes whenever what populate would load for
+        the zone does, without having to load it, or None if the source can't
+        tell. Manager uses these to skip zones that haven't changed since they
+        were last synced, see its fingerprint_file.
+        '''
+        return None
+
     def supports(self, record):
         return record._type in self.SUPPORTS
 
@@ -11,9 +11,9 @@ from os import listdir
 from os.path import join
 import logging
 import re
-import textwrap
 
 from ..record import Record
+from ..record.ip import ipv6_from_hex
 from ..zone import DuplicateRecordException, SubzoneRecordException
 from .base import BaseSource
 
@@ -50,9 +50,12 @@ class TinyDnsBaseSource(BaseSource):
         values = []
         for record in records:
             # TinyDNS files have the ipv6 address written in full, but with the
-            # colons removed. This inserts a colon every 4th character to make
-            # the address correct.
-            values.append(u":".join(textwrap.wrap(record[0], 4)))
+            # colons removed
+            try:
+                values.append(ipv6_from_hex(record[0]))
+            except ValueError:
+                # leave it to validation to complain about
+                values.append(record[0])
         try:
             ttl = records[0][1]
         except IndexError:
@@ -121,7 +124,7 @@ class TinyDnsBaseSource(BaseSource):
         self.log.debug('populate: name=%s, target=%s, lenient=%s', zone.name,
                        target, lenient)
 
-        before = len(zone.records)
+        before = zone.record_count
 
         if zone.name.endswith('in-addr.arpa.'):
             self._populate_in_addr_arpa(zone, lenient)
@@ -129,7 +132,7 @@ class TinyDnsBaseSource(BaseSource):
             self._populate_normal(zone, lenient)
 
         self.log.info('populate:   found %s records',
-                      len(zone.records) - before)
+                      zone.record_count - before)
 
     def _populate_normal(self, zone, lenient):
         type_map = {
@@ -6,40 +6,76 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 from natsort import natsort_keygen
-from yaml import SafeDumper, SafeLoader, load, dump
+from yaml import load, dump
 from yaml.constructor import ConstructorError
 
+from .interning import intern_string
+
+# Use libyaml's C implementations when they're available, they're much faster
+# and the behavior, including the hooks below, is the same
+try:
+    from yaml import CSafeDumper as _SafeDumper, CSafeLoader as _SafeLoader
+except ImportError:  # pragma: nocover
+    from yaml import SafeDumper as _SafeDumper, SafeLoader as _SafeLoader
+
 
 _natsort_key = natsort_keygen()
 
 
 # Found http://stackoverflow.com/a/21912744 which guided me on how to hook in
 # here
-class SortEnforcingLoader(SafeLoader):
+class InterningLoader(_SafeLoader):
+    '''
+    Shares the keys of mappings, see intern_string, they're things like record
+    names, ttl, & type that repeat across every zone file.
+    '''
 
-    def _construct(self, node):
+    def _pairs(self, node):
         self.flatten_mapping(node)
-        ret = self.construct_pairs(node)
-        keys = [d[0] for d in ret]
-        keys_sorted = sorted(keys, key=_natsort_key)
-        for key in keys:
-            expected = keys_sorted.pop(0)
-            if key != expected:
-                raise ConstructorError(None, None, 'keys out of order: '
-                                       'expected {} got {} at {}'
-                                       .format(expected, key, node.start_mark))
+        return [(intern_string(k), v) for k, v in self.construct_pairs(node)]
+
+    def _construct(self, node):
+        return dict(self._pairs(node))
+
+
+InterningLoader.add_constructor(InterningLoader.DEFAULT_MAPPING_TAG,
+                                InterningLoader._construct)
+
+
+class SortEnforcingLoader(InterningLoader):
+
+    def _construct(self, node):
+        ret = self._pairs(node)
+        # In order keys are the norm so we only need to make sure each key
+        # sorts after the one before it, a single pass
+        prev = None
+        for key, _ in ret:
+            current = _natsort_key(key)
+            if prev is not None and current < prev:
+                self._raise_out_of_order(node, [d[0] for d in ret])
+            prev = current
         return dict(ret)
 
+    def _raise_out_of_order(self, node, keys):
+        keys_sorted = sorted(keys, key=_natsort_key)
+        # report the first key that's not where it should be
+        key, expected = [(k, e) for k, e in zip(keys, keys_sorted)
+                         if k != e][0]
+        raise ConstructorError(None, None, 'keys out of order: expected {} '
+                               'got {} at {}'.format(expected, key,
+                                                     node.start_mark))
+
 
 SortEnforcingLoader.add_constructor(SortEnforcingLoader.DEFAULT_MAPPING_TAG,
                                     SortEnforcingLoader._construct)
 
 
 def safe_load(stream, enforce_order=True):
-    return load(stream, SortEnforcingLoader if enforce_order else SafeLoader)
+    return load(stream, SortEnforcingLoader if enforce_order else
+                InterningLoader)
 
 
-class SortingDumper(SafeDumper):
+class SortingDumper(_SafeDumper):
     '''
     This sorts keys alphanumerically in a "natural" manner where things with
     the number 2 come before the number 12.
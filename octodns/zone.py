@@ -5,11 +5,13 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
+from array import array
 from collections import defaultdict
+from json import dumps, loads
 from logging import getLogger
 import re
 
-from .record import Create, Delete
+from .record import Create, Delete, Record
 
 
 class SubzoneRecordException(Exception):
@@ -40,23 +42,40 @@ class Zone(object):
         # Force everything to lowercase just to be safe
         self.name = unicode(name).lower() if name else name
         self.sub_zones = sub_zones
-        # We're grouping by node, it allows us to efficiently search for
-        # duplicates and detect when CNAMEs co-exist with other records
-        self._records = defaultdict(set)
+        # Whether the records are shared with a copy, see `copy`
+        self._shared = False
+        self._init_storage()
         # optional leading . to match empty hostname
         # optional trailing . b/c some sources don't have it on their fqdn
         self._name_re = re.compile(r'\.?{}?$'.format(name))
 
         self.log.debug('__init__: zone=%s, sub_zones=%s', self, sub_zones)
 
+    def _init_storage(self):
+        # Records indexed by (name, _type), maintained as they're added &
+        # removed so that lookups & listing never have to walk the zone
+        self._index = {}
+        # We're also grouping the types present by node, it allows us to
+        # efficiently detect when CNAMEs co-exist with other records
+        self._nodes = defaultdict(set)
+        # Frozen view of the records, built on demand and thrown away whenever
+        # the contents of the zone change
+        self._records_view = None
+
     @property
     def records(self):
-        return set([r for _, node in self._records.items() for r in node])
+        if self._records_view is None:
+            self._records_view = frozenset(self._index.values())
+        return self._records_view
+
+    @property
+    def record_count(self):
+        return len(self._index)
 
     def hostname_from_fqdn(self, fqdn):
         return self._name_re.sub('', fqdn)
 
-    def add_record(self, record, replace=False, lenient=False):
+    def _check_sub_zones(self, record, lenient):
         name = record.name
         last = name.split('.')[-1]
 
@@ -72,67 +91,109 @@ class Zone(object):
                                              'and not of type NS'
                                              .format(record.fqdn))
 
-        if replace:
-            # will remove it if it exists
-            self._records[name].discard(record)
-
-        node = self._records[name]
-        if record in node:
-            # We already have a record at this node of this type
-            raise DuplicateRecordException('Duplicate record {}, type {}'
-                                           .format(record.fqdn,
-                                                   record._type))
-        elif not lenient and (((record._type == 'CNAME' and len(node) > 0) or
-                               ('CNAME' in map(lambda r: r._type, node)))):
+    def _check_node(self, record, types, lenient):
+        if not lenient and (((record._type == 'CNAME' and len(types) > 0) or
+                             ('CNAME' in types))):
             # We're adding a CNAME to existing records or adding to an existing
             # CNAME
             raise InvalidNodeException('Invalid state, CNAME at {} cannot '
                                        'coexist with other records'
                                        .format(record.fqdn))
 
-        node.add(record)
+    def add_record(self, record, replace=False, lenient=False):
+        name = record.name
+        self._check_sub_zones(record, lenient)
+
+        self._unshare()
+        key = record._key
+        if replace and self._index.pop(key, None) is not None:
+            # we removed an existing record, clear out its node entry too
+            self._nodes[name].discard(record._type)
+            self._records_view = None
+
+        node = self._nodes[name]
+        if key in self._index:
+            # We already have a record at this node of this type
+            raise DuplicateRecordException('Duplicate record {}, type {}'
+                                           .format(record.fqdn,
+                                                   record._type))
+        self._check_node(record, node, lenient)
+
+        node.add(record._type)
+        self._index[key] = record
+        self._records_view = None
 
     def _remove_record(self, record):
         'Only for use in tests'
-        self._records[record.name].discard(record)
+        self._unshare()
+        if self._index.pop(record._key, None) is not None:
+            self._nodes[record.name].discard(record._type)
+            self._records_view = None
+
+    def copy(self):
+        '''
+        Returns a copy of the zone that shares this one's records until either
+        of them is modified, at which point the one being modified makes its
+        own copy of them.
+        '''
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        self._shared = clone._shared = True
+        return clone
+
+    def _unshare(self):
+        if self._shared:
+            self._index = dict(self._index)
+            self._nodes = defaultdict(set, ((name, set(types)) for name, types
+                                            in self._nodes.items()))
+            self._shared = False
+
+    def _rebind_sources(self, providers):
+        '''
+        Swaps the ids records' sources were pickled as, see
+        Record.__getstate__, for the corresponding providers.
+        '''
+        for record in self._index.values():
+            if isinstance(record.source, basestring):
+                record.source = providers[record.source]
+
+    def _skip(self, record, target):
+        '''
+        Returns True if record should be left out of the changes computed for
+        target, i.e. it's ignored, not included, or excluded.
+        '''
+        if not _is_eligible(record) or record.ignored:
+            return True
+        included = record.included
+        if included and target.id not in included:
+            self.log.debug('changes:  skipping record=%s %s - %s not'
+                           ' included ', record.fqdn, record._type,
+                           target.id)
+            return True
+        elif target.id in record.excluded:
+            self.log.debug('changes:  skipping record=%s %s - %s '
+                           'excluded ', record.fqdn, record._type,
+                           target.id)
+            return True
+        return False
 
     def changes(self, desired, target):
         self.log.debug('changes: zone=%s, target=%s', self, target)
 
-        # Build up a hash of the desired records, thanks to our special
-        # __hash__ and __cmp__ on Record we'll be able to look up records that
-        # match name and _type with it
-        desired_records = {r: r for r in desired.records}
+        # Both sides are indexed by (name, _type) so we can walk our records
+        # looking up their desired counterparts directly and then walk the
+        # desired records we didn't see. Each record is only looked at, and
+        # filtered, once.
+        desired_index = desired._index
 
         changes = []
 
         # Find diffs & removes
-        for record in filter(_is_eligible, self.records):
-            if record.ignored:
-                continue
-            elif len(record.included) > 0 and \
-                    target.id not in record.included:
-                self.log.debug('changes:  skipping record=%s %s - %s not'
-                               ' included ', record.fqdn, record._type,
-                               target.id)
-                continue
-            elif target.id in record.excluded:
-                self.log.debug('changes:  skipping record=%s %s - %s '
-                               'excluded ', record.fqdn, record._type,
-                               target.id)
+        for record in self.records:
+            if self._skip(record, target):
                 continue
             try:
-                desired_record = desired_records[record]
-                if desired_record.ignored:
-                    continue
-                elif len(desired_record.included) > 0 and \
-                        target.id not in desired_record.included:
-                    self.log.debug('changes:  skipping record=%s %s - %s'
-                                   'not included ', record.fqdn, record._type,
-                                   target.id)
-                    continue
-                elif target.id in desired_record.excluded:
-                    continue
+                desired_record = desired_index[record._key]
             except KeyError:
                 if not target.supports(record):
                     self.log.debug('changes:  skipping record=%s %s - %s does '
@@ -143,35 +204,330 @@ class Zone(object):
                 self.log.debug('changes: zone=%s, removed record=%s', self,
                                record)
                 changes.append(Delete(record))
+                continue
+
+            if self._skip(desired_record, target):
+                continue
+            change = record.changes(desired_record, target)
+            if change:
+                self.log.debug('changes: zone=%s, modified\n'
+                               '    existing=%s,\n     desired=%s', self,
+                               record, desired_record)
+                changes.append(change)
             else:
-                change = record.changes(desired_record, target)
-                if change:
-                    self.log.debug('changes: zone=%s, modified\n'
-                                   '    existing=%s,\n     desired=%s', self,
-                                   record, desired_record)
-                    changes.append(change)
-                else:
-                    self.log.debug('changes: zone=%s, n.c. record=%s', self,
-                                   record)
+                self.log.debug('changes: zone=%s, n.c. record=%s', self,
+                               record)
 
         # Find additions, things that are in desired, but missing in ourselves.
-        # This uses set math and our special __hash__ and __cmp__ functions as
-        # well
-        for record in filter(_is_eligible, desired.records - self.records):
-            if record.ignored:
+        # The set difference keeps creates in the order they've always been
+        # planned in, Route53 for one packs its change batches in that order.
+        for record in desired.records - self.records:
+            if self._skip(record, target):
                 continue
-            elif len(record.included) > 0 and \
-                    target.id not in record.included:
-                self.log.debug('changes:  skipping record=%s %s - %s not'
-                               ' included ', record.fqdn, record._type,
+            if not target.supports(record):
+                self.log.debug('changes:  skipping record=%s %s - %s does not '
+                               'support it', record.fqdn, record._type,
                                target.id)
                 continue
-            elif target.id in record.excluded:
-                self.log.debug('changes:  skipping record=%s %s - %s '
-                               'excluded ', record.fqdn, record._type,
-                               target.id)
+            self.log.debug('changes: zone=%s, create record=%s', self, record)
+            changes.append(Create(record))
+
+        return changes
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # The view would have to hash records while they're being unpickled,
+        # before their state has been restored, it'll be rebuilt on demand
+        state['_records_view'] = None
+        return state
+
+    def __repr__(self):
+        return 'Zone<{}>'.format(self.name)
+
+
+class _ColumnarIndex(object):
+    '''
+    The (name, _type) lookups Zone._index provides, for a ColumnarZone.
+    '''
+
+    def __init__(self, zone):
+        self.zone = zone
+
+    def __contains__(self, key):
+        return self.zone._row(*key) is not None
+
+    def __getitem__(self, key):
+        row = self.zone._row(*key)
+        if row is None:
+            raise KeyError(key)
+        return self.zone._record(row)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.zone.record_count
+
+    def values(self):
+        return list(self.zone.records)
+
+
+class ColumnarZone(Zone):
+    '''
+    A zone that stores its records in columns rather than as Record objects,
+    for zones too big to keep that way, e.g. large reverse zones.
+
+    Each record is a row made up of its name, TTL, and indexes in to tables of
+    record classes & sources, plus its remaining data encoded as an interned
+    JSON string so that records with the same data share it. Record objects
+    are created from rows when they're asked for, they're validated when
+    they're added as usual but not again. Once all of them have been asked
+    for, e.g. through `records`, they're kept until the zone is modified, as
+    Zone does with its view. Modifying one doesn't modify the zone.
+
+    Comparing two columnar zones only creates the records of rows whose class,
+    TTL, or data differ.
+    '''
+
+    def _init_storage(self):
+        # per row, names are None once a row has been removed
+        self._names = []
+        self._classes = array(b'B')
+        self._sources = array(b'H')
+        self._ttls = array(b'l')
+        self._datas = []
+        self._class_table = []
+        self._source_table = []
+        # name -> the row of the first record at it, names rarely have more
+        # than one type so the rest of them are kept separately
+        self._rows = {}
+        self._more_rows = {}
+        self._count = 0
+        # row -> record and the frozen view of them, built on demand and
+        # thrown away whenever the contents of the zone change
+        self._materialized = None
+        self._records_view = None
+
+    @property
+    def records(self):
+        if self._records_view is None:
+            self._materialized = {row: self._new_record(row)
+                                  for row in self._live_rows()}
+            self._records_view = frozenset(self._materialized.values())
+        return self._records_view
+
+    @property
+    def record_count(self):
+        return self._count
+
+    @property
+    def _index(self):
+        return _ColumnarIndex(self)
+
+    def _live_rows(self):
+        return (row for row, name in enumerate(self._names)
+                if name is not None)
+
+    def _type_of(self, row):
+        return self._class_table[self._classes[row]]._type
+
+    def _node_rows(self, name):
+        row = self._rows.get(name)
+        if row is None:
+            return []
+        return [row] + self._more_rows.get(name, [])
+
+    def _row(self, name, _type):
+        for row in self._node_rows(name):
+            if self._type_of(row) == _type:
+                return row
+        return None
+
+    def _table_index(self, table, value):
+        for i, v in enumerate(table):
+            if v is value:
+                return i
+        table.append(value)
+        return len(table) - 1
+
+    def _changed(self):
+        self._materialized = None
+        self._records_view = None
+
+    def _record(self, row):
+        if self._materialized is not None:
+            return self._materialized[row]
+        return self._new_record(row)
+
+    def _new_record(self, row):
+        data = self._datas[row]
+        if isinstance(data, Record):
+            return data
+        data = loads(data)
+        data['ttl'] = self._ttls[row]
+        _class = self._class_table[self._classes[row]]
+        return _class(self, self._names[row], data,
+                      source=self._source_table[self._sources[row]])
+
+    def _encode(self, record):
+        data = record.data
+        del data['ttl']
+        if record._octodns:
+            data['octodns'] = record._octodns
+        try:
+            # ascii-only, but unicode when given unicode separators, intern
+            # needs a str
+            return intern(str(dumps(data, sort_keys=True,
+                                    separators=(',', ':'))))
+        except (TypeError, ValueError):
+            # can't be encoded, hang on to the record itself
+            return record
+
+    def add_record(self, record, replace=False, lenient=False):
+        name = record.name
+        self._check_sub_zones(record, lenient)
+
+        self._unshare()
+        row = self._row(name, record._type)
+        if row is not None and not replace:
+            raise DuplicateRecordException('Duplicate record {}, type {}'
+                                           .format(record.fqdn,
+                                                   record._type))
+        # the row being replaced, if any, doesn't count
+        self._check_node(record, [self._type_of(r) for r in
+                                  self._node_rows(name) if r != row], lenient)
+
+        try:
+            # names are short & mostly ascii, bytes take a quarter of the
+            # space & compare equal to their unicode versions
+            stored_name = name.encode('ascii')
+        except UnicodeError:
+            stored_name = name
+        _class = self._table_index(self._class_table, record.__class__)
+        source = self._table_index(self._source_table, record.source)
+        data = self._encode(record)
+        self._changed()
+
+        if row is not None:
+            # replacing
+            self._classes[row] = _class
+            self._sources[row] = source
+            self._ttls[row] = record.ttl
+            self._datas[row] = data
+            return
+
+        row = len(self._names)
+        self._names.append(stored_name)
+        self._classes.append(_class)
+        self._sources.append(source)
+        self._ttls.append(record.ttl)
+        self._datas.append(data)
+        if stored_name in self._rows:
+            self._more_rows.setdefault(stored_name, []).append(row)
+        else:
+            self._rows[stored_name] = row
+        self._count += 1
+
+    def _remove_record(self, record):
+        'Only for use in tests'
+        self._unshare()
+        name = record.name
+        row = self._row(name, record._type)
+        if row is None:
+            return
+        self._changed()
+        more = self._more_rows.get(name, [])
+        if self._rows[name] == row:
+            if more:
+                self._rows[name] = more.pop(0)
+            else:
+                del self._rows[name]
+        else:
+            more.remove(row)
+        if name in self._more_rows and not more:
+            del self._more_rows[name]
+        self._names[row] = None
+        self._datas[row] = None
+        self._count -= 1
+
+    def _unshare(self):
+        if self._shared:
+            self._names = list(self._names)
+            self._classes = array(b'B', self._classes)
+            self._sources = array(b'H', self._sources)
+            self._ttls = array(b'l', self._ttls)
+            self._datas = list(self._datas)
+            self._class_table = list(self._class_table)
+            self._source_table = list(self._source_table)
+            self._rows = dict(self._rows)
+            self._more_rows = {name: list(rows) for name, rows in
+                               self._more_rows.items()}
+            self._shared = False
+
+    def _rebind_sources(self, providers):
+        self._source_table = [providers[s] if isinstance(s, basestring)
+                              else s for s in self._source_table]
+        self._changed()
+        for data in self._datas:
+            if isinstance(data, Record) and \
+                    isinstance(data.source, basestring):
+                data.source = providers[data.source]
+
+    def _same(self, row, other, other_row):
+        return self._ttls[row] == other._ttls[other_row] and \
+            self._datas[row] == other._datas[other_row] and \
+            self._class_table[self._classes[row]] is \
+            other._class_table[other._classes[other_row]]
+
+    def changes(self, desired, target):
+        if not isinstance(desired, ColumnarZone):
+            return super(ColumnarZone, self).changes(desired, target)
+
+        self.log.debug('changes: zone=%s, target=%s, columnar', self, target)
+        # Same as Zone.changes, but rows with the same data on both sides
+        # can't have changed and so are skipped without creating records
+        changes = []
+
+        for row in self._live_rows():
+            name = self._names[row]
+            desired_row = desired._row(name, self._type_of(row))
+            if desired_row is not None and \
+                    self._same(row, desired, desired_row):
+                continue
+            record = self._record(row)
+            if self._skip(record, target):
+                continue
+            if desired_row is None:
+                if not target.supports(record):
+                    self.log.debug('changes:  skipping record=%s %s - %s does '
+                                   'not support it', record.fqdn, record._type,
+                                   target.id)
+                    continue
+                self.log.debug('changes: zone=%s, removed record=%s', self,
+                               record)
+                changes.append(Delete(record))
+                continue
+
+            desired_record = desired._record(desired_row)
+            if self._skip(desired_record, target):
                 continue
+            change = record.changes(desired_record, target)
+            if change:
+                self.log.debug('changes: zone=%s, modified\n'
+                               '    existing=%s,\n     desired=%s', self,
+                               record, desired_record)
+                changes.append(change)
 
+        for row in desired._live_rows():
+            if self._row(desired._names[row],
+                         desired._type_of(row)) is not None:
+                continue
+            record = desired._record(row)
+            if self._skip(record, target):
+                continue
             if not target.supports(record):
                 self.log.debug('changes:  skipping record=%s %s - %s does not '
                                'support it', record.fqdn, record._type,
@@ -182,5 +538,12 @@ class Zone(object):
 
         return changes
 
-    def __repr__(self):
-        return 'Zone<{}>'.format(self.name)
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # providers can't be pickled, see Record.__getstate__
+        state['_source_table'] = [getattr(s, 'id', s)
+                                  for s in self._source_table]
+        # rebuilt on demand, see Zone.__getstate__
+        state['_materialized'] = None
+        state['_records_view'] = None
+        return state
@@ -0,0 +1,47 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+from unittest import TestCase
+from uuid import uuid4
+
+from octodns.interning import _strings, clear_interned, intern_string
+
+
+class TestInterning(TestCase):
+
+    def test_intern_string(self):
+        # built at runtime so they start out as separate objects, unique so
+        # that nothing else has interned them first
+        value = unicode(uuid4().hex)
+        first = value[:16] + value[16:]
+        second = value[:8] + value[8:]
+        self.assertIsNot(first, second)
+        self.assertIs(intern_string(first), intern_string(second))
+        self.assertIs(first, intern_string(second))
+        self.assertIsInstance(intern_string(second), unicode)
+
+        # str are handled too, & kept as str
+        first = str('').join([str('ma'), str('il')])
+        second = str('').join([str('m'), str('ail')])
+        self.assertIsNot(first, second)
+        self.assertIs(intern_string(first), intern_string(second))
+        self.assertIsInstance(intern_string(second), str)
+
+        # anything else is passed through
+        self.assertIsNone(intern_string(None))
+        self.assertEquals(42, intern_string(42))
+
+    def test_clear_interned(self):
+        value = unicode(uuid4().hex)
+        first = intern_string(value[:16] + value[16:])
+        self.assertTrue(first in _strings)
+        clear_interned()
+        self.assertFalse(_strings)
+        # a new copy is kept from then on
+        second = intern_string(value[:8] + value[8:])
+        self.assertIsNot(first, second)
+        self.assertIs(second, intern_string(value[:4] + value[4:]))
@@ -5,14 +5,22 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
-from os import environ
+from concurrent.futures import ProcessPoolExecutor
+from cPickle import HIGHEST_PROTOCOL, dumps, loads
+from json import dumps as json_dumps
+from mock import Mock, patch
+from os import environ, listdir
 from os.path import dirname, join
+from threading import Event, Lock, Thread
+from time import sleep
 from unittest import TestCase
 
+from octodns.provider.plan import Plan, StalePlan, UnsafePlan, _PlanOutput
 from octodns.record import Record
-from octodns.manager import _AggregateTarget, MainThreadExecutor, Manager
+from octodns.manager import _AggregateTarget, MainThreadExecutor, Manager, \
+    ManagerException, _populate_and_plan_in_process, _process_managers
 from octodns.yaml import safe_load
-from octodns.zone import Zone
+from octodns.zone import ColumnarZone, Zone
 
 from helpers import DynamicProvider, GeoProvider, NoSshFpProvider, \
     SimpleProvider, TemporaryDirectory
@@ -20,6 +28,46 @@ from helpers import DynamicProvider, GeoProvider, NoSshFpProvider, \
 config_dir = join(dirname(__file__), 'config')
 
 
+class _Plan(object):
+
+    def __init__(self, name, changes=1):
+        self.desired = Zone(name, [])
+        self.changes = changes
+
+
+class _ApplyTarget(object):
+
+    def __init__(self, id, log):
+        self.id = id
+        self.log = log
+        self.active = 0
+        self.max_active = 0
+        self.release = Event()
+        self.release.set()
+
+    def apply(self, plan):
+        log = self.log
+        with log.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            log.append(('start', self.id, plan.desired.name))
+        # block until released so that overlapping applies can be observed
+        self.release.wait(5)
+        with log.lock:
+            self.active -= 1
+            log.append(('end', self.id, plan.desired.name))
+        if isinstance(plan.changes, Exception):
+            raise plan.changes
+        return plan.changes
+
+
+class _ApplyLog(list):
+
+    def __init__(self):
+        super(_ApplyLog, self).__init__()
+        self.lock = Lock()
+
+
 def get_config_filename(which):
     return join(config_dir, which)
 
@@ -148,6 +196,447 @@ class TestManager(TestCase):
                 .sync(dry_run=False, force=True)
             self.assertEquals(25, tc)
 
+    def test_process_executor(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            manager = Manager(get_config_filename('simple-process.yaml'))
+            self.assertIsInstance(manager._executor, ProcessPoolExecutor)
+            tc = manager.sync(dry_run=False)
+            self.assertEquals(21, tc)
+
+            # Include meta
+            tc = Manager(get_config_filename('simple-process.yaml'),
+                         include_meta=True) \
+                .sync(dry_run=False, force=True)
+            self.assertEquals(25, tc)
+
+            # a single worker doesn't bother with processes
+            manager = Manager(get_config_filename('simple-process.yaml'),
+                              max_workers=1)
+            self.assertIsInstance(manager._executor, MainThreadExecutor)
+
+        with self.assertRaises(Exception) as ctx:
+            Manager(get_config_filename('unknown-executor.yaml'))
+        self.assertEquals('Unknown executor: fork', ctx.exception.message)
+
+    def test_columnar(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            config_file = get_config_filename('simple-columnar.yaml')
+            manager = Manager(config_file, max_workers=1)
+            zone = manager._populate('unit.tests.', [manager.providers['in']])
+            self.assertIsInstance(zone, ColumnarZone)
+            self.assertEquals(18, zone.record_count)
+            tc = manager.sync(dry_run=False)
+            self.assertEquals(21, tc)
+
+            # plans made by worker processes come back with usable records
+            plans = _populate_and_plan_in_process(config_file, False,
+                                                  'unit.tests.', ['in'],
+                                                  ['dump2'])
+            _process_managers.clear()
+            plans = loads(dumps(plans, HIGHEST_PROTOCOL))
+            manager = Manager(config_file)
+            target, plan = manager._rebind_plans(plans)[0]
+            source = manager.providers['in']
+            for record in plan.desired.records:
+                self.assertIs(source, record.source)
+            for change in plan.changes:
+                self.assertIs(source, change.new.source)
+
+        with self.assertRaises(Exception) as ctx:
+            Manager(get_config_filename('unknown-zone-storage.yaml'))
+        self.assertEquals('Unknown zone_storage: rows', ctx.exception.message)
+
+    def test_populate_and_plan_in_process(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            config_file = get_config_filename('simple-process.yaml')
+
+            # what a worker process would do
+            plans = _populate_and_plan_in_process(config_file, False,
+                                                  'unit.tests.', ['in'],
+                                                  ['dump'])
+            # it created & cached a manager
+            worker_manager = _process_managers[config_file]
+            self.assertIsInstance(worker_manager._executor,
+                                  MainThreadExecutor)
+            _populate_and_plan_in_process(config_file, False,
+                                          'subzone.unit.tests.', ['in'],
+                                          ['dump'])
+            self.assertIs(worker_manager, _process_managers[config_file])
+            _process_managers.clear()
+
+            # and then how it comes back to the parent
+            plans = loads(dumps(plans, HIGHEST_PROTOCOL))
+            self.assertEquals(1, len(plans))
+            target, plan = plans[0]
+            self.assertEquals('dump', target)
+            self.assertEquals(15, len(plan.changes))
+            self.assertEquals(set(['in']),
+                              set([r.source for r in plan.desired.records]))
+
+            manager = Manager(config_file)
+            target, plan = manager._rebind_plans(plans)[0]
+            self.assertIs(manager.providers['dump'], target)
+            source = manager.providers['in']
+            for record in plan.desired.records:
+                self.assertIs(source, record.source)
+            for change in plan.changes:
+                self.assertIs(source, change.new.source)
+            # and it's usable
+            self.assertEquals(15, target.apply(plan))
+
+    def test_concurrent_apply(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            manager = Manager(get_config_filename('simple-apply.yaml'))
+            self.assertEquals(3, manager.apply_max_workers)
+            self.assertEquals({'dump2': 1}, manager.apply_target_max_workers)
+            tc = manager.sync(dry_run=False)
+            self.assertEquals(21, tc)
+
+        # caps that would never let anything be applied are refused
+        with self.assertRaises(ManagerException) as ctx:
+            Manager(get_config_filename('bad-apply-max-workers.yaml'))
+        self.assertEquals('Invalid apply_max_workers: 0, must be an integer '
+                          'of at least 1', ctx.exception.message)
+        with self.assertRaises(ManagerException) as ctx:
+            Manager(get_config_filename('bad-apply-target-max-workers.yaml'))
+        self.assertEquals('Invalid apply_target_max_workers.dump2: -1, must '
+                          'be an integer of at least 1', ctx.exception.message)
+
+    def test_apply_plans(self):
+        manager = Manager(get_config_filename('simple.yaml'))
+        self.assertEquals(1, manager.apply_max_workers)
+        self.assertEquals({}, manager.apply_target_max_workers)
+
+        log = _ApplyLog()
+        a = _ApplyTarget('a', log)
+        b = _ApplyTarget('b', log)
+        plans = [
+            (a, _Plan('sub.unit.tests.')),
+            (b, _Plan('sub.unit.tests.')),
+            (a, _Plan('other.tests.', 2)),
+            (b, _Plan('other.tests.', 2)),
+            (a, _Plan('unit.tests.', 3)),
+            (b, _Plan('unit.tests.', 3)),
+        ]
+
+        # serially everything happens in order
+        self.assertEquals(12, manager._apply_plans(plans))
+        self.assertEquals([('start', t.id, p.desired.name) for t, p in plans],
+                          [l for l in log if l[0] == 'start'])
+        self.assertEquals(1, a.max_active)
+
+        # concurrently
+        del log[:]
+        a.max_active = b.max_active = 0
+        manager.apply_max_workers = 4
+        self.assertEquals(12, manager._apply_plans(plans))
+        self.assertEquals(12, len(log))
+        # the sub-zone was finished on both targets before the parent started
+        # on either
+        starts = [l[1:] for l in log if l[0] == 'start']
+        ends = [l[1:] for l in log if l[0] == 'end']
+        parent_start = min(log.index(('start', t, 'unit.tests.'))
+                           for t in ('a', 'b'))
+        for t in ('a', 'b'):
+            self.assertTrue(log.index(('end', t, 'sub.unit.tests.')) <
+                            parent_start)
+        self.assertEquals(6, len(starts))
+        self.assertEquals(6, len(ends))
+
+        # per-target caps
+        del log[:]
+        a.max_active = b.max_active = 0
+        manager.apply_target_max_workers = {'a': 1}
+        self.assertEquals(12, manager._apply_plans(plans))
+        self.assertEquals(1, a.max_active)
+
+    def test_apply_plans_overlap(self):
+        manager = Manager(get_config_filename('simple.yaml'))
+        manager.apply_max_workers = 3
+
+        log = _ApplyLog()
+        a = _ApplyTarget('a', log)
+        a.release.clear()
+        plans = [(a, _Plan('{}.tests.'.format(n))) for n in ('x', 'y', 'z')]
+
+        def release():
+            # once all three have started together let them finish
+            while a.active < 3:
+                sleep(0.01)
+            a.release.set()
+
+        thread = Thread(target=release)
+        thread.start()
+        self.assertEquals(3, manager._apply_plans(plans))
+        thread.join()
+        self.assertEquals(3, a.max_active)
+
+    def test_apply_plans_failure(self):
+        manager = Manager(get_config_filename('simple.yaml'))
+        manager.apply_max_workers = 2
+        manager.apply_target_max_workers = {'a': 1}
+
+        log = _ApplyLog()
+        a = _ApplyTarget('a', log)
+        b = _ApplyTarget('b', log)
+        plans = [
+            (a, _Plan('sub.unit.tests.', Exception('boom'))),
+            (b, _Plan('sub.unit.tests.', Exception('bang'))),
+            (a, _Plan('other.tests.')),
+            (a, _Plan('unit.tests.')),
+        ]
+        # b fails once a's failure has been recorded
+        b.release.clear()
+        exception = manager.log.exception
+
+        def log_exception(*args):
+            exception(*args)
+            b.release.set()
+
+        with patch.object(manager.log, 'exception', log_exception):
+            with self.assertRaises(Exception) as ctx:
+                manager._apply_plans(plans)
+        # the earliest failure is raised
+        self.assertEquals('boom', ctx.exception.message)
+        # the first two started together, a's others waited their turn and
+        # were then skipped
+        self.assertEquals([('a', 'sub.unit.tests.'), ('b', 'sub.unit.tests.')],
+                          sorted(l[1:] for l in log if l[0] == 'start'))
+
+    def test_populate_and_plan_include_meta(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            manager = Manager(get_config_filename('simple.yaml'),
+                              include_meta=True)
+            sources = [manager.providers['in']]
+            targets = [manager.providers['dump'], manager.providers['dump2']]
+            plans = manager._populate_and_plan('subzone.unit.tests.', sources,
+                                               targets)
+            self.assertEquals(2, len(plans))
+            self.assertFalse(plans[0][1].desired is plans[1][1].desired)
+
+            for target, plan in plans:
+                # each target keeps its own meta, later ones don't overwrite
+                # it
+                metas = [r for r in plan.desired.records
+                         if r.name == 'octodns-meta']
+                self.assertEquals(['provider={}'.format(target.id)],
+                                  metas[0].values)
+
+    def test_streaming_plan_outputs(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            manager = Manager(get_config_filename('simple.yaml'))
+            streaming = Mock()
+            # only knows how to run everything at once
+            legacy = Mock(spec=['run'])
+
+            class RunOnly(_PlanOutput):
+
+                def run(self, plans, **kwargs):
+                    self.plans = list(plans)
+
+            # a _PlanOutput that hasn't implemented _add isn't streamed to
+            run_only = RunOnly('run-only')
+            manager.plan_outputs = {
+                'streaming': streaming,
+                'legacy': legacy,
+                'run-only': run_only,
+            }
+            manager.sync()
+
+            streaming.start.assert_called_once_with(log=manager.log)
+            streaming.finish.assert_called_once_with(log=manager.log)
+            streaming.run.assert_not_called()
+            # unit.tests. -> dump, subzone.unit.tests. -> dump & dump2
+            added = [(c[0][0].id, c[0][1].desired.name)
+                     for c in streaming.add.call_args_list]
+            self.assertEquals(3, len(added))
+
+            legacy.run.assert_called_once()
+            plans = legacy.run.call_args[1]['plans']
+            # children first
+            self.assertEquals(['subzone.unit.tests.', 'subzone.unit.tests.',
+                               'unit.tests.'],
+                              [p.desired.name for _, p in plans])
+            self.assertEquals(sorted(added),
+                              sorted((t.id, p.desired.name)
+                                     for t, p in plans))
+            self.assertEquals(plans, run_only.plans)
+
+    def test_plan_file(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            plan_file = join(tmpdir.dirname, 'plan.json')
+
+            manager = Manager(get_config_filename('simple.yaml'))
+            self.assertEquals(0, manager.sync(plan_file=plan_file))
+            # written through a temp file that's renamed in to place
+            self.assertFalse([f for f in listdir(tmpdir.dirname)
+                              if f.endswith('.tmp')])
+            with open(plan_file) as fh:
+                data = safe_load(fh, enforce_order=False)
+            self.assertEquals(1, data['version'])
+            self.assertEquals([('dump', 'subzone.unit.tests.'),
+                               ('dump2', 'subzone.unit.tests.'),
+                               ('dump', 'unit.tests.')],
+                              [(p['target'], p['zone'])
+                               for p in data['plans']])
+
+            # applying doesn't touch the sources
+            manager = Manager(get_config_filename('simple.yaml'))
+            with patch.object(manager.providers['in'], 'populate') as \
+                    populate_mock:
+                # a dry-run just checks things out
+                self.assertEquals(0, manager.apply_plan_file(plan_file))
+                self.assertEquals(21, manager.apply_plan_file(plan_file,
+                                                              dry_run=False))
+                populate_mock.assert_not_called()
+
+            # process executors verify in the main process
+            manager = Manager(get_config_filename('simple-process.yaml'))
+            self.assertEquals(21, manager.apply_plan_file(plan_file,
+                                                          dry_run=False))
+
+            # YamlProvider targets always start from scratch, pretend that
+            # something changed since the plan was made
+            data['plans'][1]['existing_digest'] = 'changed'
+            with open(plan_file, 'w') as fh:
+                fh.write(json_dumps(data))
+            with self.assertRaises(StalePlan) as ctx:
+                manager.apply_plan_file(plan_file, dry_run=False)
+            self.assertEquals('Existing records for subzone.unit.tests. have '
+                              'changed since the plan was made',
+                              ctx.exception.message)
+
+            with open(plan_file, 'w') as fh:
+                fh.write('{"version": 42}')
+            with self.assertRaises(Exception) as ctx:
+                manager.apply_plan_file(plan_file)
+            self.assertEquals('Unsupported plan file version: 42',
+                              ctx.exception.message)
+
+    def test_changed_only(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            with self.assertRaises(Exception) as ctx:
+                Manager(get_config_filename('simple.yaml')) \
+                    .sync(changed_only=True)
+            self.assertEquals('changed_only requires '
+                              'manager.fingerprint_file',
+                              ctx.exception.message)
+
+            fingerprint_file = join(tmpdir.dirname, 'fingerprints.json')
+            config_file = join(tmpdir.dirname, 'config.yaml')
+            with open(get_config_filename('simple.yaml')) as fh:
+                config = fh.read()
+            with open(config_file, 'w') as fh:
+                fh.write(config.replace('manager:\n', 'manager:\n  '
+                                        'fingerprint_file: {}\n'
+                                        .format(fingerprint_file)))
+
+            def synced(manager, **kwargs):
+                with patch.object(manager, '_populate_and_plan',
+                                  wraps=manager._populate_and_plan) as mock:
+                    manager.sync(changed_only=True, **kwargs)
+                return sorted(c[0][0] for c in mock.call_args_list)
+
+            everything = ['empty.', 'subzone.unit.tests.', 'unit.tests.']
+
+            # nothing's been recorded yet, and dry-runs don't record anything
+            manager = Manager(config_file)
+            self.assertEquals(everything, synced(manager))
+            self.assertEquals(everything, synced(manager))
+
+            # applying records what each target was synced with
+            self.assertEquals(everything, synced(manager, dry_run=False))
+            self.assertFalse([f for f in listdir(tmpdir.dirname)
+                              if f.endswith('.tmp')])
+            with open(fingerprint_file) as fh:
+                fingerprints = safe_load(fh, enforce_order=False)
+            self.assertEquals({
+                'empty.': ['dump'],
+                'subzone.unit.tests.': ['dump', 'dump2'],
+                'unit.tests.': ['dump'],
+            }, {k: sorted(v.keys()) for k, v in fingerprints.items()})
+
+            # after which there's nothing left to do, even for a new manager
+            self.assertEquals([], synced(manager))
+            manager = Manager(config_file)
+            self.assertEquals([], synced(manager, dry_run=False))
+
+            # a target that wasn't synced with the current fingerprint
+            del manager._fingerprints['subzone.unit.tests.']['dump2']
+            self.assertEquals(['subzone.unit.tests.'], synced(manager))
+            # only when asked
+            with patch.object(manager, '_populate_and_plan',
+                              wraps=manager._populate_and_plan) as mock:
+                manager.sync()
+                self.assertEquals(3, mock.call_count)
+
+            # a changed source
+            source = manager.providers['in']
+            fingerprint = source.fingerprint
+            with patch.object(source, 'fingerprint') as fingerprint_mock:
+                fingerprint_mock.side_effect = lambda z: 'changed' \
+                    if z == 'empty.' else fingerprint(z)
+                self.assertEquals(['empty.', 'subzone.unit.tests.'],
+                                  synced(manager))
+
+            # sources that can't fingerprint are always synced and never
+            # recorded
+            manager._fingerprints = {}
+            with patch.object(source, 'fingerprint') as fingerprint_mock:
+                fingerprint_mock.return_value = None
+                self.assertEquals(everything, synced(manager, dry_run=False))
+            with open(fingerprint_file) as fh:
+                self.assertEquals({}, safe_load(fh, enforce_order=False))
+
+            # nor are always-dry-run zones or apply_disabled targets
+            manager.config['zones']['empty.']['always-dry-run'] = True
+            manager.providers['dump2'].apply_disabled = True
+            self.assertEquals(everything, synced(manager, dry_run=False))
+            with open(fingerprint_file) as fh:
+                fingerprints = safe_load(fh, enforce_order=False)
+            self.assertEquals({
+                'subzone.unit.tests.': ['dump'],
+                'unit.tests.': ['dump'],
+            }, {k: sorted(v.keys()) for k, v in fingerprints.items()})
+
+            # and nothing is recorded when applying fails
+            manager = Manager(config_file)
+            manager._fingerprints = {}
+            with patch.object(manager, '_apply_plans') as apply_mock:
+                apply_mock.side_effect = Exception('boom')
+                with self.assertRaises(Exception) as ctx:
+                    manager.sync(dry_run=False)
+                self.assertEquals('boom', ctx.exception.message)
+            self.assertEquals({}, manager._fingerprints)
+            # what was recorded before is still there
+            self.assertEquals(['empty.', 'subzone.unit.tests.'],
+                              synced(Manager(config_file)))
+
+    def test_plan_file_unsafe(self):
+        with TemporaryDirectory() as tmpdir:
+            environ['YAML_TMP_DIR'] = tmpdir.dirname
+            plan_file = join(tmpdir.dirname, 'plan.json')
+            manager = Manager(get_config_filename('simple.yaml'))
+            manager.sync(plan_file=plan_file)
+
+            manager.providers['dump'].update_pcent_threshold = 0
+            with patch('octodns.provider.plan.Plan.MIN_EXISTING_RECORDS', 0):
+                with patch.object(Plan, 'raise_if_unsafe') as unsafe_mock:
+                    unsafe_mock.side_effect = UnsafePlan('nope')
+                    with self.assertRaises(UnsafePlan):
+                        manager.apply_plan_file(plan_file, dry_run=False)
+                    # forced through
+                    self.assertEquals(21, manager.apply_plan_file(
+                        plan_file, dry_run=False, force=True))
+
     def test_eligible_targets(self):
         with TemporaryDirectory() as tmpdir:
             environ['YAML_TMP_DIR'] = tmpdir.dirname
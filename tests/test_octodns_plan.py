@@ -6,10 +6,12 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 from StringIO import StringIO
+from json import dumps, loads
 from logging import getLogger
 from unittest import TestCase
 
-from octodns.provider.plan import Plan, PlanHtml, PlanLogger, PlanMarkdown
+from octodns.provider.plan import Plan, PlanHtml, PlanJsonLines, \
+    PlanLogger, PlanMarkdown, StalePlan
 from octodns.record import Create, Delete, Record, Update
 from octodns.zone import Zone
 
@@ -53,6 +55,90 @@ plans = [
 ]
 
 
+class TestPlan(TestCase):
+
+    def test_data_round_trip(self):
+        existing_zone = Zone('unit.tests.', [])
+        existing_zone.add_record(existing)
+        kept = Record.new(existing_zone, 'kept', {
+            'ttl': 60,
+            'type': 'CNAME',
+            'value': 'foo.unit.tests.'
+        })
+        existing_zone.add_record(kept)
+        gone = Record.new(existing_zone, 'gone', {
+            'ttl': 60,
+            'type': 'CNAME',
+            'value': 'foo.unit.tests.',
+            'octodns': {'excluded': ['other']},
+        })
+        existing_zone.add_record(gone)
+        changes = [create, Update(existing, new), Delete(gone)]
+        plan = Plan(existing_zone, zone, changes, True)
+
+        data = plan.to_data()
+        self.assertEquals('unit.tests.', data['zone'])
+        self.assertTrue(data['exists'])
+        self.assertEquals(plan.existing_digest, data['existing_digest'])
+        self.assertEquals(['Create', 'Update', 'Delete'],
+                          [c['operation'] for c in data['changes']])
+        self.assertEquals({
+            'operation': 'Create',
+            'name': 'b',
+            'type': 'CNAME',
+            'new': {'ttl': 60, 'type': 'CNAME', 'value': 'foo.unit.tests.'},
+            'source': 'test',
+        }, data['changes'][0])
+        self.assertEquals(None, data['changes'][2]['new'])
+        # and it survives JSON
+        data = loads(dumps(data))
+
+        # a freshly populated copy of the existing records
+        again = Zone('unit.tests.', [])
+        for record in existing_zone.records:
+            again.add_record(record)
+        rebuilt = Plan.from_data(data, again, {'test': simple},
+                                 delete_pcent_threshold=.5)
+        self.assertEquals(.5, rebuilt.delete_pcent_threshold)
+        self.assertTrue(rebuilt.exists)
+        self.assertTrue(rebuilt.existing is again)
+        self.assertEquals(plan.change_counts, rebuilt.change_counts)
+        self.assertEquals([c.__class__ for c in changes],
+                          [c.__class__ for c in rebuilt.changes])
+        rebuilt_create, rebuilt_update, rebuilt_delete = rebuilt.changes
+        self.assertEquals(create.new.data, rebuilt_create.new.data)
+        self.assertEquals(simple, rebuilt_create.new.source)
+        # existing records come from the freshly populated zone
+        self.assertTrue(rebuilt_update.existing is existing)
+        self.assertEquals(new.data, rebuilt_update.new.data)
+        self.assertEquals(new.geo.keys(), rebuilt_update.new.geo.keys())
+        self.assertTrue(rebuilt_delete.existing is gone)
+        # the desired zone has the results of the changes
+        self.assertEquals(set([('b', 'CNAME'), ('a', 'A'), ('kept', 'CNAME')]),
+                          set(r._key for r in rebuilt.desired.records))
+        self.assertTrue(kept in rebuilt.desired.records)
+
+        # anything changing in the meantime makes the plan stale
+        again.add_record(Record.new(again, 'new', {
+            'ttl': 60,
+            'type': 'CNAME',
+            'value': 'foo.unit.tests.'
+        }))
+        with self.assertRaises(StalePlan) as ctx:
+            Plan.from_data(data, again)
+        self.assertEquals('Existing records for unit.tests. have changed '
+                          'since the plan was made', ctx.exception.message)
+
+    def test_existing_digest(self):
+        empty = Zone('unit.tests.', [])
+        self.assertEquals(Plan(None, zone, [], False).existing_digest,
+                          Plan(empty, zone, [], False).existing_digest)
+        populated = Zone('unit.tests.', [])
+        populated.add_record(existing)
+        self.assertNotEquals(Plan(populated, zone, [], False).existing_digest,
+                             Plan(empty, zone, [], False).existing_digest)
+
+
 class TestPlanLogger(TestCase):
 
     def test_invalid_level(self):
@@ -77,6 +163,38 @@ class TestPlanLogger(TestCase):
         self.assertTrue('Summary: Creates=2, Updates=1, '
                         'Deletes=1, Existing Records=0' in out)
 
+    def test_streaming(self):
+
+        class MockLogger(object):
+
+            def __init__(self):
+                self.msgs = []
+
+            def log(self, level, msg):
+                self.msgs.append(msg)
+
+        log = MockLogger()
+        output = PlanLogger('logger')
+        output.start(log=log)
+        self.assertEquals([], log.msgs)
+        # each plan is logged as soon as it's added, only the first for a zone
+        # gets the zone header
+        output.add(*plans[0], log=log)
+        self.assertEquals(1, len(log.msgs))
+        self.assertTrue('* unit.tests.\n' in log.msgs[0])
+        output.add(*plans[1], log=log)
+        self.assertEquals(2, len(log.msgs))
+        self.assertFalse('* unit.tests.\n' in log.msgs[1])
+        self.assertTrue('Create Zone<unit.tests.>' in log.msgs[1])
+        output.finish(log=log)
+        self.assertEquals(2, len(log.msgs))
+
+        # nothing at all
+        log = MockLogger()
+        output.run(log, [])
+        self.assertEquals(1, len(log.msgs))
+        self.assertTrue('No changes were planned' in log.msgs[0])
+
 
 class TestPlanHtml(TestCase):
     log = getLogger('TestPlanHtml')
@@ -111,3 +229,52 @@ class TestPlanMarkdown(TestCase):
         self.assertTrue('Update | a | A | 300 | 1.1.1.1;' in out)
         self.assertTrue('NA-US: 6.6.6.6 | test' in out)
         self.assertTrue('Delete | a | A | 300 | 2.2.2.2;' in out)
+
+
+class TestPlanJsonLines(TestCase):
+
+    def test_empty(self):
+        out = StringIO()
+        PlanJsonLines('json').run([], fh=out)
+        self.assertEquals('', out.getvalue())
+
+    def test_simple(self):
+        out = StringIO()
+        PlanJsonLines('json').run(plans, fh=out)
+        lines = [loads(l) for l in out.getvalue().split('\n') if l]
+        self.assertEquals(10, len(lines))
+        self.assertEquals({
+            'kind': 'plan',
+            'zone': 'unit.tests.',
+            'target': 'test',
+            'exists': True,
+            'creates': 2,
+            'updates': 1,
+            'deletes': 1,
+            'existing_records': 0,
+        }, lines[0])
+        self.assertEquals({
+            'kind': 'change',
+            'zone': 'unit.tests.',
+            'target': 'test',
+            'operation': 'Create',
+            'name': 'b',
+            'type': 'CNAME',
+            'existing': None,
+            'new': {'ttl': 60, 'value': 'foo.unit.tests.'},
+            'source': 'test',
+        }, lines[1])
+        # no source
+        self.assertEquals(None, lines[2]['source'])
+        delete = lines[3]
+        self.assertEquals('Delete', delete['operation'])
+        self.assertEquals(None, delete['new'])
+        self.assertEquals(['2.2.2.2', '3.3.3.3', '4.4.4.4'],
+                          delete['existing']['values'])
+        update = lines[4]
+        self.assertEquals('Update', update['operation'])
+        self.assertEquals(['1.1.1.1', '2.2.2.2'],
+                          update['existing']['values'])
+        self.assertEquals({'AF': ['5.5.5.5'], 'NA-US': ['6.6.6.6']},
+                          update['new']['geo'])
+        self.assertFalse(lines[5]['exists'])
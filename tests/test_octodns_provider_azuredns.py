@@ -16,8 +16,10 @@ from azure.mgmt.dns.models import ARecord, AaaaRecord, CaaRecord, \
     RecordSet, SoaRecord, Zone as AzureZone
 from msrestazure.azure_exceptions import CloudError
 
+from threading import Lock
+from time import sleep
 from unittest import TestCase
-from mock import Mock, patch
+from mock import Mock, call, patch
 
 
 zone = Zone(name='unit.tests.', sub_zones=[])
@@ -307,6 +309,44 @@ _base17.params['txt_records'] = [TxtRecord(value=['txt multiple test']),
 azure_records.append(_base17)
 
 
+class _StubRecordSets(object):
+    '''
+    Stands in for DnsManagementClient.record_sets, recording the order of
+    operations & how many were running at once. Names in `throttle` are
+    refused with a 429 the first time they're seen.
+    '''
+
+    def __init__(self, throttle=()):
+        self.throttle = set(throttle)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = Lock()
+
+    def _call(self, op, name, _type):
+        with self._lock:
+            self.calls.append((op, name, _type))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            throttled = name in self.throttle
+            self.throttle.discard(name)
+        # give others a chance to overlap
+        sleep(0.01)
+        with self._lock:
+            self.active -= 1
+        if throttled:
+            raise CloudError(Mock(status_code=429,
+                                  headers={'Retry-After': '0'}), 'Throttled')
+
+    def create_or_update(self, resource_group_name, zone_name,
+                         relative_record_set_name, record_type, parameters):
+        self._call('create', relative_record_set_name, record_type)
+
+    def delete(self, resource_group_name, zone_name,
+               relative_record_set_name, record_type):
+        self._call('delete', relative_record_set_name, record_type)
+
+
 class Test_AzureRecord(TestCase):
     def test_azure_record(self):
         assert(len(azure_records) == len(octo_records))
@@ -339,7 +379,7 @@ class TestAzureDnsProvider(TestCase):
 
     @patch('octodns.provider.azuredns.DnsManagementClient')
     @patch('octodns.provider.azuredns.ServicePrincipalCredentials')
-    def _get_provider(self, mock_spc, mock_dns_client):
+    def _get_provider(self, mock_spc, mock_dns_client, **kwargs):
         '''Returns a mock AzureProvider object to use in testing.
 
             :param mock_spc: placeholder
@@ -350,7 +390,8 @@ class TestAzureDnsProvider(TestCase):
             :type return: AzureProvider
         '''
         return AzureProvider('mock_id', 'mock_client', 'mock_key',
-                             'mock_directory', 'mock_sub', 'mock_rg')
+                             'mock_directory', 'mock_sub', 'mock_rg',
+                             **kwargs)
 
     def test_populate_records(self):
         provider = self._get_provider()
@@ -462,6 +503,11 @@ class TestAzureDnsProvider(TestCase):
 
         self.assertEquals(len(provider._azure_zones), 1)
 
+        # the zones are only listed once
+        provider._populate_zones()
+        provider.populate(Zone('unit.tests.', []))
+        zone_list.assert_called_once()
+
     def test_bad_zone_response(self):
         provider = self._get_provider()
 
@@ -488,6 +534,69 @@ class TestAzureDnsProvider(TestCase):
         self.assertEquals(18, provider.apply(Plan(zone, zone,
                                                   deletes, True)))
 
+    def test_apply_concurrent(self):
+        provider = self._get_provider(max_workers=4)
+        record_sets = _StubRecordSets(throttle=('a',))
+        provider._dns_client.record_sets = record_sets
+
+        cname = Record.new(zone, 'swap', {
+            'ttl': 60,
+            'type': 'CNAME',
+            'value': 'unit.tests.',
+        })
+        a = Record.new(zone, 'swap', {
+            'ttl': 60,
+            'type': 'A',
+            'value': '1.2.3.4',
+        })
+        changes = [Delete(cname)] + [Create(r) for r in octo_records] + \
+            [Create(a)]
+        self.assertEquals(20, provider.apply(Plan(zone, zone, changes,
+                                                  True)))
+
+        # everything happened, the throttled record set was tried again
+        self.assertEquals(21, len(record_sets.calls))
+        self.assertEquals([('create', 'a', 'A')] * 2,
+                          [c for c in record_sets.calls if c[1] == 'a'])
+        # a node's changes were made in order
+        self.assertEquals([('delete', 'swap', 'CNAME'),
+                           ('create', 'swap', 'A')],
+                          [c for c in record_sets.calls if c[1] == 'swap'])
+        # others concurrently, up to max_workers at a time
+        self.assertTrue(1 < record_sets.max_active <= 4)
+
+    @patch('octodns.provider.http.sleep')
+    def test_throttled(self, sleep_mock):
+        provider = self._get_provider(throttle_retries=2)
+
+        def throttled(headers):
+            return CloudError(Mock(status_code=429, headers=headers),
+                              'Throttled')
+
+        fn = Mock()
+        fn.side_effect = [throttled({'Retry-After': '1'}), throttled({}), 42]
+        self.assertEquals(42, provider._throttled('test', fn, 'a', b=1))
+        fn.assert_has_calls([call('a', b=1)] * 3)
+        # waited out Azure's period, or our own when it didn't say, give or
+        # take jitter
+        self.assertEquals(2, sleep_mock.call_count)
+        self.assertTrue(sleep_mock.call_args[0][0] >=
+                        AzureProvider.THROTTLE_PERIOD - 1)
+
+        # gives up once it's out of retries
+        fn.reset_mock()
+        fn.side_effect = [throttled({'Retry-After': '0'})] * 3
+        with self.assertRaises(CloudError):
+            provider._throttled('test', fn)
+        self.assertEquals(3, fn.call_count)
+
+        # other errors aren't retried
+        fn.reset_mock()
+        fn.side_effect = CloudError(Mock(status_code=500), 'Nope')
+        with self.assertRaises(CloudError):
+            provider._throttled('test', fn)
+        self.assertEquals(1, fn.call_count)
+
     def test_create_zone(self):
         provider = self._get_provider()
 
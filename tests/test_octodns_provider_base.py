@@ -137,6 +137,11 @@ class TestBaseProvider(TestCase):
         self.assertTrue(plan)
         self.assertEquals(1, len(plan.changes))
 
+    def test_fingerprint(self):
+        # sources don't know how to fingerprint zones unless they say so
+        provider = HelperProvider([])
+        self.assertEquals(None, provider.fingerprint('unit.tests.'))
+
     def test_apply(self):
         ignored = Zone('unit.tests.', [])
 
@@ -11,7 +11,7 @@ from requests import HTTPError
 from requests_mock import ANY, mock as requests_mock
 from unittest import TestCase
 
-from octodns.record import Record, Update
+from octodns.record import Create, Delete, Record, Update
 from octodns.provider.base import Plan
 from octodns.provider.cloudflare import CloudflareProvider
 from octodns.provider.yaml import YamlProvider
@@ -171,7 +171,11 @@ class TestCloudflareProvider(TestCase):
                     'id': 42,
                 }
             },  # zone create
-        ] + [None] * 20  # individual record creates
+        ] + [{
+            'result': {
+                'id': i,
+            }
+        } for i in range(20)]  # individual record creates
 
         # non-existent zone, create everything
         plan = provider.plan(self.expected)
@@ -362,7 +366,11 @@ class TestCloudflareProvider(TestCase):
                     'id': 42,
                 }
             },  # zone create
-            None,
+            {
+                'result': {
+                    'id': 43,
+                }
+            },  # record create
             None,
             None,
             None,
@@ -509,6 +517,166 @@ class TestCloudflareProvider(TestCase):
                  'fc12ab34cd5611334422ab3322997653')
         ])
 
+    def test_zone_index(self):
+        provider = CloudflareProvider('test', 'email', 'token')
+
+        def cf_record(id, name, content):
+            return {
+                'id': id,
+                'type': 'A',
+                'name': name,
+                'content': content,
+                'proxiable': True,
+                'proxied': False,
+                'ttl': 300,
+                'zone_id': 'z42',
+            }
+
+        provider.zone_records = Mock(return_value=[
+            cf_record('r1', 'a.unit.tests', '1.1.1.1'),
+            cf_record('r2', 'a.unit.tests', '2.2.2.2'),
+            cf_record('r3', 'b.unit.tests', '1.1.1.1'),
+            cf_record('r4', 'c.unit.tests', '1.1.1.1'),
+        ])
+        provider._zones = {'unit.tests.': 'z42'}
+        provider._request = Mock()
+        provider._request.return_value = {'result': {'id': 'r5'}}
+        provider._record_for = Mock(wraps=provider._record_for)
+
+        zone = Zone('unit.tests.', [])
+
+        def a_record(name, values):
+            return Record.new(zone, name, {
+                'ttl': 300,
+                'type': 'A',
+                'values': values,
+            })
+
+        a = a_record('a', ['1.1.1.1', '2.2.2.2'])
+        b = a_record('b', ['1.1.1.1'])
+        c = a_record('c', ['1.1.1.1'])
+        d = a_record('d', ['4.4.4.4'])
+        plan = Plan(zone, zone, [
+            Update(a, a_record('a', ['2.2.2.2', '3.3.3.3'])),
+            Update(b, a_record('b', ['1.1.1.1', '5.5.5.5'])),
+            Delete(c),
+            Create(d),
+        ], True)
+
+        # look at the index before it's dropped at the end of _apply
+        indexes = []
+        apply_delete = provider._apply_Delete
+
+        def capture(change):
+            apply_delete(change)
+            indexes.append(provider._zone_indexes['unit.tests.'])
+
+        provider._apply_Delete = capture
+        provider._apply(plan)
+
+        # zone records were only converted once each
+        self.assertEquals(4, provider._record_for.call_count)
+        provider._request.assert_has_calls([
+            call('PUT', '/zones/z42/dns_records/r2', data={
+                'content': '2.2.2.2',
+                'type': 'A',
+                'name': 'a.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            }),
+            call('PUT', '/zones/z42/dns_records/r1', data={
+                'content': '3.3.3.3',
+                'type': 'A',
+                'name': 'a.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            }),
+            call('POST', '/zones/z42/dns_records', data={
+                'content': '5.5.5.5',
+                'type': 'A',
+                'name': 'b.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            }),
+            call('PUT', '/zones/z42/dns_records/r3', data={
+                'content': '1.1.1.1',
+                'type': 'A',
+                'name': 'b.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            }),
+            call('DELETE', '/zones/z42/dns_records/r4'),
+            call('POST', '/zones/z42/dns_records', data={
+                'content': '4.4.4.4',
+                'type': 'A',
+                'name': 'd.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            }),
+        ])
+
+        # the index was kept current as changes were made
+        index = indexes[0]
+        self.assertEquals({
+            '2.2.2.2': 'r2',
+            '3.3.3.3': 'r1',
+        }, {k: v['record_id'] for k, v in index[('a', 'A')].items()})
+        self.assertEquals({
+            '1.1.1.1': 'r3',
+            '5.5.5.5': 'r5',
+        }, {k: v['record_id'] for k, v in index[('b', 'A')].items()})
+        self.assertFalse(('c', 'A') in index)
+        self.assertEquals({
+            '4.4.4.4': 'r5',
+        }, {k: v['record_id'] for k, v in index[('d', 'A')].items()})
+        # and dropped once we're done
+        self.assertEquals({}, provider._zone_indexes)
+
+    def test_zone_index_unsupported_type(self):
+        provider = CloudflareProvider('test', 'email', 'token')
+        provider.zone_records = Mock(return_value=[{
+            'id': 'r1',
+            'type': 'LOC',
+            'name': 'loc.unit.tests',
+            'content': 'IN LOC 0 0 0 N 0 0 0 E 0m',
+            'proxiable': False,
+            'proxied': False,
+            'ttl': 300,
+            'zone_id': 'z42',
+        }, {
+            'id': 'r2',
+            'type': 'A',
+            'name': 'a.unit.tests',
+            'content': '1.1.1.1',
+            'proxiable': True,
+            'proxied': False,
+            'ttl': 300,
+            'zone_id': 'z42',
+        }])
+        provider._zones = {'unit.tests.': 'z42'}
+        provider._request = Mock()
+        provider._request.return_value = {'result': {'id': 'r3'}}
+
+        zone = Zone('unit.tests.', [])
+        b = Record.new(zone, 'b', {
+            'ttl': 300,
+            'type': 'A',
+            'value': '2.2.2.2',
+        })
+        # types we don't manage are left out of the index rather than
+        # failing the apply
+        provider._apply(Plan(zone, zone, [Create(b)], True))
+        provider._request.assert_called_once_with(
+            'POST', '/zones/z42/dns_records', data={
+                'content': '2.2.2.2',
+                'type': 'A',
+                'name': 'b.unit.tests',
+                'proxied': False,
+                'ttl': 300,
+            })
+        self.assertEquals(['a'], [name for name, _ in
+                                  provider._zone_index(zone)])
+
     def test_srv(self):
         provider = CloudflareProvider('test', 'email', 'token')
 
@@ -94,6 +94,23 @@ class TestDigitalOceanProvider(TestCase):
         # bust the cache
         del provider._zone_records[zone.name]
 
+    def test_concurrent_pages(self):
+        provider = DigitalOceanProvider('test', 'token', max_workers=2)
+        self.assertEquals(provider._engine, provider._client._engine)
+
+        with requests_mock() as mock:
+            base = 'https://api.digitalocean.com/v2/domains/unit.tests/' \
+                'records?page='
+            with open('tests/fixtures/digitalocean-page-1.json') as fh:
+                mock.get('{}{}'.format(base, 1), text=fh.read())
+            with open('tests/fixtures/digitalocean-page-2.json') as fh:
+                mock.get('{}{}'.format(base, 2), text=fh.read())
+
+            zone = Zone('unit.tests.', [])
+            provider.populate(zone)
+            self.assertEquals(12, len(zone.records))
+            self.assertEquals(2, mock.call_count)
+
     def test_apply(self):
         provider = DigitalOceanProvider('test', 'token')
 
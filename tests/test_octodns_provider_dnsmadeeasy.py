@@ -6,7 +6,7 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
-from mock import Mock, call
+from mock import Mock, call, patch
 from os.path import dirname, join
 from requests import HTTPError
 from requests_mock import ANY, mock as requests_mock
@@ -119,6 +119,35 @@ class TestDnsMadeEasyProvider(TestCase):
         # bust the cache
         del provider._zone_records[zone.name]
 
+    def test_rate_limit(self):
+        provider = DnsMadeEasyProvider('test', 'api', 'secret',
+                                       ratelimit_delay=0.25)
+        limiter = provider._client._limiter
+        self.assertEquals(4, limiter.rate)
+        self.assertEquals(10, limiter.reserve)
+
+        with requests_mock() as mock, \
+                patch.object(limiter, 'update') as update_mock:
+            base = 'https://api.dnsmadeeasy.com/V2.0/dns/managed'
+            mock.get('{}/plenty'.format(base), text='{}', headers={
+                'x-dnsme-requestsRemaining': '140',
+                'x-dnsme-requestLimit': '150',
+            })
+            mock.get('{}/missing'.format(base), text='{}')
+            mock.get('{}/garbage'.format(base), text='{}', headers={
+                'x-dnsme-requestsRemaining': 'many',
+                'x-dnsme-requestLimit': '150',
+            })
+
+            provider._client._request('GET', '/plenty')
+            update_mock.assert_called_once_with(140, 150, 300)
+            update_mock.reset_mock()
+
+            # no headers or bad values are ignored
+            provider._client._request('GET', '/missing')
+            provider._client._request('GET', '/garbage')
+            update_mock.assert_not_called()
+
     def test_apply(self):
         # Create provider with sandbox enabled
         provider = DnsMadeEasyProvider('test', 'api', 'secret', True)
@@ -395,7 +395,7 @@ class TestGoogleCloudProvider(TestCase):
 
         self.assertEqual(len(test_zone.records), 1)
 
-        self.assertEqual(test_zone.records.pop().fqdn,
+        self.assertEqual(list(test_zone.records)[0].fqdn,
                          u'unit.tests.gr.unit.tests.')
 
     def test__get_gcloud_zone(self):
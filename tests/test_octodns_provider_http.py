@@ -0,0 +1,266 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from mock import Mock, patch
+from requests import Session
+from threading import Lock, Thread
+from time import sleep
+from unittest import TestCase
+
+from octodns.provider.http import RateLimiter, RequestEngine
+from octodns.record import Create, Delete, Record
+from octodns.zone import Zone
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.paths.append(self.path)
+            server.clients.add(self.client_address)
+        # give the other workers a chance to overlap with us
+        sleep(0.02)
+        with server.lock:
+            server.active -= 1
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+
+class TestRequestEngine(TestCase):
+
+    def setUp(self):
+        server = _Server(('127.0.0.1', 0), _Handler)
+        server.lock = Lock()
+        server.active = 0
+        server.max_active = 0
+        server.paths = []
+        server.clients = set()
+        thread = Thread(target=server.serve_forever,
+                        kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.server = server
+        self.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sequential(self):
+        engine = RequestEngine()
+        sess = engine.mount(Session())
+
+        def post(item):
+            return sess.post('{}/{}'.format(self.url, item)).text
+
+        items = ['a1', 'b1', 'a2', 'c1', 'b2']
+        self.assertEquals(['/{}'.format(i) for i in items],
+                          engine.run(items, post, key=lambda i: i[0]))
+        # everything happened in order, one at a time, over one connection
+        self.assertEquals(['/{}'.format(i) for i in items], self.server.paths)
+        self.assertEquals(1, self.server.max_active)
+        self.assertEquals(1, len(self.server.clients))
+
+        self.assertEquals([], engine.run([], post, key=lambda i: i[0]))
+
+    def test_concurrent(self):
+        engine = RequestEngine(max_workers=4)
+        sess = engine.mount(Session())
+
+        def post(item):
+            return sess.post('{}/{}'.format(self.url, item)).text
+
+        items = ['{}{}'.format(g, i) for i in range(5) for g in 'abcdef']
+        # results come back in item order
+        self.assertEquals(['/{}'.format(i) for i in items],
+                          engine.run(items, post, key=lambda i: i[0]))
+        # things happened concurrently, but no more than we allowed
+        self.assertTrue(self.server.max_active > 1)
+        self.assertTrue(self.server.max_active <= 4)
+        # each group's items were run in order
+        for group in 'abcdef':
+            self.assertEquals(['/{}{}'.format(group, i) for i in range(5)],
+                              [p for p in self.server.paths
+                               if p[1] == group])
+        # and connections were reused
+        self.assertTrue(len(self.server.clients) <= 4)
+
+    def test_errors(self):
+        engine = RequestEngine(max_workers=2)
+        ran = []
+
+        def fn(item):
+            if item.endswith('!'):
+                raise Exception(item)
+            ran.append(item)
+
+        with self.assertRaises(Exception) as ctx:
+            engine.run(['a1', 'b1!', 'c1', 'b2', 'a2', 'c2!', 'c3'], fn,
+                       key=lambda i: i[0])
+        # the earliest group to fail wins
+        self.assertEquals('b1!', ctx.exception.message)
+        # groups stop at their first error, the others finish
+        self.assertEquals(['a1', 'a2', 'c1'], sorted(ran))
+
+    def test_apply(self):
+        engine = RequestEngine(max_workers=2)
+        zone = Zone('unit.tests.', [])
+        a = Record.new(zone, 'a', {
+            'ttl': 30,
+            'type': 'A',
+            'value': '1.2.3.4',
+        })
+        cname = Record.new(zone, 'a', {
+            'ttl': 30,
+            'type': 'CNAME',
+            'value': 'b.unit.tests.',
+        })
+        b = Record.new(zone, 'b', {
+            'ttl': 30,
+            'type': 'A',
+            'value': '1.2.3.4',
+        })
+        changes = [Delete(a), Create(b), Create(cname)]
+        fn = Mock()
+        fn.side_effect = lambda c: c.record
+        self.assertEquals([a, b, cname], engine.apply(changes, fn))
+        # the delete of a came before the create on the same node
+        calls = [c[0][0] for c in fn.call_args_list]
+        self.assertTrue(calls.index(changes[0]) < calls.index(changes[2]))
+
+    def test_pages(self):
+        engine = RequestEngine(max_workers=3)
+        fetched = []
+        lock = Lock()
+
+        def fetch(page):
+            with lock:
+                fetched.append(page)
+            return {'page': page, 'last': 5}
+
+        last_page = Mock()
+        last_page.side_effect = lambda first: first['last']
+        pages = engine.pages(fetch, last_page)
+        self.assertEquals([1, 2, 3, 4, 5], [p['page'] for p in pages])
+        # the first page came first and was the one used to find the last
+        self.assertEquals(1, fetched[0])
+        self.assertEquals([2, 3, 4, 5], sorted(fetched[1:]))
+        last_page.assert_called_once_with({'page': 1, 'last': 5})
+
+        # a single page is just fetched
+        fetched = []
+        last_page.side_effect = lambda first: 1
+        self.assertEquals([{'page': 1, 'last': 5}],
+                          engine.pages(fetch, last_page))
+        self.assertEquals([1], fetched)
+
+
+@patch('octodns.provider.http.uniform')
+@patch('octodns.provider.http.sleep')
+@patch('octodns.provider.http.time')
+class TestRateLimiter(TestCase):
+
+    def test_unlimited(self, time_mock, sleep_mock, uniform_mock):
+        time_mock.return_value = 100
+        for limiter in (RateLimiter(), RateLimiter.for_delay(0),
+                        RateLimiter.for_delay('0.0')):
+            self.assertFalse(limiter.rate)
+            for _ in range(10):
+                self.assertEquals(0, limiter.acquire())
+        sleep_mock.assert_not_called()
+
+    def test_rate(self, time_mock, sleep_mock, uniform_mock):
+        uniform_mock.return_value = 0
+        # at most one request every 0.5s
+        limiter = RateLimiter.for_delay(0.5)
+        self.assertEquals(2, limiter.rate)
+
+        time_mock.return_value = 100
+        # the first goes straight away
+        self.assertEquals(0, limiter.acquire())
+        sleep_mock.assert_not_called()
+        # the next has to wait its turn
+        self.assertEquals(0.5, limiter.acquire())
+        sleep_mock.assert_called_once_with(0.5)
+        # and one that shows up a bit later queues behind it
+        time_mock.return_value = 100.1
+        self.assertAlmostEquals(0.9, limiter.acquire())
+        # after a long gap we're back to going straight away, but only with
+        # `burst` requests saved up
+        time_mock.return_value = 110
+        self.assertEquals(0, limiter.acquire())
+        self.assertEquals(0.5, limiter.acquire())
+
+        # bursts
+        limiter = RateLimiter(rate=1, burst=3)
+        time_mock.return_value = 200
+        self.assertEquals([0, 0, 0, 1, 2],
+                          [limiter.acquire() for _ in range(5)])
+
+    def test_update(self, time_mock, sleep_mock, uniform_mock):
+        uniform_mock.return_value = 0
+        time_mock.return_value = 100
+        limiter = RateLimiter(reserve=2)
+
+        # plenty of quota left, nothing changes
+        limiter.update(50, 100, 300)
+        self.assertEquals(0, limiter.acquire())
+        # down to the reserve, spread out to the sustainable rate
+        limiter.update(2, 100, 300)
+        time_mock.return_value = 101
+        self.assertEquals(2, limiter.acquire())
+        sleep_mock.assert_called_once_with(2)
+        # and slower still as it runs out
+        limiter.update(0, 100, 300)
+        self.assertEquals(9, limiter.acquire())
+        # a 0 limit doesn't blow up
+        limiter.update(0, 0, 10)
+        self.assertEquals(30, limiter.acquire())
+
+    def test_backoff(self, time_mock, sleep_mock, uniform_mock):
+        uniform_mock.return_value = 0.1
+        time_mock.return_value = 100
+        limiter = RateLimiter(rate=1, burst=10)
+
+        limiter.backoff(10)
+        uniform_mock.assert_not_called()
+        # each waiter is stretched by its own jitter
+        self.assertAlmostEquals(11, limiter.acquire())
+        uniform_mock.assert_called_once_with(0, 0.1)
+        uniform_mock.return_value = 0.05
+        self.assertAlmostEquals(10.5, limiter.acquire())
+        # a shorter backoff doesn't cut an existing one short
+        limiter.backoff(1)
+        time_mock.return_value = 105
+        self.assertAlmostEquals(5.25, limiter.acquire())
+        # once it's passed we're back to bursting
+        time_mock.return_value = 120
+        self.assertEquals(0, limiter.acquire())
+
+        # without jitter waits are exact
+        uniform_mock.reset_mock()
+        limiter = RateLimiter(jitter=0)
+        limiter.backoff(10)
+        self.assertEquals(10, limiter.acquire())
+        uniform_mock.assert_not_called()
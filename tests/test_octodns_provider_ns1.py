@@ -201,6 +201,16 @@ class TestNs1Provider(TestCase):
         self.assertEquals(('unit.tests',), load_mock.call_args[0])
         self.assertFalse(exists)
 
+        # Rate limited lookups are retried
+        load_mock.reset_mock()
+        load_mock.side_effect = [
+            RateLimitException('slow down', period=0),
+            ResourceException('server error: zone not found'),
+        ]
+        zone = Zone('unit.tests.', [])
+        self.assertFalse(provider.populate(zone))
+        self.assertEquals(2, load_mock.call_count)
+
         # Existing zone w/o records
         load_mock.reset_mock()
         nsone_zone = DummyZone([])
@@ -389,8 +399,12 @@ class TestNs1Provider(TestCase):
             None,
             None,
         ]
-        nsone_zone.loadRecord.side_effect = [mock_record, mock_record,
-                                             mock_record]
+        nsone_zone.loadRecord.side_effect = [
+            RateLimitException('three', period=0),
+            mock_record,
+            mock_record,
+            mock_record,
+        ]
         got_n = provider.apply(plan)
         self.assertEquals(3, got_n)
         nsone_zone.loadRecord.assert_has_calls([
@@ -426,6 +440,33 @@ class TestNs1Provider(TestCase):
             call.delete()
         ])
 
+    @patch('octodns.provider.http.sleep')
+    def test_rate_limited(self, sleep_mock):
+        provider = Ns1Provider('test', 'api-key', rate_limit_retries=2)
+
+        fn = Mock()
+        fn.side_effect = [
+            RateLimitException('one', period=1),
+            RateLimitException('two', period=2),
+            42,
+        ]
+        self.assertEquals(42, provider._rate_limited('test', fn, 'a', b=1))
+        fn.assert_has_calls([call('a', b=1)] * 3)
+        # waited out the periods, give or take jitter
+        self.assertEquals(2, sleep_mock.call_count)
+
+        # gives up once it's out of retries
+        fn.reset_mock()
+        fn.side_effect = [
+            RateLimitException('one', period=0),
+            RateLimitException('two', period=0),
+            RateLimitException('three', period=0),
+        ]
+        with self.assertRaises(RateLimitException) as ctx:
+            provider._rate_limited('test', fn)
+        self.assertEquals('three', ctx.exception.message)
+        self.assertEquals(3, fn.call_count)
+
     def test_escaping(self):
         provider = Ns1Provider('test', 'api-key')
         record = {
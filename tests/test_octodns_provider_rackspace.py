@@ -46,6 +46,26 @@ class TestRackspaceProvider(TestCase):
                                               '0')
             self.assertTrue(mock.called_once)
 
+    def test_paginated_request_iterates(self):
+        # deeper than the recursion limit used to allow
+        n = 1500
+
+        def page(request, context):
+            i = int(request.path[len('/page'):])
+            links = []
+            if i < n - 1:
+                links.append({
+                    'rel': 'next',
+                    'href': 'https://dns.example.com/page{}'.format(i + 1)
+                })
+            return {'records': [i], 'links': links}
+
+        with requests_mock() as mock:
+            mock.get(ANY, json=page)
+            got = self.provider._paginated_request_for_url(
+                'GET', 'https://dns.example.com/page0', None, 'records')
+        self.assertEquals(list(range(n)), got)
+
     def test_bad_auth(self):
         with requests_mock() as mock:
             mock.get(ANY, status_code=401, text='Unauthorized')
@@ -7,6 +7,9 @@ from __future__ import absolute_import, division, print_function, \
 
 from botocore.exceptions import ClientError
 from botocore.stub import ANY, Stubber
+from os import listdir
+from os.path import isdir, join
+from threading import Event, Thread
 from unittest import TestCase
 from mock import patch
 
@@ -16,7 +19,7 @@ from octodns.provider.route53 import Route53Provider, _Route53GeoDefault, \
     _octal_replace
 from octodns.zone import Zone
 
-from helpers import GeoProvider
+from helpers import GeoProvider, TemporaryDirectory
 
 
 class DummyR53Record(object):
@@ -1857,7 +1860,7 @@ class TestRoute53Provider(TestCase):
 
         return provider, plan
 
-    # _get_test_plan() returns a plan with 11 modifications, 17 RRs
+    # _get_test_plan() returns a plan with 11 modifications, 18 RRs
 
     @patch('octodns.provider.route53.Route53Provider._load_records')
     @patch('octodns.provider.route53.Route53Provider._really_apply')
@@ -1868,12 +1871,18 @@ class TestRoute53Provider(TestCase):
         provider.apply(plan)
         really_apply_mock.assert_called_once()
 
+        # batches are filled all the way to the limit
+        really_apply_mock.reset_mock()
+        provider, plan = self._get_test_plan(18)
+        provider.apply(plan)
+        really_apply_mock.assert_called_once()
+
     @patch('octodns.provider.route53.Route53Provider._load_records')
     @patch('octodns.provider.route53.Route53Provider._really_apply')
     def test_apply_2(self, really_apply_mock, _):
 
         # 18 RRs with max of 17 should only get applied in two calls
-        provider, plan = self._get_test_plan(18)
+        provider, plan = self._get_test_plan(17)
         provider.apply(plan)
         self.assertEquals(2, really_apply_mock.call_count)
 
@@ -1905,6 +1914,133 @@ class TestRoute53Provider(TestCase):
             provider.apply(plan)
         self.assertTrue('modifications' in ctx.exception.message)
 
+    @patch('octodns.provider.route53.Route53Provider._load_records')
+    @patch('octodns.provider.route53.Route53Provider._really_apply')
+    def test_apply_chars(self, really_apply_mock, _):
+        provider, plan = self._get_test_plan(1000)
+
+        # the values of a single change are too long
+        provider.max_change_chars = 10
+        with self.assertRaises(Exception) as ctx:
+            provider.apply(plan)
+        self.assertTrue('characters' in ctx.exception.message)
+
+        # batches are split when they'd have too many characters
+        count, chars = provider._mods_size(sum([
+            provider._mod_Create(c, 'z42', []) for c in plan.changes
+        ], []))
+        self.assertEquals(18, count)
+        provider.max_change_chars = chars
+        really_apply_mock.reset_mock()
+        provider.apply(plan)
+        really_apply_mock.assert_called_once()
+        provider.max_change_chars = chars - 1
+        really_apply_mock.reset_mock()
+        provider.apply(plan)
+        self.assertEquals(2, really_apply_mock.call_count)
+
+    def test_mods_size(self):
+        provider = Route53Provider('test', 'abc', '123')
+        self.assertEquals((0, 0), provider._mods_size([]))
+        mods = [{
+            'Action': 'CREATE',
+            'ResourceRecordSet': {
+                'ResourceRecords': [{'Value': '1.2.3.4'}],
+            },
+        }, {
+            # UPSERTs count twice
+            'Action': 'UPSERT',
+            'ResourceRecordSet': {
+                'ResourceRecords': [{'Value': '1.2.3.4'}, {'Value': 'abc'}],
+            },
+        }, {
+            # aliases don't have any
+            'Action': 'DELETE',
+            'ResourceRecordSet': {
+                'AliasTarget': {},
+            },
+        }]
+        self.assertEquals((5, 27), provider._mods_size(mods))
+
+    def test_really_apply(self):
+        provider, stubber = self._get_stubbed_provider()
+        stubber.add_response('change_resource_record_sets', {'ChangeInfo': {
+            'Id': 'c42',
+            'Status': 'PENDING',
+            'SubmittedAt': '2017-01-29T01:02:03Z',
+        }}, {'HostedZoneId': 'z42', 'ChangeBatch': ANY})
+        change_id, start = provider._really_apply([{
+            'Action': 'CREATE',
+            'ResourceRecordSet': {
+                'Name': 'a.unit.tests.',
+                'Type': 'A',
+                'TTL': 60,
+                'ResourceRecords': [{'Value': '1.2.3.4'}],
+            },
+        }], 'z42')
+        self.assertEquals('c42', change_id)
+        self.assertTrue(start > 0)
+        stubber.assert_no_pending_responses()
+
+    @patch('octodns.provider.route53.sleep')
+    def test_wait_for_insync(self, sleep_mock):
+        provider, stubber = self._get_stubbed_provider()
+        provider.insync_poll_interval = 5
+
+        def change(id, status):
+            return {'ChangeInfo': {
+                'Id': id,
+                'Status': status,
+                'SubmittedAt': '2017-01-29T01:02:03Z',
+            }}
+
+        # c1 is done right away, c2 takes another poll
+        stubber.add_response('get_change', change('c1', 'INSYNC'),
+                             {'Id': 'c1'})
+        stubber.add_response('get_change', change('c2', 'PENDING'),
+                             {'Id': 'c2'})
+        stubber.add_response('get_change', change('c2', 'INSYNC'),
+                             {'Id': 'c2'})
+        provider._wait_for_insync([('c1', 0), ('c2', 0)])
+        stubber.assert_no_pending_responses()
+        sleep_mock.assert_called_once_with(5)
+
+        # we give up eventually
+        sleep_mock.reset_mock()
+        provider.insync_timeout = 7
+        stubber.add_response('get_change', change('c3', 'PENDING'),
+                             {'Id': 'c3'})
+        stubber.add_response('get_change', change('c3', 'PENDING'),
+                             {'Id': 'c3'})
+        provider._wait_for_insync([('c3', 0)])
+        stubber.assert_no_pending_responses()
+        sleep_mock.assert_called_once_with(5)
+
+        # without a poll interval there's only the initial check
+        sleep_mock.reset_mock()
+        provider.insync_poll_interval = 0
+        stubber.add_response('get_change', change('c4', 'PENDING'),
+                             {'Id': 'c4'})
+        provider._wait_for_insync([('c4', 0)])
+        stubber.assert_no_pending_responses()
+        sleep_mock.assert_not_called()
+
+    @patch('octodns.provider.route53.Route53Provider._wait_for_insync')
+    @patch('octodns.provider.route53.Route53Provider._load_records')
+    @patch('octodns.provider.route53.Route53Provider._really_apply')
+    def test_apply_wait_for_insync(self, really_apply_mock, _,
+                                   wait_for_insync_mock):
+        really_apply_mock.side_effect = [('c1', 1), ('c2', 2)]
+        provider, plan = self._get_test_plan(17)
+        provider.apply(plan)
+        wait_for_insync_mock.assert_not_called()
+
+        really_apply_mock.reset_mock()
+        really_apply_mock.side_effect = [('c1', 1), ('c2', 2)]
+        provider.wait_for_insync = True
+        provider.apply(plan)
+        wait_for_insync_mock.assert_called_once_with([('c1', 1), ('c2', 2)])
+
     def test_semicolon_fixup(self):
         provider = Route53Provider('test', 'abc', '123')
 
@@ -1933,6 +2069,148 @@ class TestRoute53Provider(TestCase):
                           ._unique_id_handlers['retry-config-route53']
                           ['handler']._checker.__dict__['_max_attempts'])
 
+    def _stub_rrset_cache_calls(self, stubber, count, rrsets=True):
+        stubber.add_response('list_hosted_zones', {
+            'HostedZones': [{
+                'Name': 'unit.tests.',
+                'Id': '/hostedzone/z42',
+                'CallerReference': 'abc',
+                'ResourceRecordSetCount': count,
+            }],
+            'Marker': 'm',
+            'IsTruncated': False,
+            'MaxItems': '100',
+        }, {})
+        if rrsets:
+            stubber.add_response('list_resource_record_sets', {
+                'ResourceRecordSets': [{
+                    'Name': 'simple.unit.tests.',
+                    'Type': 'A',
+                    'ResourceRecords': [{
+                        'Value': '1.2.3.4',
+                    }],
+                    'TTL': 60,
+                }],
+                'IsTruncated': False,
+                'MaxItems': '100',
+            }, {'HostedZoneId': '/hostedzone/z42'})
+
+    def test_rrset_cache(self):
+        with TemporaryDirectory() as td:
+            directory = join(td.dirname, 'route53')
+
+            def populate(count, rrsets, **kwargs):
+                provider = Route53Provider('test', 'abc', '123',
+                                           rrset_cache_directory=directory,
+                                           **kwargs)
+                stubber = Stubber(provider._conn)
+                stubber.activate()
+                self._stub_rrset_cache_calls(stubber, count, rrsets)
+                zone = Zone('unit.tests.', [])
+                provider.populate(zone)
+                stubber.assert_no_pending_responses()
+                self.assertEquals(1, len(zone.records))
+                return provider
+
+            # cold, the cache directory is created & filled
+            populate(1, True)
+            self.assertTrue(isdir(directory))
+            self.assertEquals(['hostedzone-z42.json'], listdir(directory))
+
+            # warm, no records listed
+            provider = populate(1, False)
+
+            # the count changed, records are listed
+            populate(2, True)
+            populate(2, False)
+
+            # expired
+            populate(2, True, rrset_cache_max_age=-1)
+
+            # corrupt
+            filename = provider._rrset_cache_filename('/hostedzone/z42')
+            with open(filename, 'w') as fh:
+                fh.write('{not json')
+            populate(2, True)
+
+            # changes made through the provider invalidate the entry, doing
+            # so when there isn't one is a noop
+            provider._invalidate_rrset_cache('/hostedzone/z42')
+            self.assertEquals([], listdir(directory))
+            provider._invalidate_rrset_cache('/hostedzone/z42')
+
+            # failing to write isn't fatal
+            with patch('octodns.provider.route53.rename') as rename_mock:
+                rename_mock.side_effect = OSError('nope')
+                populate(2, True)
+            populate(2, True)
+
+        # zones without a count (created during the run) aren't cached
+        provider = Route53Provider('test', 'abc', '123',
+                                   rrset_cache_directory=directory)
+        self.assertEquals(None, provider._read_rrset_cache('/hostedzone/z'))
+        provider._write_rrset_cache('/hostedzone/z', [])
+
+    def test_health_checks_prefetch(self):
+        provider = Route53Provider('test', 'abc', '123', max_workers=2)
+        stubber = Stubber(provider._conn)
+        stubber.activate()
+        stubber.add_response('list_hosted_zones', {
+            'HostedZones': [],
+            'Marker': 'm',
+            'IsTruncated': False,
+            'MaxItems': '100',
+        }, {})
+        stubber.add_response('list_health_checks', {
+            'HealthChecks': self.health_checks,
+            'IsTruncated': False,
+            'MaxItems': '100',
+            'Marker': '',
+        })
+
+        # as a target health checks are loaded in the background
+        provider.populate(Zone('unit.tests.', []), target=True)
+        self.assertTrue(provider._health_checks_future)
+        # subsequent calls don't load them again
+        provider._prefetch_health_checks()
+
+        health_checks = provider.health_checks
+        # one of them isn't ours
+        self.assertEquals(len(self.health_checks) - 1, len(health_checks))
+        self.assertEquals(None, provider._health_checks_future)
+        stubber.assert_no_pending_responses()
+        # once loaded there's nothing to prefetch
+        provider._prefetch_health_checks()
+        self.assertEquals(None, provider._health_checks_future)
+
+    def test_health_checks_loaded_once(self):
+        provider = Route53Provider('test', 'abc', '123', max_workers=2)
+        loading = Event()
+        release = Event()
+
+        def load_health_checks():
+            loading.set()
+            release.wait()
+            return {}
+
+        with patch.object(provider, '_load_health_checks') as load_mock:
+            load_mock.side_effect = load_health_checks
+            provider._prefetch_health_checks()
+            loading.wait()
+            # while the prefetch is running other threads wait on it rather
+            # than starting their own load
+            threads = [Thread(target=lambda: provider.health_checks)
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            release.set()
+            for thread in threads:
+                thread.join()
+            self.assertEquals({}, provider.health_checks)
+            # nothing more to prefetch
+            provider._prefetch_health_checks()
+            self.assertEquals(1, load_mock.call_count)
+
     def test_data_for_dynamic(self):
         provider = Route53Provider('test', 'abc', '123')
 
@@ -5,15 +5,18 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
-from os import makedirs
+from datetime import date
+from mock import patch
+from os import listdir, makedirs, utime
 from os.path import basename, dirname, isdir, isfile, join
+from shutil import copy
 from unittest import TestCase
 from yaml import safe_load
 from yaml.constructor import ConstructorError
 
 from octodns.record import Create
 from octodns.provider.base import Plan
-from octodns.provider.yaml import _list_all_yaml_files, \
+from octodns.provider.yaml import _list_all_yaml_files, _ParseCache, \
     SplitYamlProvider, YamlProvider
 from octodns.zone import SubzoneRecordException, Zone
 
@@ -180,6 +183,198 @@ class TestYamlProvider(TestCase):
         self.assertEquals('Record www.sub.unit.tests. is under a managed '
                           'subzone', ctx.exception.message)
 
+    def test_cache_directory(self):
+        with TemporaryDirectory() as td:
+            directory = join(td.dirname, 'config')
+            cache_directory = join(td.dirname, 'cache')
+            makedirs(directory)
+            filename = join(directory, 'unit.tests.yaml')
+            copy(join(dirname(__file__), 'config', 'unit.tests.yaml'),
+                 filename)
+
+            source = YamlProvider('test', directory,
+                                  cache_directory=cache_directory)
+            # the cache directory is created
+            self.assertTrue(isdir(cache_directory))
+
+            zone = Zone('unit.tests.', [])
+            source.populate(zone)
+            self.assertEquals(18, len(zone.records))
+            self.assertEquals(1, len(listdir(cache_directory)))
+
+            # populating again, even with a new provider, doesn't parse or
+            # validate
+            source = YamlProvider('test', directory,
+                                  cache_directory=cache_directory)
+            with patch('octodns.provider.yaml.safe_load') as safe_load_mock, \
+                    patch('octodns.record.Record._validate') as validate_mock:
+                again = Zone('unit.tests.', [])
+                source.populate(again)
+                safe_load_mock.assert_not_called()
+                validate_mock.assert_not_called()
+            self.assertEquals(18, len(again.records))
+            # ttl defaults are still applied
+            self.assertFalse(zone.changes(again, source))
+
+            # touching the file, without changing it, doesn't parse either
+            utime(filename, (1, 1))
+            with patch('octodns.provider.yaml.safe_load') as safe_load_mock:
+                again = Zone('unit.tests.', [])
+                source.populate(again)
+                safe_load_mock.assert_not_called()
+            self.assertEquals(18, len(again.records))
+
+            # changing the content does
+            with open(filename, 'a') as fh:
+                fh.write('zzz:\n  type: A\n  value: 1.2.3.4\n')
+            again = Zone('unit.tests.', [])
+            source.populate(again)
+            self.assertEquals(19, len(again.records))
+
+            # even when the size & mtime stay the same
+            with open(filename) as fh:
+                content = fh.read()
+            with open(filename, 'w') as fh:
+                fh.write(content.replace('1.2.3.4', '4.3.2.1'))
+            utime(filename, (1, 1))
+            again = Zone('unit.tests.', [])
+            source.populate(again)
+            self.assertEquals(['4.3.2.1'], [r.values for r in again.records
+                                            if r.name == 'zzz'][0])
+
+            # a different default ttl means validating again
+            other = YamlProvider('test', directory, default_ttl=60,
+                                 cache_directory=cache_directory)
+            with patch('octodns.record.Record._validate') as validate_mock:
+                validate_mock.return_value = []
+                other.populate(Zone('unit.tests.', []))
+                self.assertTrue(validate_mock.called)
+
+            # as do lenient populates, which don't mark the file validated
+            with open(filename, 'a') as fh:
+                fh.write('zzzz:\n  type: A\n  value: 1.2.3.4\n')
+            source.populate(Zone('unit.tests.', []), lenient=True)
+            with patch('octodns.record.Record._validate') as validate_mock:
+                validate_mock.return_value = []
+                source.populate(Zone('unit.tests.', []))
+                self.assertTrue(validate_mock.called)
+
+            # nor do records that are lenient themselves
+            with open(filename, 'a') as fh:
+                fh.write('zzzzz:\n  octodns:\n    lenient: true\n'
+                         '  type: A\n  value: 1.2.3.4\n')
+            for _ in range(2):
+                with patch('octodns.record.Record._validate') as \
+                        validate_mock:
+                    validate_mock.return_value = []
+                    source.populate(Zone('unit.tests.', []))
+                    self.assertTrue(validate_mock.called)
+
+            # unordered data cached without enforcement isn't used when
+            # enforcing
+            copy(join(dirname(__file__), 'config', 'unordered.yaml'),
+                 join(directory, 'unordered.yaml'))
+            source = YamlProvider('test', directory, enforce_order=False,
+                                  cache_directory=cache_directory)
+            zone = Zone('unordered.', [])
+            source.populate(zone)
+            self.assertEquals(2, len(zone.records))
+            source = YamlProvider('test', directory,
+                                  cache_directory=cache_directory)
+            with self.assertRaises(ConstructorError) as ctx:
+                source.populate(Zone('unordered.', []))
+            # errors point at the file
+            self.assertTrue(join(directory, 'unordered.yaml') in
+                            str(ctx.exception))
+
+    def test_incremental_writes(self):
+        source = YamlProvider('test', join(dirname(__file__), 'config'))
+        zone = Zone('unit.tests.', [])
+        source.populate(zone)
+
+        with TemporaryDirectory() as td:
+            target = YamlProvider('test', td.dirname)
+            filename = join(td.dirname, 'unit.tests.yaml')
+
+            self.assertEquals(15, target.apply(target.plan(zone)))
+            self.assertTrue(isfile(filename))
+            with open(filename) as fh:
+                content = fh.read()
+
+            # identical content isn't rewritten
+            with patch('octodns.provider.yaml.rename') as rename_mock:
+                target.apply(target.plan(zone))
+                rename_mock.assert_not_called()
+
+            # changed content is
+            zone._remove_record([r for r in zone.records
+                                 if r.name == 'aaaa'][0])
+            target.apply(target.plan(zone))
+            with open(filename) as fh:
+                self.assertNotEquals(content, fh.read())
+            # nothing but the zone file is left behind
+            self.assertEquals(['unit.tests.yaml'], listdir(td.dirname))
+
+    def test_fingerprint(self):
+        with TemporaryDirectory() as td:
+            filename = join(td.dirname, 'unit.tests.yaml')
+            with open(filename, 'w') as fh:
+                fh.write('a:\n  type: A\n  value: 1.2.3.4\n')
+            source = YamlProvider('test', td.dirname)
+            fingerprint = source.fingerprint('unit.tests.')
+            self.assertTrue(fingerprint)
+            # stable
+            self.assertEquals(fingerprint, source.fingerprint('unit.tests.'))
+            # touching the file doesn't change it, only its contents do
+            utime(filename, (1, 1))
+            self.assertEquals(fingerprint, source.fingerprint('unit.tests.'))
+            with open(filename, 'w') as fh:
+                fh.write('a:\n  type: A\n  value: 2.3.4.5\n')
+            changed = source.fingerprint('unit.tests.')
+            self.assertNotEquals(fingerprint, changed)
+
+            # so does config that changes what's loaded
+            other = YamlProvider('test', td.dirname, default_ttl=60)
+            self.assertNotEquals(changed, other.fingerprint('unit.tests.'))
+
+            # a missing zone file still has a fingerprint
+            self.assertTrue(source.fingerprint('missing.tests.'))
+            self.assertNotEquals(changed, source.fingerprint('missing.tests.'))
+
+    def test_parse_cache_bad_entries(self):
+        with TemporaryDirectory() as td:
+            filename = join(td.dirname, 'unit.tests.yaml')
+            with open(filename, 'w') as fh:
+                fh.write('a:\n  type: A\n  value: 1.2.3.4\n')
+            cache_directory = join(td.dirname, 'cache')
+            cache = _ParseCache(cache_directory)
+            expected = {'a': {'type': 'A', 'value': '1.2.3.4'}}
+            self.assertEquals(expected, cache.load(filename, True)['data'])
+
+            # a corrupt entry is ignored and replaced
+            cache_filename = join(cache_directory,
+                                  listdir(cache_directory)[0])
+            with open(cache_filename, 'w') as fh:
+                fh.write('not marshalled')
+            self.assertEquals(expected, cache.load(filename, True)['data'])
+            self.assertEquals(expected, cache._read(cache_filename)['data'])
+
+            # failing to write an entry isn't fatal
+            with open(filename, 'w') as fh:
+                fh.write('b:\n  type: A\n  value: 1.2.3.4\n')
+            with patch('octodns.provider.yaml.rename') as rename_mock:
+                rename_mock.side_effect = OSError('nope')
+                self.assertEquals({'b': {'type': 'A', 'value': '1.2.3.4'}},
+                                  cache.load(filename, True)['data'])
+
+            # data marshal can't handle isn't cached
+            with open(filename, 'w') as fh:
+                fh.write('c:\n  type: TXT\n  value: 2019-10-17\n')
+            entry = cache.load(filename, True)
+            self.assertEquals(date(2019, 10, 17), entry['data']['c']['value'])
+            self.assertNotEquals(entry['hash'],
+                                 cache._read(cache_filename)['hash'])
+
 
 class TestSplitYamlProvider(TestCase):
 
@@ -215,6 +410,32 @@ class TestSplitYamlProvider(TestCase):
             join(dirname(__file__), 'config/split/unit.tests.'),
             source._zone_directory(zone))
 
+    def test_fingerprint(self):
+        with TemporaryDirectory() as td:
+            zone_dir = join(td.dirname, 'unit.tests.')
+            makedirs(zone_dir)
+            source = SplitYamlProvider('test', td.dirname)
+            empty = source.fingerprint('unit.tests.')
+            self.assertTrue(empty)
+
+            with open(join(zone_dir, 'a.yaml'), 'w') as fh:
+                fh.write('a:\n  type: A\n  value: 1.2.3.4\n')
+            fingerprint = source.fingerprint('unit.tests.')
+            self.assertNotEquals(empty, fingerprint)
+            self.assertEquals(fingerprint, source.fingerprint('unit.tests.'))
+
+            # files that aren't loaded don't matter
+            open(join(zone_dir, 'README'), 'w').close()
+            self.assertEquals(fingerprint, source.fingerprint('unit.tests.'))
+
+            # but adding one that is does
+            copy(join(zone_dir, 'a.yaml'), join(zone_dir, 'b.yaml'))
+            self.assertNotEquals(fingerprint,
+                                 source.fingerprint('unit.tests.'))
+
+            # without a directory there's nothing to go on
+            self.assertEquals(None, source.fingerprint('missing.tests.'))
+
     def test_apply_handles_existing_zone_directory(self):
         with TemporaryDirectory() as td:
             provider = SplitYamlProvider('test', join(td.dirname, 'config'))
@@ -372,3 +593,78 @@ class TestSplitYamlProvider(TestCase):
             source.populate(zone)
         self.assertEquals('Record www.sub.unit.tests. is under a managed '
                           'subzone', ctx.exception.message)
+
+    def test_max_workers(self):
+        directory = join(dirname(__file__), 'config/split')
+        serial = SplitYamlProvider('test', directory)
+        concurrent = SplitYamlProvider('test', directory, max_workers=4)
+
+        expected = Zone('unit.tests.', [])
+        serial.populate(expected)
+        self.assertEquals(18, len(expected.records))
+
+        zone = Zone('unit.tests.', [])
+        concurrent.populate(zone)
+        self.assertEquals(18, len(zone.records))
+        self.assertFalse(expected.changes(zone, serial))
+
+        # files are loaded concurrently, but processed in filename order
+        filenames = []
+        orig = concurrent._populate_from_data
+
+        def capture(filename, *args, **kwargs):
+            filenames.append(basename(filename))
+            return orig(filename, *args, **kwargs)
+
+        with patch.object(concurrent, '_populate_from_data', capture):
+            concurrent.populate(Zone('unit.tests.', []))
+        self.assertEquals(sorted(filenames), filenames)
+        self.assertEquals(15, len(filenames))
+
+        # errors are still raised
+        with self.assertRaises(ConstructorError):
+            concurrent.populate(Zone('unordered.', []))
+
+    def test_incremental_writes(self):
+        source = SplitYamlProvider(
+            'test', join(dirname(__file__), 'config/split'))
+        zone = Zone('unit.tests.', [])
+        source.populate(zone)
+
+        with TemporaryDirectory() as td:
+            target = SplitYamlProvider('test', td.dirname)
+            zone_dir = target._zone_directory(zone)
+            target.apply(target.plan(zone))
+            files = sorted(listdir(zone_dir))
+            self.assertEquals(13, len(files))
+
+            # nothing changed, nothing's written
+            with patch('octodns.provider.yaml.rename') as rename_mock:
+                target.apply(target.plan(zone))
+                rename_mock.assert_not_called()
+
+            # a stray file from a record that no longer exists & a change
+            with open(join(zone_dir, 'gone.yaml'), 'w') as fh:
+                fh.write('---\ngone:\n  type: A\n  value: 1.2.3.4\n')
+            www = [r for r in zone.records if r.name == 'www'][0]
+            zone._remove_record(www)
+            zone._remove_record([r for r in zone.records
+                                 if r.name == 'cname'][0])
+            www.ttl = 42
+            zone.add_record(www)
+            with patch('octodns.provider.yaml.rename') as rename_mock:
+                target.apply(target.plan(zone))
+                renamed = [c[0][1] for c in rename_mock.call_args_list]
+                self.assertEquals([join(zone_dir, 'www.yaml')], renamed)
+            target.apply(target.plan(zone))
+            self.assertEquals(sorted(set(files) - set(['cname.yaml'])),
+                              sorted(listdir(zone_dir)))
+            with open(join(zone_dir, 'www.yaml')) as fh:
+                self.assertTrue('ttl: 42' in fh.read())
+
+            # the catchall file goes away when there are no catchall records
+            for record in list(zone.records):
+                if record.name in ('', '*'):
+                    zone._remove_record(record)
+            target.apply(target.plan(zone))
+            self.assertFalse(isfile(join(zone_dir, '$unit.tests.yaml')))
@@ -5,12 +5,16 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
+from cPickle import HIGHEST_PROTOCOL, dumps, loads
+from mock import patch
 from unittest import TestCase
 
 from octodns.record import ARecord, AaaaRecord, AliasRecord, CaaRecord, \
-    CnameRecord, Create, Delete, GeoValue, MxRecord, NaptrRecord, NaptrValue, \
-    NsRecord, PtrRecord, Record, SshfpRecord, SpfRecord, SrvRecord, \
-    TxtRecord, Update, ValidationError, _Dynamic, _DynamicPool, _DynamicRule
+    CaaValue, CnameRecord, Create, Delete, GeoValue, MxRecord, MxValue, \
+    NaptrRecord, NaptrValue, NsRecord, PtrRecord, Record, SshfpRecord, \
+    SshfpValue, SpfRecord, SrvRecord, SrvValue, TxtRecord, Update, \
+    ValidationError, _Dynamic, _DynamicPool, _DynamicRule
+from octodns.provider.yaml import YamlProvider
 from octodns.zone import Zone
 
 from helpers import DynamicProvider, GeoProvider, SimpleProvider
@@ -115,6 +119,16 @@ class TestRecord(TestCase):
         update = a.changes(other, target)
         self.assertEquals(a, update.existing)
         self.assertEquals(other, update.new)
+        # but not if they're the same addresses written differently
+        other.values = ['01.2.3.4', '2.2.3.4']
+        self.assertFalse(a.changes(other, target))
+        # values that aren't addresses, e.g. lenient, are compared as text
+        other.values = ['1.2.3.4', 'hello']
+        self.assertTrue(a.changes(other, target))
+        self.assertFalse(other.changes(ARecord(self.zone, 'a', {
+            'ttl': 30,
+            'values': ['1.2.3.4', 'hello'],
+        }), target))
 
         # Hashing
         records = set()
@@ -767,6 +781,164 @@ class TestRecord(TestCase):
             })
         self.assertTrue('Unknown record type' in ctx.exception.message)
 
+    def test_identity(self):
+        a = ARecord(self.zone, 'www', {
+            'ttl': 30,
+            'value': '1.2.3.4',
+        })
+        self.assertEquals(('www', 'A'), a._key)
+        self.assertEquals('www.unit.tests.', a.fqdn)
+        root = ARecord(self.zone, '', {
+            'ttl': 30,
+            'value': '1.2.3.4',
+        })
+        self.assertEquals(('', 'A'), root._key)
+        self.assertEquals('unit.tests.', root.fqdn)
+
+        # same name & type are equal & hash the same regardless of values
+        other = ARecord(self.zone, 'WWW', {
+            'ttl': 42,
+            'value': '2.3.4.5',
+        })
+        self.assertEquals(a, other)
+        self.assertEquals(hash(a), hash(other))
+        self.assertEquals(1, len(set([a, other])))
+        # different types are not
+        aaaa = AaaaRecord(self.zone, 'www', {
+            'ttl': 30,
+            'value': '2601:644:500:e210:62f8:1dff:feb8:947a',
+        })
+        self.assertNotEquals(a, aaaa)
+        self.assertEquals([root, a, aaaa], sorted([aaaa, a, root]))
+
+        # records are slotted
+        for record in (a, aaaa, CnameRecord(self.zone, 'cname', {
+            'ttl': 30,
+            'value': 'www.unit.tests.',
+        }), TxtRecord(self.zone, 'txt', {
+            'ttl': 30,
+            'value': 'some text',
+        })):
+            self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_value_slots(self):
+        values = (
+            CaaValue({'tag': 'issue', 'value': 'ca.unit.tests'}),
+            GeoValue('NA-US', ['1.2.3.4']),
+            MxValue({'preference': 10, 'exchange': 'mx.unit.tests.'}),
+            NaptrValue({
+                'order': 10,
+                'preference': 20,
+                'flags': 'S',
+                'service': 'SIP+D2U',
+                'regexp': '!^.*$!sip:info@bar.example.com!',
+                'replacement': '.',
+            }),
+            SrvValue({
+                'priority': 10,
+                'weight': 20,
+                'port': 30,
+                'target': 'srv.unit.tests.',
+            }),
+            SshfpValue({
+                'algorithm': 1,
+                'fingerprint_type': 1,
+                'fingerprint': 'bf6b6825d2977c511a475bbefb88aad54a92ac73',
+            }),
+        )
+        for value in values:
+            self.assertFalse(hasattr(value, '__dict__'))
+            with self.assertRaises(AttributeError):
+                value.unexpected = 42
+
+    def test_pickling(self):
+        source = SimpleProvider()
+        records = [Record.new(self.zone, name, data, source=source)
+                   for name, data in (
+            ('a', {
+                'type': 'A',
+                'ttl': 30,
+                'values': ['1.2.3.4', '2.3.4.5'],
+                'geo': {
+                    'NA-US': ['3.4.5.6'],
+                },
+            }),
+            ('dynamic', {
+                'type': 'A',
+                'ttl': 30,
+                'value': '1.2.3.4',
+                'dynamic': {
+                    'pools': {
+                        'one': {
+                            'values': [{
+                                'value': '3.3.3.3',
+                            }],
+                        },
+                    },
+                    'rules': [{
+                        'pool': 'one',
+                    }],
+                },
+            }),
+            ('cname', {
+                'type': 'CNAME',
+                'ttl': 30,
+                'value': 'www.unit.tests.',
+                'octodns': {
+                    'ignored': True,
+                },
+            }),
+            ('mx', {
+                'type': 'MX',
+                'ttl': 30,
+                'value': {
+                    'preference': 10,
+                    'exchange': 'mx.unit.tests.',
+                },
+            }),
+            ('_srv._tcp', {
+                'type': 'SRV',
+                'ttl': 30,
+                'value': {
+                    'priority': 10,
+                    'weight': 20,
+                    'port': 30,
+                    'target': 'srv.unit.tests.',
+                },
+            }),
+        )]
+
+        for record in records:
+            copy = loads(dumps(record, HIGHEST_PROTOCOL))
+            # providers aren't pickled, just their id
+            self.assertEquals('test', copy.source)
+            # and pickling it again keeps the id
+            self.assertEquals('test',
+                              loads(dumps(copy, HIGHEST_PROTOCOL)).source)
+            copy.source = source
+            self.assertEquals(record, copy)
+            self.assertEquals(hash(record), hash(copy))
+            self.assertEquals(record.fqdn, copy.fqdn)
+            self.assertEquals(record.data, copy.data)
+            self.assertEquals(record._octodns, copy._octodns)
+            self.assertFalse(record.changes(copy, DynamicProvider()))
+            self.assertFalse(record.changes(copy, GeoProvider()))
+
+        # no source stays no source
+        record = Record.new(self.zone, 'txt', {
+            'type': 'TXT',
+            'ttl': 30,
+            'value': 'some text',
+        })
+        self.assertIsNone(loads(dumps(record, HIGHEST_PROTOCOL)).source)
+
+    def test_validation_error_pickling(self):
+        e = ValidationError('www.unit.tests.', ['nope', 'uh-uh'])
+        copy = loads(dumps(e, HIGHEST_PROTOCOL))
+        self.assertEquals(e.fqdn, copy.fqdn)
+        self.assertEquals(e.reasons, copy.reasons)
+        self.assertEquals(e.message, copy.message)
+
     def test_change(self):
         existing = Record.new(self.zone, 'txt', {
             'ttl': 44,
@@ -976,6 +1148,16 @@ class TestRecordValidation(TestCase):
             })
         self.assertEquals(['empty value'], ctx.exception.reasons)
 
+        # trailing newline
+        with self.assertRaises(ValidationError) as ctx:
+            Record.new(self.zone, '', {
+                'type': 'A',
+                'ttl': 600,
+                'value': '1.2.3.4\n'
+            })
+        self.assertEquals(['invalid IPv4 address "1.2.3.4\n"'],
+                          ctx.exception.reasons)
+
         # missing value(s) & ttl
         with self.assertRaises(ValidationError) as ctx:
             Record.new(self.zone, '', {
@@ -1017,6 +1199,194 @@ class TestRecordValidation(TestCase):
             'invalid IPv4 address "hello"',
         ], ctx.exception.reasons)
 
+    def test_memoized(self):
+        Record._validated.clear()
+        data = {'type': 'A', 'ttl': 600, 'value': 'hello'}
+        with patch.object(ARecord, 'validate',
+                          wraps=ARecord.validate) as validate_mock:
+            for name in ('a', 'b'):
+                with self.assertRaises(ValidationError) as ctx:
+                    Record.new(self.zone, name, dict(data))
+                self.assertEquals(['invalid IPv4 address "hello"'],
+                                  ctx.exception.reasons)
+                self.assertEquals('{}.unit.tests.'.format(name),
+                                  ctx.exception.fqdn)
+            # same data, validated once
+            self.assertEquals(1, validate_mock.call_count)
+
+            # values that compare equal aren't confused
+            record = Record.new(self.zone, 'a', {
+                'type': 'A',
+                'ttl': 600,
+                'value': '1.2.3.4',
+            })
+            record = Record.new(self.zone, 'b', {
+                'type': 'A',
+                'ttl': 600.0,
+                'value': '1.2.3.4',
+            })
+            self.assertEquals(3, validate_mock.call_count)
+            self.assertEquals(600, record.ttl)
+
+        # reasons handed out can be modified without affecting the memo
+        reasons = Record._validate(ARecord, 'a', data)
+        reasons.append('modified')
+        self.assertEquals(['invalid IPv4 address "hello"'],
+                          Record._validate(ARecord, 'a', data))
+
+        # validations that depend on names are kept apart
+        data = {'type': 'CNAME', 'ttl': 600, 'value': 'target.unit.tests.'}
+        Record.new(self.zone, 'www', data)
+        with self.assertRaises(ValidationError) as ctx:
+            Record.new(self.zone, '', data)
+        self.assertEquals(['root CNAME not allowed'], ctx.exception.reasons)
+        Record.new(self.zone, 'other', data)
+
+        data = {
+            'type': 'SRV',
+            'ttl': 600,
+            'value': {
+                'priority': 1,
+                'weight': 2,
+                'port': 3,
+                'target': 'foo.unit.tests.',
+            },
+        }
+        Record.new(self.zone, '_srv._tcp', data)
+        with self.assertRaises(ValidationError) as ctx:
+            Record.new(self.zone, 'neup', data)
+        self.assertEquals(['invalid name'], ctx.exception.reasons)
+
+        # the memo doesn't grow without bound
+        with patch.object(Record, 'VALIDATED_MAX', 2):
+            Record._validated.clear()
+            for value in ('1.2.3.4', '2.3.4.5', '3.4.5.6'):
+                Record.new(self.zone, 'a', {
+                    'type': 'A',
+                    'ttl': 600,
+                    'value': value,
+                })
+            self.assertEquals(1, len(Record._validated))
+
+    def test_interned(self):
+        first = Zone('first.tests.', [])
+        second = Zone('second.tests.', [])
+        records = []
+        for zone in (first, second):
+            # built at runtime so they start out as separate objects
+            www = ''.join(['ww', 'w'])
+            target = ''.join(['lb.', 'unit.tests.'])
+            records.append((
+                Record.new(zone, www, {
+                    'ttl': 30,
+                    'type': 'CNAME',
+                    'value': target,
+                }),
+                Record.new(zone, www.upper(), {
+                    'ttl': 30,
+                    'type': 'MX',
+                    'value': {
+                        'exchange': target.upper(),
+                        'preference': 10,
+                    },
+                }),
+                Record.new(zone, '_srv._tcp', {
+                    'ttl': 30,
+                    'type': 'SRV',
+                    'value': {
+                        'port': 30,
+                        'priority': 10,
+                        'target': target,
+                        'weight': 20,
+                    },
+                }),
+                Record.new(zone, 'sub', {
+                    'ttl': 30,
+                    'type': 'NS',
+                    'value': target,
+                }),
+                Record.new(zone, 'geo', {
+                    'geo': {
+                        ''.join(['NA-', 'US-CA']): ['2.2.2.2'],
+                    },
+                    'ttl': 30,
+                    'type': 'A',
+                    'value': '1.1.1.1',
+                }),
+                Record.new(zone, 'dynamic', {
+                    'dynamic': {
+                        'pools': {
+                            ''.join(['o', 'ne']): {
+                                'values': [{'value': '2.2.2.2'}],
+                            },
+                        },
+                        'rules': [{
+                            'geos': [''.join(['E', 'U'])],
+                            'pool': ''.join(['on', 'e']),
+                        }],
+                    },
+                    'ttl': 30,
+                    'type': 'A',
+                    'value': '1.1.1.1',
+                }),
+            ))
+
+        # the same strings are shared between the zones' records
+        (cname, mx, srv, ns, geo, dynamic), others = records
+        other_cname, other_mx, other_srv, other_ns, other_geo, \
+            other_dynamic = others
+        self.assertIs(cname.name, other_cname.name)
+        self.assertIs(cname.name, mx.name)
+        self.assertIs(cname.value, other_cname.value)
+        self.assertIs(cname.value, other_mx.values[0].exchange)
+        self.assertIs(cname.value, srv.values[0].target)
+        self.assertIs(cname.value, other_ns.values[0])
+
+        code = list(geo.geo)[0]
+        self.assertIs(code, list(other_geo.geo)[0])
+        self.assertIs(code, geo.geo[code].code)
+        self.assertIs(geo.geo[code].subdivision_code,
+                      other_geo.geo[code].subdivision_code)
+
+        pool = dynamic.dynamic.pools['one']
+        other_pool = other_dynamic.dynamic.pools['one']
+        self.assertIs(pool._id, other_pool._id)
+        rule = dynamic.dynamic.rules[0].data
+        other_rule = other_dynamic.dynamic.rules[0].data
+        self.assertIs(pool._id, rule['pool'])
+        self.assertIs(rule['pool'], other_rule['pool'])
+        self.assertIs(rule['geos'][0], other_rule['geos'][0])
+
+    def test_trust_populate(self):
+        data = {'type': 'A', 'ttl': 600, 'value': 'hello'}
+        trusted = YamlProvider('trusted', 'tests/config', trust_populate=True)
+        untrusted = YamlProvider('untrusted', 'tests/config')
+        self.assertFalse(untrusted.trust_populate)
+
+        with patch.object(ARecord, 'validate',
+                          wraps=ARecord.validate) as validate_mock:
+            with patch.object(Record.log, 'warn') as warn_mock:
+                # lenient records from trusted sources aren't validated
+                record = Record.new(self.zone, 'trusted', data,
+                                    source=trusted, lenient=True)
+                self.assertEquals(['hello'], record.values)
+                self.assertEquals(trusted, record.source)
+                validate_mock.assert_not_called()
+                warn_mock.assert_not_called()
+
+                # everyone else's still are
+                Record._validated.clear()
+                Record.new(self.zone, 'untrusted', data, source=untrusted,
+                           lenient=True)
+                self.assertEquals(1, validate_mock.call_count)
+                warn_mock.assert_called_once()
+
+            # as are strict ones, trusted or not
+            with self.assertRaises(ValidationError) as ctx:
+                Record.new(self.zone, 'trusted', data, source=trusted)
+            self.assertEquals(['invalid IPv4 address "hello"'],
+                              ctx.exception.reasons)
+
     def test_AAAA_validation(self):
         # doesn't blow up
         Record.new(self.zone, '', {
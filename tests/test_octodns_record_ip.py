@@ -0,0 +1,99 @@
+#
+#
+#
+
+from __future__ import absolute_import, division, print_function, \
+    unicode_literals
+
+from ipaddress import IPv6Address
+from mock import patch
+from unittest import TestCase
+
+from octodns.record.ip import ip_int, ipv4_int, ipv6_from_hex, ipv6_int, \
+    ipv6_normalize, ipv6_text, pack_ipv4s, pack_ipv6s, parse_ipv4s, \
+    parse_ipv6s
+
+
+class TestRecordIp(TestCase):
+
+    def test_ipv4(self):
+        self.assertEquals(0, ipv4_int('0.0.0.0'))
+        self.assertEquals(0x01020304, ipv4_int('1.2.3.4'))
+        self.assertEquals(0xffffffff, ipv4_int('255.255.255.255'))
+
+        # the usual forms don't need ipaddress
+        with patch('octodns.record.ip.IPv4Address') as address_mock:
+            self.assertEquals([0x0a000001, 0xc0a80101],
+                              parse_ipv4s(['10.0.0.1', '192.168.1.1']))
+            address_mock.assert_not_called()
+        # anything else is left to it
+        self.assertEquals(0x01020304, ipv4_int('01.2.3.4'))
+
+        for value in ('256.0.0.1', '1.2.3', '1.2.3.4.5', 'hello', '',
+                      ' 1.2.3.4', '1.2.3.4\n', 1, None):
+            with self.assertRaises(ValueError) as ctx:
+                ipv4_int(value)
+            self.assertEquals('invalid IPv4 address "{}"'.format(value),
+                              ctx.exception.message)
+
+        self.assertEquals([0x01020304, None, None],
+                          parse_ipv4s(['1.2.3.4', 'hello', None]))
+
+    def test_ipv6(self):
+        self.assertEquals(0, ipv6_int('::'))
+        self.assertEquals(1, ipv6_int('::1'))
+        self.assertEquals(0x20010db8 << 96, ipv6_int('2001:db8::'))
+        for value in ('2001:db8::1', '2001:DB8::1', '2001:0db8:0:0:0:0:0:1',
+                      '2001:db8:0::0:1', '2001:0db8:0000:0000:0000:0000:0000:'
+                      '0001'):
+            self.assertEquals((0x20010db8 << 96) | 1, ipv6_int(value))
+
+        # the usual forms don't need ipaddress
+        with patch('octodns.record.ip.IPv6Address') as address_mock:
+            parse_ipv6s(['2001:db8::1', '::', 'fe80::1:2', '1:2:3:4:5:6:7:8'])
+            address_mock.assert_not_called()
+        # anything else is left to it
+        self.assertEquals(0xffff01020304, ipv6_int('::ffff:1.2.3.4'))
+
+        for value in ('1:2:3:4:5:6:7', '1::2::3', '::1:2:3:4:5:6:7:8',
+                      ':1:2:3:4:5:6:7:8', '1:2:3:4:5:6:7:8:9', '12345::',
+                      'g::', ' ::1', '::1\n', 'fe80::1%eth0',
+                      '1:2:3:4:5:6:7:8::', '', '1.2.3.4', None):
+            with self.assertRaises(ValueError) as ctx:
+                ipv6_int(value)
+            self.assertEquals('invalid IPv6 address "{}"'.format(value),
+                              ctx.exception.message)
+
+        self.assertEquals([1, None], parse_ipv6s(['::1', 'hello']))
+
+    def test_ip(self):
+        self.assertEquals((4, 0x01020304), ip_int('1.2.3.4'))
+        self.assertEquals((6, 1), ip_int('::1'))
+        with self.assertRaises(ValueError) as ctx:
+            ip_int('hello')
+        self.assertEquals('invalid IP address "hello"', ctx.exception.message)
+
+    def test_ipv6_text(self):
+        for value in ('::', '::1', '1::', '2001:db8::1', '2001:db8:0:1::1',
+                      '2001:0:0:1::1', '1:0:2:3:4:5:6:7', '0:0:1::',
+                      '1:2:3:4:5:6:7:8', 'fe80::', '::ffff:0:0'):
+            self.assertEquals(unicode(IPv6Address(value)),
+                              ipv6_text(ipv6_int(value)))
+        self.assertEquals('2001:db8::1', ipv6_normalize('2001:DB8:0:0::1'))
+        self.assertEquals('2a02:1348:17c:d5d0:24:19ff:fef3:5742',
+                          ipv6_from_hex('2a021348017cd5d0002419fffef35742'))
+        with self.assertRaises(ValueError):
+            ipv6_from_hex('2a021348017cd5d0002419fffef3574')
+        with self.assertRaises(ValueError):
+            ipv6_from_hex('2a021348017cd5d0002419fffef3574x')
+
+    def test_pack(self):
+        self.assertEquals(b'\x01\x02\x03\x04\x0a\x00\x00\x01',
+                          pack_ipv4s([0x0a000001, 0x01020304]))
+        self.assertEquals(b'', pack_ipv4s([]))
+        self.assertEquals(b'\x00' * 15 + b'\x01' + b'\x20\x01' + b'\x00' * 14,
+                          pack_ipv6s([0x2001 << 112, 1]))
+        # order & form don't matter
+        self.assertEquals(pack_ipv6s(parse_ipv6s(['2001:db8::1', '::2'])),
+                          pack_ipv6s(parse_ipv6s(['0::2',
+                                                  '2001:DB8:0::1'])))
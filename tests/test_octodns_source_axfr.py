@@ -69,3 +69,11 @@ class TestZoneFileSource(TestCase):
             self.source.populate(zone)
         self.assertEquals('The DNS zone has no NS RRset at its origin.',
                           ctx.exception.message)
+
+    def test_fingerprint(self):
+        fingerprint = self.source.fingerprint('unit.tests.')
+        self.assertEquals(fingerprint, self.source.fingerprint('unit.tests.'))
+        self.assertNotEquals(fingerprint,
+                             self.source.fingerprint('invalid.zone.'))
+        # no zone file, nothing loaded, still fingerprinted
+        self.assertEquals('-', self.source.fingerprint('missing.zone.'))
@@ -200,6 +200,17 @@ class TestTinyDnsFileSource(TestCase):
         changes = expected.changes(got, SimpleProvider())
         self.assertEquals([], changes)
 
+    def test_data_for_AAAA(self):
+        self.assertEquals({
+            'ttl': 300,
+            'type': 'AAAA',
+            'values': ['2a02:1348:17c:d5d0:24:19ff:fef3:5742', 'nope'],
+        }, self.source._data_for_AAAA('AAAA', [
+            ('2a021348017cd5d0002419fffef35742', 300),
+            # left as is for validation to reject
+            ('nope', 300),
+        ]))
+
     def test_ignores_subs(self):
         got = Zone('example.com.', ['sub'])
         self.source.populate(got)
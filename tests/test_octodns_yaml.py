@@ -68,3 +68,44 @@ class TestYaml(TestCase):
             '45a0392a': 43,
         }, buf)
         self.assertEquals("---\n45a0392a: 43\n45a03129: 42\n", buf.getvalue())
+
+    def test_order_enforcement(self):
+        # a large, in order, mapping
+        keys = ['k{}'.format(i) for i in range(1000)]
+        content = '\n'.join('{}: {}'.format(k, i) for i, k in enumerate(keys))
+        data = safe_load(content)
+        self.assertEquals(1000, len(data))
+        self.assertEquals(999, data['k999'])
+
+        # the first key that's out of place is reported
+        with self.assertRaises(ConstructorError) as ctx:
+            safe_load('{}\nk1000: x\nk0: y'.format(content))
+        self.assertTrue('keys out of order: expected k0 got k1 at' in
+                        ctx.exception.problem)
+
+        # nested mappings are checked too
+        with self.assertRaises(ConstructorError) as ctx:
+            safe_load('a:\n  c: 1\n  b: 2\n')
+        self.assertTrue('keys out of order: expected b got c at' in
+                        ctx.exception.problem)
+
+        # but not when it's disabled
+        self.assertEquals({'a': {'b': 2, 'c': 1}},
+                          safe_load('a:\n  c: 1\n  b: 2\n',
+                                    enforce_order=False))
+
+    def test_root_key_round_trip(self):
+        buf = StringIO()
+        data = {
+            '': {'type': 'A', 'value': '1.2.3.4'},
+            'www': {'type': 'A', 'value': '2.3.4.5'},
+        }
+        safe_dump(data, buf)
+        self.assertEquals(data, safe_load(buf.getvalue()))
+
+    def test_interned_keys(self):
+        for enforce_order in (True, False):
+            first = safe_load('www:\n  type: A\n', enforce_order)
+            second = safe_load('www:\n  type: CNAME\n', enforce_order)
+            self.assertIs(list(first)[0], list(second)[0])
+            self.assertIs(list(first['www'])[0], list(second['www'])[0])
@@ -5,11 +5,13 @@
 from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
+from cPickle import HIGHEST_PROTOCOL, dumps, loads
+from mock import patch
 from unittest import TestCase
 
 from octodns.record import ARecord, AaaaRecord, Create, Delete, Record, Update
-from octodns.zone import DuplicateRecordException, InvalidNodeException, \
-    SubzoneRecordException, Zone
+from octodns.zone import ColumnarZone, DuplicateRecordException, \
+    InvalidNodeException, SubzoneRecordException, Zone
 
 from helpers import SimpleProvider
 
@@ -58,6 +60,117 @@ class TestZone(TestCase):
         zone.add_record(b)
         self.assertEquals(zone.records, set([a, b]))
 
+    def test_records_view(self):
+        zone = Zone('unit.tests.', [])
+        self.assertEquals(0, zone.record_count)
+        self.assertEquals(frozenset(), zone.records)
+
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+
+        zone.add_record(a)
+        records = zone.records
+        self.assertEquals(1, zone.record_count)
+        self.assertEquals(set([a]), records)
+        # the view is frozen
+        with self.assertRaises(AttributeError):
+            records.add(b)
+        # and is re-used until the zone changes
+        self.assertIs(records, zone.records)
+
+        zone.add_record(b)
+        self.assertEquals(2, zone.record_count)
+        self.assertIsNot(records, zone.records)
+        self.assertEquals(set([a, b]), zone.records)
+        # the old view is untouched
+        self.assertEquals(set([a]), records)
+
+        # replacing keeps the count steady, but swaps in the new record
+        c = ARecord(zone, 'a', {'ttl': 43, 'value': '2.2.2.2'})
+        zone.add_record(c, replace=True)
+        self.assertEquals(2, zone.record_count)
+        self.assertEquals(43, [r for r in zone.records if r.name == 'a'][0]
+                          .ttl)
+
+        # removing drops it from the view
+        records = zone.records
+        zone._remove_record(b)
+        self.assertEquals(1, zone.record_count)
+        self.assertEquals(set([c]), zone.records)
+        # removing something that isn't there is a no-op
+        records = zone.records
+        zone._remove_record(b)
+        self.assertEquals(1, zone.record_count)
+        self.assertIs(records, zone.records)
+
+    def test_pickling(self):
+        zone = Zone('unit.tests.', set(['sub']))
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(a)
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(b)
+        # make sure the view has been built
+        self.assertEquals(2, len(zone.records))
+
+        copy = loads(dumps(zone, HIGHEST_PROTOCOL))
+        self.assertEquals('unit.tests.', copy.name)
+        self.assertEquals(set(['sub']), copy.sub_zones)
+        self.assertEquals(2, copy.record_count)
+        self.assertEquals(zone.records, copy.records)
+        for record in copy.records:
+            self.assertIs(copy, record.zone)
+        self.assertFalse(zone.changes(copy, SimpleProvider()))
+        self.assertEquals('foo', copy.hostname_from_fqdn('foo.unit.tests.'))
+
+    def test_copy(self):
+        zone = Zone('unit.tests.', ['sub'])
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(a)
+
+        copy = zone.copy()
+        self.assertEquals('unit.tests.', copy.name)
+        self.assertEquals(['sub'], copy.sub_zones)
+        self.assertEquals(set([a]), copy.records)
+        # nothing's been copied yet
+        self.assertTrue(zone._index is copy._index)
+
+        # modifying the copy leaves the original alone
+        copy.add_record(b)
+        self.assertEquals(set([a, b]), copy.records)
+        self.assertEquals(set([a]), zone.records)
+        self.assertFalse(zone._index is copy._index)
+        c = ARecord(zone, 'a', {'ttl': 42, 'value': '2.2.2.2'})
+        copy.add_record(c, replace=True)
+        self.assertEquals(set([c, b]), copy.records)
+        self.assertEquals(set([a]), zone.records)
+        # node tracking was copied too
+        with self.assertRaises(InvalidNodeException):
+            copy.add_record(Record.new(zone, 'b', {
+                'ttl': 42,
+                'type': 'CNAME',
+                'value': 'foo.unit.tests.',
+            }))
+        zone.add_record(Record.new(zone, 'b', {
+            'ttl': 42,
+            'type': 'CNAME',
+            'value': 'foo.unit.tests.',
+        }))
+
+        # and the other way around
+        copy = zone.copy()
+        zone._remove_record(a)
+        self.assertEquals(2, copy.record_count)
+        self.assertEquals(1, zone.record_count)
+        copy._remove_record(a)
+        self.assertEquals(1, copy.record_count)
+
+        # copies of copies & pickling
+        copy = loads(dumps(copy.copy(), HIGHEST_PROTOCOL))
+        self.assertEquals(1, copy.record_count)
+        copy.add_record(a)
+        self.assertEquals(2, copy.record_count)
+
     def test_changes(self):
         before = Zone('unit.tests.', [])
         a = ARecord(before, 'a', {'ttl': 42, 'value': '1.1.1.1'})
@@ -106,6 +219,40 @@ class TestZone(TestCase):
         self.assertFalse(changed.changes(update.new, target))
         update.__repr__()
 
+    def test_changes_filters_once(self):
+        before = Zone('unit.tests.', [])
+        after = Zone('unit.tests.', [])
+        for name in ('a', 'b', 'c'):
+            before.add_record(ARecord(before, name, {
+                'ttl': 42,
+                'value': '1.1.1.1',
+            }))
+        for name in ('b', 'c', 'd', 'e'):
+            after.add_record(ARecord(after, name, {
+                'ttl': 43 if name == 'c' else 42,
+                'value': '1.1.1.1',
+            }))
+
+        skip = Zone._skip
+        seen = []
+
+        def counting_skip(zone, record, target):
+            seen.append((id(zone), record.name, id(record.zone)))
+            return skip(zone, record, target)
+
+        with patch.object(Zone, '_skip', counting_skip):
+            changes = before.changes(after, SimpleProvider())
+
+        # each of the 7 records was looked at exactly once
+        self.assertEquals(7, len(seen))
+        self.assertEquals(7, len(set(seen)))
+        self.assertEquals({
+            'a': Delete,
+            'c': Update,
+            'd': Create,
+            'e': Create,
+        }, {c.record.name: c.__class__ for c in changes})
+
     def test_unsupporting(self):
 
         class NoAaaaProvider(object):
@@ -354,3 +501,310 @@ class TestZone(TestCase):
 
         self.assertTrue(zone_missing.changes(zone_normal, provider))
         self.assertFalse(zone_missing.changes(zone_included, provider))
+
+
+class TestColumnarZone(TestCase):
+
+    def test_add_record(self):
+        zone = ColumnarZone('unit.tests.', set(['sub']))
+        self.assertEquals(0, zone.record_count)
+        self.assertEquals(frozenset(), zone.records)
+
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        aaaa = AaaaRecord(zone, 'a', {'ttl': 42, 'value': '1:1:1::1'})
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(a)
+        zone.add_record(aaaa)
+        zone.add_record(b)
+        self.assertEquals(3, zone.record_count)
+        self.assertEquals(set([a, aaaa, b]), zone.records)
+        # records are created as they're needed, they're equivalent to, but
+        # not, the ones that were added
+        got = zone._index[('a', 'A')]
+        self.assertIsNot(a, got)
+        self.assertFalse(a.changes(got, SimpleProvider()))
+        self.assertIs(zone, got.zone)
+        # the data is shared by rows with the same data, & the classes kept
+        # once
+        self.assertIs(zone._datas[0], zone._datas[2])
+        self.assertEquals([ARecord, AaaaRecord], zone._class_table)
+
+        index = zone._index
+        self.assertEquals(3, len(index))
+        self.assertTrue(('a', 'AAAA') in index)
+        self.assertFalse(('b', 'AAAA') in index)
+        self.assertFalse(('c', 'A') in index)
+        self.assertIsNone(index.get(('c', 'A')))
+        with self.assertRaises(KeyError):
+            index[('c', 'A')]
+
+        with self.assertRaises(DuplicateRecordException) as ctx:
+            zone.add_record(aaaa)
+        self.assertEquals('Duplicate record a.unit.tests., type AAAA',
+                          ctx.exception.message)
+        c = ARecord(zone, 'a', {'ttl': 43, 'value': '2.2.2.2'})
+        zone.add_record(c, replace=True)
+        self.assertEquals(3, zone.record_count)
+        got = zone._index[('a', 'A')]
+        self.assertEquals(43, got.ttl)
+        self.assertEquals(['2.2.2.2'], got.values)
+
+        with self.assertRaises(InvalidNodeException):
+            zone.add_record(Record.new(zone, 'b', {
+                'ttl': 42,
+                'type': 'CNAME',
+                'value': 'foo.unit.tests.',
+            }))
+        with self.assertRaises(SubzoneRecordException):
+            zone.add_record(ARecord(zone, 'sub', {
+                'ttl': 42,
+                'value': '1.1.1.1',
+            }))
+
+        # names that aren't ascii are fine too
+        zone.add_record(ARecord(zone, '\u00fc', {
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }))
+        self.assertEquals('\u00fc', zone._index[('\u00fc', 'A')].name)
+
+        # as is octodns config
+        zone.add_record(ARecord(zone, 'e', {
+            'octodns': {'excluded': ['other']},
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }))
+        self.assertEquals(['other'], zone._index[('e', 'A')].excluded)
+
+        # the data is encoded with its keys sorted so that equal data always
+        # encodes the same
+        zone.add_record(Record.new(zone, 'mx', {
+            'octodns': {'ignored': False, 'excluded': ['other']},
+            'ttl': 42,
+            'type': 'MX',
+            'value': {'preference': 10, 'exchange': 'mx.unit.tests.'},
+        }))
+        self.assertEquals('{"octodns":{"excluded":["other"],"ignored":false},'
+                          '"value":{"exchange":"mx.unit.tests.",'
+                          '"preference":10}}', zone._datas[-1])
+
+    def test_replace_checks_node(self):
+        for zone in (Zone('unit.tests.', []),
+                     ColumnarZone('unit.tests.', [])):
+            a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+            zone.add_record(a)
+            zone.add_record(Record.new(zone, 'a', {
+                'ttl': 42,
+                'type': 'CNAME',
+                'value': 'foo.unit.tests.',
+            }), lenient=True)
+            # replacing the A still can't leave it alongside the CNAME
+            with self.assertRaises(InvalidNodeException):
+                zone.add_record(a, replace=True)
+            zone.add_record(a, replace=True, lenient=True)
+            self.assertEquals(2, zone.record_count)
+
+    def test_records_cached(self):
+        zone = ColumnarZone('unit.tests.', [])
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(a)
+        # individual records are created as they're asked for
+        self.assertIsNot(zone._index[('a', 'A')], zone._index[('a', 'A')])
+
+        # once they've all been created they're kept
+        records = zone.records
+        self.assertIs(records, zone.records)
+        got = zone._index[('a', 'A')]
+        self.assertTrue(got in records)
+        self.assertIs(got, zone._index[('a', 'A')])
+        self.assertEquals(list(records), zone._index.values())
+
+        # until the zone changes
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(b)
+        self.assertEquals(set([a, b]), zone.records)
+        self.assertIsNot(got, zone._index[('a', 'A')])
+        zone.records
+        zone._remove_record(b)
+        self.assertEquals(set([a]), zone.records)
+
+        # they're not pickled
+        copy = loads(dumps(zone, HIGHEST_PROTOCOL))
+        self.assertIsNone(copy._materialized)
+        self.assertIsNone(copy._records_view)
+        self.assertEquals(set([a]), copy.records)
+
+    def test_unencodable(self):
+        zone = ColumnarZone('unit.tests.', [])
+        source = SimpleProvider()
+        # data that can't be encoded is kept as the record itself
+        a = ARecord(zone, 'a', {
+            'octodns': {'odd': set()},
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }, source=source)
+        zone.add_record(a)
+        self.assertIs(a, zone._index[('a', 'A')])
+
+        copy = loads(dumps(zone, HIGHEST_PROTOCOL))
+        self.assertEquals(['test'], copy._source_table)
+        self.assertEquals('test', copy._index[('a', 'A')].source)
+        copy._rebind_sources({'test': source})
+        self.assertEquals([source], copy._source_table)
+        self.assertIs(source, copy._index[('a', 'A')].source)
+        # already rebound is left alone
+        copy._rebind_sources({})
+
+    def test_remove_and_copy(self):
+        zone = ColumnarZone('unit.tests.', [])
+        a = ARecord(zone, 'a', {'ttl': 42, 'value': '1.1.1.1'})
+        aaaa = AaaaRecord(zone, 'a', {'ttl': 42, 'value': '1:1:1::1'})
+        b = ARecord(zone, 'b', {'ttl': 42, 'value': '1.1.1.1'})
+        zone.add_record(a)
+        zone.add_record(aaaa)
+        zone.add_record(b)
+
+        copy = zone.copy()
+        self.assertIs(zone._names, copy._names)
+        # removing the first of a name's records
+        copy._remove_record(a)
+        self.assertIsNot(zone._names, copy._names)
+        self.assertEquals(set([aaaa, b]), copy.records)
+        self.assertEquals(set([a, aaaa, b]), zone.records)
+        # and then the only one
+        copy._remove_record(aaaa)
+        self.assertEquals(set([b]), copy.records)
+        self.assertEquals(1, copy.record_count)
+        # removing something that isn't there is a no-op
+        copy._remove_record(aaaa)
+        self.assertEquals(1, copy.record_count)
+        # the name can be re-used
+        copy.add_record(aaaa)
+        self.assertEquals(set([aaaa, b]), copy.records)
+
+        # removing one that isn't the first of its name
+        zone._remove_record(aaaa)
+        self.assertEquals(set([a, b]), zone.records)
+        zone.add_record(aaaa)
+        zone.add_record(Record.new(zone, 'a', {
+            'ttl': 42,
+            'type': 'TXT',
+            'value': 'hi',
+        }))
+        zone._remove_record(aaaa)
+        self.assertEquals(3, zone.record_count)
+        self.assertEquals(set(['A', 'TXT']),
+                          set(r._type for r in zone.records if r.name == 'a'))
+
+    def test_changes(self):
+        target = SimpleProvider()
+        before = ColumnarZone('unit.tests.', [])
+        after = ColumnarZone('unit.tests.', [])
+        for zone in (before, after):
+            for name in ('a', 'b', 'c'):
+                zone.add_record(ARecord(zone, name, {
+                    'ttl': 42,
+                    'value': '1.1.1.1',
+                }))
+        self.assertFalse(before.changes(after, target))
+
+        # only rows that differ are turned in to records
+        after.add_record(ARecord(after, 'c', {
+            'ttl': 43,
+            'value': '1.1.1.1',
+        }), replace=True)
+        after.add_record(ARecord(after, 'd', {
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }))
+        after._remove_record(ARecord(after, 'a', {
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }))
+        record = ColumnarZone._record
+        seen = []
+
+        def counting_record(zone, row):
+            seen.append(zone._names[row])
+            return record(zone, row)
+
+        with patch.object(ColumnarZone, '_record', counting_record):
+            changes = before.changes(after, target)
+        self.assertEquals(['a', 'c', 'c', 'd'], seen)
+        self.assertEquals({
+            'a': Delete,
+            'c': Update,
+            'd': Create,
+        }, {c.record.name: c.__class__ for c in changes})
+
+        # putting it back
+        after.add_record(ARecord(after, 'c', {
+            'ttl': 42,
+            'values': ['1.1.1.1'],
+        }), replace=True)
+        # data that's written differently, but means the same thing
+        before.add_record(AaaaRecord(before, 'c', {
+            'ttl': 42,
+            'value': '1:1:1::1',
+        }))
+        after.add_record(AaaaRecord(after, 'c', {
+            'ttl': 42,
+            'value': '1:1:1:0:0:0:0:1',
+        }))
+        self.assertEquals({
+            'a': Delete,
+            'd': Create,
+        }, {c.record.name: c.__class__
+            for c in before.changes(after, target)})
+
+        # comparing against a regular zone works as usual
+        regular = Zone('unit.tests.', [])
+        for r in after.records:
+            regular.add_record(r)
+        self.assertEquals({
+            'a': Delete,
+            'd': Create,
+        }, {c.record.name: c.__class__
+            for c in before.changes(regular, target)})
+
+    def test_changes_skipped(self):
+
+        class NoAaaaProvider(object):
+            id = 'no-aaaa'
+            SUPPORTS_GEO = False
+            SUPPORTS_DYNAMIC = False
+
+            def supports(self, record):
+                return record._type != 'AAAA'
+
+        target = NoAaaaProvider()
+        current = ColumnarZone('unit.tests.', [])
+        desired = ColumnarZone('unit.tests.', [])
+        desired.add_record(ARecord(desired, 'a', {
+            'ttl': 42,
+            'value': '1.1.1.1',
+        }))
+        desired.add_record(AaaaRecord(desired, 'b', {
+            'ttl': 42,
+            'value': '1:1:1::1',
+        }))
+        ignored = {'octodns': {'ignored': True}, 'ttl': 42, 'type': 'A',
+                   'value': '2.2.2.2'}
+        current.add_record(Record.new(current, 'c', ignored))
+        desired.add_record(Record.new(desired, 'd', ignored))
+        current.add_record(Record.new(current, 'e', {
+            'ttl': 42,
+            'type': 'A',
+            'value': '3.3.3.3',
+        }))
+        desired.add_record(Record.new(desired, 'e', ignored))
+
+        # Only create the supported A, not the AAAA, nothing ignored
+        changes = current.changes(desired, target)
+        self.assertEquals(['a'], [c.record.name for c in changes])
+        self.assertIsInstance(changes[0], Create)
+
+        # Only delete the supported A, not the AAAA, nothing ignored
+        changes = desired.changes(current, target)
+        self.assertEquals(['a'], [c.record.name for c in changes])
+        self.assertIsInstance(changes[0], Delete)